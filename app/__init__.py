@@ -1,3 +1,5 @@
-from .logging import configure_logging
+__version__ = "0.1.0"
 
-configure_logging()
+from .generate import GeneratedFiles, UpdateResult
+from .options import Options
+from .session import Session
@@ -1,341 +1,280 @@
-import io
 from pathlib import Path
-from pprint import pprint
-import re
+import argparse
+import json
 import logging
-from typing import cast
+import sys
+import time
 
 from . import util
-from .data import DEFINITIONS
-from .writers import (
-    write_docs,
-    write_handler_function_stub,
-    write_register_handler,
+from .args import parse_args
+from .batch import (
+    FileSummary,
+    find_input_files,
+    get_docs_to_refresh,
+    get_exit_status,
+    get_report,
+    log_summary,
+    run_batch,
+    update_file,
 )
-from .args import args
-from .jsontypes import Command
+from .cache import DownloadCache
+from .data import DefinitionSet
+from .logging import configure_logging
+from .manifest import Manifest, get_options_key
+from .metrics import metrics
+from .options import Options
+from .rendercache import RenderCache
+from .session import Session
+
+# Modules only needed by some operating modes (or options) are imported when they're used, to keep startup fast
+# pylint: disable=import-outside-toplevel
 
 logger = logging.getLogger(__name__)
 
 
-def update_existing(commands_by_criteria: list[Command]):
+def main(argv: list[str] | None = None) -> int:
     """
-    Update existing file (handles case when args.input is provided)
+    Run the command-line app, returning the exit status
     """
 
-    all_commands = [
-        command
-        for extension in DEFINITIONS["extensions"]
-        for command in extension["commands"]
-    ]
-    commands_by_name = {cmd["name"]: cmd for cmd in all_commands}
-
-    with Path(args.input).open("r+", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    with Path(args.output).open("w", encoding="utf-8") as f:
-        # Find where `RegisterHandlers` is
-        # We assume it's at the end of the file, if not, the code below won't work all that good...
-        register_handlers_line_index = next(
-            (
-                i
-                for i, line in enumerate(lines)
-                if line.find("RegisterHandlers()") != -1
+    configure_logging()
+
+    args = parse_args(argv)
+    if args.metrics or args.metrics_json or args.trace_memory:
+        metrics.enable(trace_memory=args.trace_memory)
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+
+    try:
+        if profiler:
+            profiler.enable()
+        with metrics.phase("total"):
+            return run(args) or 0
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            logger.info("Wrote profile to `%s`", args.profile)
+        if args.metrics or args.trace_memory:
+            metrics.log_summary()
+        if args.metrics_json:
+            args.metrics_json.write_text(json.dumps(metrics.to_json(), indent=4), encoding="utf-8")
+            logger.info("Wrote metrics to `%s`", args.metrics_json)
+
+
+def log_load_error(e: OSError) -> int:
+    """
+    Report definitions that couldn't be loaded (not cached with `--offline`, a failed download, a missing local file), returning the exit status.
+    `requests.RequestException` is an `OSError` too, so it's caught without importing `requests` at startup
+    """
+
+    request = getattr(e, "request", None)
+    if url := e.filename or (request.url if request is not None else None):
+        logger.error("Failed to load `%s`: %s", url, e)
+    else:
+        logger.error("Failed to load the definitions: %s", e)
+    return 1
+
+
+def run(args: argparse.Namespace):
+    start = time.perf_counter()
+    options = Options.from_args(args)
+
+    if args.symbols:
+        return query_symbols(args)
+
+    # Load jobs before the definitions, so mistakes in the file are reported right away
+    if args.jobs_file:
+        from .jobs import get_definition_sets, load_jobs, run_jobs
+
+        try:
+            jobs = load_jobs(args.jobs_file, options)
+        except (OSError, ValueError, TypeError) as e:
+            return logger.error("Invalid jobs file: %s", e)
+        if not jobs:
+            return logger.error("No jobs in `%s`", args.jobs_file)
+
+    cache = DownloadCache(args.cache_dir, offline=args.offline, max_age=args.cache_max_age)
+    if args.jobs_file:
+        # Definitions of all games used by the jobs are loaded side by side
+        try:
+            sessions = Session.load_many(get_definition_sets(jobs, DefinitionSet(args.definitions, args.enum_definitions)), cache)
+        except OSError as e:
+            return log_load_error(e)
+        render_cache = get_render_cache(args)
+        for session in sessions.values():
+            session.render_cache = render_cache
+        manifest = Manifest(args.manifest)
+        summaries = run_jobs(sessions, jobs, args.workers, manifest, args.force)
+        log_summary(summaries)
+        manifest.save()
+        write_report(args, summaries, start)
+        return get_exit_status(summaries)
+
+    try:
+        session = Session.load(args.definitions, args.enum_definitions, cache)
+    except OSError as e:
+        return log_load_error(e)
+    session.render_cache = get_render_cache(args)
+
+    if args.daemon or args.daemon_socket:
+        from .daemon import Daemon, serve_stdio, serve_unix_socket
+
+        daemon = Daemon(session, options)
+        if args.daemon_socket:
+            try:
+                serve_unix_socket(daemon, args.daemon_socket)
+            except (NotImplementedError, FileExistsError) as e:
+                logger.error("%s", e)
+                return 1
+        else:
+            serve_stdio(daemon)
+        return
+
+    # Gather commands matching the specified criteria (extension, command name pattern, class name pattern, etc...)
+    commands = session.filter_commands(options)
+    if not commands:
+        return logger.error("No commands matched the given criteria")
+
+    if args.coverage:
+        from .coverage import build_report, log_report
+        from .symbols import SymbolIndex
+
+        paths = find_input_files(args.coverage)
+        if not paths:
+            return logger.error("No files matched `%s`", "`, `".join(args.coverage))
+        with metrics.phase("scan_tree"), SymbolIndex(args.symbol_index) as symbols:
+            symbols.update(paths, args.workers)
+            scans = symbols.file_scans(paths)
+        report = build_report(session, options, scans)
+        log_report(report)
+        if args.coverage_json:
+            args.coverage_json.write_text(json.dumps(report.to_json(), indent=4), encoding="utf-8")
+            logger.info("Wrote coverage report to `%s`", args.coverage_json)
+    elif args.verify:
+        from .symbols import SymbolIndex
+        from .verify import log_mismatches, verify_handlers
+
+        paths = find_input_files(args.verify)
+        if not paths:
+            return logger.error("No files matched `%s`", "`, `".join(args.verify))
+        with metrics.phase("scan_tree"), SymbolIndex(args.symbol_index) as symbols:
+            symbols.update(paths, args.workers)
+            handlers = symbols.file_handlers(paths)
+        with metrics.phase("verify"):
+            mismatches, checked = verify_handlers(session, options, handlers)
+        log_mismatches(mismatches, checked)
+        return 1 if mismatches else 0
+    elif args.watch:
+        from .watch import watch
+
+        # The first check processes all files, after that only changed ones are updated
+        watch(
+            session,
+            options,
+            lambda: (
+                [(path, path) for path in find_input_files(args.batch)]
+                if args.batch
+                else [(Path(args.input), Path(args.output))]
             ),
-            -1,
+            args.watch_interval,
         )
-        if register_handlers_line_index == -1:
-            raise NotImplementedError(
-                "Could not find `RegisterHandlers()` function in the input file - cannot add missing handlers"
-            ) from None
-
-        # Find all already registered handlers in the file to avoid adding duplicate registrations/stubs
-        # It matches on commented out register lines as well
-        register_handler_macros_regex = re.compile(
-            r"^\s*(\/\/)?\s*(?P<macro>"
-            + "|".join(
-                (
-                    "REGISTER_COMMAND_HANDLER",
-                    "REGISTER_UNSUPPORTED_COMMAND_HANDLER",
-                    "REGISTER_COMMAND_NOP",
-                    "REGISTER_COMMAND_UNIMPLEMENTED",
-                )
+    elif args.batch:
+        paths = find_input_files(args.batch)
+        if not paths:
+            return logger.error("No files matched `%s`", "`, `".join(args.batch))
+        manifest = Manifest(args.manifest)
+        summaries = run_batch(session, options, paths, args.workers, manifest, args.force)
+        log_summary(summaries)
+        manifest.save()
+        write_report(args, summaries, start)
+        return get_exit_status(summaries)
+    elif args.input:
+        input_path, output_path = Path(args.input), Path(args.output)
+        manifest = Manifest(args.manifest)
+        options_key = get_options_key(options)
+        if not args.force and manifest.is_up_to_date(input_path, output_path, session.definitions_signature, options_key):
+            logger.info("`%s` is up-to-date, nothing to do", args.input)
+            return write_report(args, [FileSummary(input_path, "skipped")], start)
+
+        docs_to_refresh = get_docs_to_refresh(session, options, manifest, input_path, output_path)
+        summary = update_file(session, options, commands, input_path, output_path, docs_to_refresh)
+        if summary.status == "failed":
+            logger.error("Failed to update `%s`: %s", args.input, summary.error)
+        elif summary.status == "updated":
+            logger.info("Added missing docs and stubs to `%s`", args.input)
+        else:
+            logger.info("`%s` unchanged, nothing to add", args.output)
+
+        if summary.status != "failed":
+            manifest.record(
+                input_path,
+                output_path,
+                session.definitions_signature,
+                options_key,
+                session.get_docs_version(options) if options.update_existing_docs else None,
             )
-            + r")\s*\(\s*COMMAND_(?P<command_name>[A-Za-z0-9_]+)\s*(?:,\s*(?P<handler>[A-Za-z0-9_]+))?\s*\)\s*;"
+            manifest.save()
+        write_report(args, [summary], start)
+        return get_exit_status([summary])
+    else:
+        output_path = Path(args.output)
+        generated = session.generate_new(options, commands, args.workers)
+        util.write_text_if_changed(output_path, generated.stubs)
+        util.write_text_if_changed(output_path.with_stem(f"{output_path.stem}.handlers"), generated.handlers)
+        logger.info(
+            "Processed %i commands to `%s`",
+            len(commands),
+            output_path.absolute(),
         )
-        register_call_by_command = {
-            cast(str, match.group("command_name")): (  # No COMMAND_ prefix
-                cast(str | None, match.group("handler")),
-                cast(str, match.group("macro")),
-            )
-            for line in lines
-            if (match := register_handler_macros_regex.match(line.strip()))
-        }
-        # pprint(register_call_by_command)
-
-        commands_by_handler_name = {
-            handler_name.lower(): cmd
-            for cmd in all_commands
-            if (handler_name := util.get_handler_name(cmd))
-        }
-
-        # Find commands that match the criteria but don't have a handler registered
-        missing_register_handler_commands = [
-            commands_by_name[cmd_name]
-            for cmd_name in set(cmd["name"] for cmd in commands_by_criteria).difference(
-                set(register_call_by_command.keys())
-            )
-        ]
 
-        # Old-style single-line docs comment regex (e.g. `// COMMAND_FOO` or `/// COMMAND_FOO - some description` with or without the `COMMAND_` prefix)
-        singleline_docs_comment_regex = re.compile(
-            rf"^\s*//+\s*(?P<command_name>[COMMAND_]?{'|'.join(cmd for cmd in register_call_by_command.keys())})(?:\s*-\s*(?P<description>.*))?$"
-        )
 
-        # Handler function regex - matches function definitions that look like command handlers
-        # Don't want to match only to known handlers though so we can print warnings for handlers that we can't resolve to any command in the definitions
-        cpp_function_regex = re.compile(
-            r"^\s*(?!if)(?P<return_type>[A-Za-z0-9_<>,\s:]+)\s+(?!constexpr)(?P<handler_name>[a-zA-Z_][a-zA-Z0-9_]*)\s*\((?P<params>[^)]*)\)\s*{\s*$",
-            re.IGNORECASE,
-        )
+def get_render_cache(args: argparse.Namespace) -> RenderCache | None:
+    return None if args.no_render_cache else RenderCache(args.render_cache, args.render_cache_size)
 
-        # Check if line should be written as-is, or needs to be replaced by new docs comment
-        def get_line_info(
-            line: str,
-        ) -> tuple[Command, bool] | tuple[None, None]:
-            # Handle old-style single-line docs comments and replace them with new-style
-            if match := singleline_docs_comment_regex.match(line):
-                command_name = match.group("command_name").removeprefix("COMMAND_")
-                command = commands_by_name.get(command_name)
-
-                if command:
-                    return command, True
-
-                logger.warning(
-                    "Command `%s` found in docs comment but not in definitions, skipping doc generation for it",
-                    command_name,
-                )
-
-            # Try matching to a function
-            elif match := cpp_function_regex.match(line):
-                handler_name = match.group("handler_name")
-                command = commands_by_handler_name.get(handler_name.lower())
-
-                if command:
-                    return command, False
-
-                logger.warning(
-                    "Can't resolve function `%s` to any command in definitions, skipping doc generation for it",
-                    handler_name,
-                )
-
-            return None, None
-
-        # Keep track of handlers we've already added docs for
-        has_docs_commands = set()
-        handlers_found = set()
-
-        # Process rest of the file
-        i_line = 0
-        while i_line < register_handlers_line_index:
-            line = lines[i_line]
-            stripped_line = lines[i_line].strip()
-
-            if stripped_line.startswith("/*"):
-                i_end_of_comment = next(
-                    (
-                        j
-                        for j, line in enumerate(lines[i_line:], start=i_line)
-                        if line.strip().endswith("*/")
-                    ),
-                    None,
-                )
-                if i_end_of_comment is None:
-                    raise NotImplementedError(
-                        f"Unclosed comment block starting at line {i_line}, cannot update existing docs"
-                    ) from None
-
-                # Find command name from docs
-                command_name = next(
-                    (
-                        cast(str, match.group("command_name"))
-                        for line in lines[i_line:i_end_of_comment]
-                        if (
-                            match := re.search(
-                                r"\s*\*\s*@command\s+(?P<command_name>[A-Za-z0-9_]+)\s*$",
-                                line,
-                            )
-                        )
-                    ),
-                    None,
-                )
-                if command_name:
-                    # Avoid generating docs again
-                    has_docs_commands.add(command_name)
-
-                    if args.update_existing_docs:
-                        # Write new docs and skip to line after the docs end
-                        try:
-                            write_docs(f, commands_by_name[command_name])
-                            logger.info(
-                                "Updated docs for command `%s` based on definitions file",
-                                command_name
-                            )
-                        except KeyError:
-                            logger.warning(
-                                "Command `%s` found in docs comment but not in definitions, skipping doc generation for it",
-                                command_name,
-                            )
-                        i_line = i_end_of_comment + 1
-                        continue
-
-            command, replace_line = get_line_info(stripped_line)
-            if command:
-                handlers_found.add(command["name"])
-                if command["name"] not in has_docs_commands:
-                    write_docs(f, command)
-                    has_docs_commands.add(command["name"])
-                    if replace_line:
-                        i_line += 1
-                        continue
-
-            f.write(line)
-            i_line += 1
-
-        logger.info("Added missing docs to %i handlers", len(has_docs_commands))
-
-        # Add missing stubs (after existing handlers but before the `RegisterHandlers` function)
-        for cmd in missing_register_handler_commands:
-            if cmd["name"] in handlers_found:
-                continue
-            write_docs(f, cmd)
-            write_handler_function_stub(f, cmd)
-            f.write("\n")
-
-        # Write the line with `RegisterHandlers()` function declaration and `REGISTER_COMMAND_HANDLER_BEGIN` before adding new handlers
-        register_command_handler_begin_line_index = next(
-            (
-                i
-                for i, line in enumerate(lines)
-                if line.find("REGISTER_COMMAND_HANDLER_BEGIN") != -1
-            ),
-            -1,
-        )
-        if register_command_handler_begin_line_index == -1:
-            raise NotImplementedError(
-                "Could not find `REGISTER_COMMAND_HANDLER_BEGIN` in the input file - cannot add missing handlers"
-            ) from None
-        for v in lines[
-            register_handlers_line_index : register_command_handler_begin_line_index + 1
-        ]:
-            f.write(v)
-
-        # Add missing register handler calls
-        # They're written in groups - regular, nops, unsupported
-        if args.generate_register_calls and missing_register_handler_commands:
-            regular_handlers_f, nop_handlers_f, unsupported_handlers_f = (
-                io.StringIO(),
-                io.StringIO(),
-                io.StringIO(),
-            )
 
-            def get_file_for_command(cmd: Command):
-                if attrs := cmd.get("attrs", None):
-                    if attrs.get(
-                        "is_unsupported"
-                    ):  # This should be before the nop handler, since some commands can be both unsupported and nop, but we want to prioritize unsupported in that case
-                        return unsupported_handlers_f
-
-                    if attrs.get("is_nop", False):
-                        return nop_handlers_f
-
-                return regular_handlers_f
-
-            for cmd in missing_register_handler_commands:
-                write_register_handler(get_file_for_command(cmd), cmd)
-
-            # Write these back into the file in the correct order
-            for handlers_f in [
-                regular_handlers_f,
-                nop_handlers_f,
-                unsupported_handlers_f,
-            ]:
-                if content := handlers_f.getvalue():  # maybe seek?
-                    f.write("\n")
-                    f.write(content)
-
-            logger.info(
-                "Added missing handlers for %i commands",
-                len(missing_register_handler_commands),
-            )
+def write_report(args: argparse.Namespace, summaries: list[FileSummary], start: float):
+    """
+    Write the report of the run to `--report-json`, if given
+    """
 
-        # Write rest of the file as-is
-        for v in lines[register_command_handler_begin_line_index + 1 :]:
-            f.write(v)
-
-    logger.info("Added missing docs and stubs to `%s`", args.input)
-
-
-def generate_new(commands_by_criteria: list[Command]):
-    output_path = Path(args.output or Path.cwd() / "output.cpp")
-
-    # Write stubs
-    with output_path.open("w", encoding="utf-8") as f:
-        for cmd in commands_by_criteria:
-            if cmd.get("attrs", {}).get("is_nop", False):
-                logger.warning(
-                    "No stub will be generated for command %s (%s) since it is marked as a no-op",
-                    cmd["name"],
-                    cmd["id"],
-                )
-                continue
-
-            write_docs(f, cmd)
-            write_handler_function_stub(f, cmd)
-            f.write("\n")
-
-    # Write handlers
-    with output_path.with_stem(f"{output_path.stem}.handlers").open(
-        "w", encoding="utf-8"
-    ) as f:
-        if args.generate_register_calls:
-            # Separately generate handlers and nops to group them together in the output
-            for is_nop in [
-                False,
-                True,
-            ]:
-                for cmd in commands_by_criteria:
-                    if cmd.get("attrs", {}).get("is_nop", False) == is_nop:
-                        write_register_handler(f, cmd)
-
-    logger.info(
-        "Processed %i commands to `%s`",
-        len(commands_by_criteria),
-        output_path.absolute(),
-    )
-
-
-def main():
-    # Gather commands matching the specified criteria (extension, command name pattern, class name pattern, etc...)
-    commands = [
-        command
-        for extension in DEFINITIONS["extensions"]
-        if not args.extension or re.search(args.extension, extension["name"])
-        for command in extension["commands"]
-        if re.search(args.name, command["name"])
-        and (
-            not args.klass
-            or ("class" in command and re.search(args.klass, command["class"]))
-        )
-    ]
-    if not commands:
-        return logger.error("No commands matched the given criteria")
+    if args.report_json:
+        args.report_json.write_text(json.dumps(get_report(summaries, time.perf_counter() - start), indent=4), encoding="utf-8")
+        logger.info("Wrote report to `%s`", args.report_json)
 
-    if args.input:
-        update_existing(commands)
-    else:
-        generate_new(commands)
+
+def query_symbols(args: argparse.Namespace):
+    from .symbols import SymbolIndex
+
+    paths = find_input_files(args.symbols)
+    if not paths:
+        return logger.error("No files matched `%s`", "`, `".join(args.symbols))
+
+    with SymbolIndex(args.symbol_index) as symbols:
+        with metrics.phase("scan_tree"):
+            scanned, removed = symbols.update(paths, args.workers)
+        logger.info("Symbol index up-to-date (%i of %i files rescanned, %i removed)", scanned, len(paths), removed)
+
+        for name in args.find:
+            registrations, docs, handlers = symbols.registrations(name), symbols.docs(name), symbols.handlers(name)
+            if not (registrations or docs or handlers):
+                logger.warning("`%s` not found", name)
+            for r in registrations:
+                logger.info("%s:%i: %s%s(%s%s)", r.path, r.line, "// " if r.commented_out else "", r.macro, r.command_name, f", {r.handler}" if r.handler else "")
+            for d in docs:
+                logger.info("%s:%i: docs of %s", d.path, d.line, d.command_name)
+            for h in handlers:
+                logger.info("%s:%i: handler %s%s", h.path, h.line, h.name, " (stub)" if h.is_stub else "")
+
+        if args.find_duplicates:
+            duplicates = symbols.duplicate_registrations()
+            for name, registrations in duplicates.items():
+                logger.warning("`%s` is registered %i times: %s", name, len(registrations), ", ".join(f"{r.path}:{r.line}" for r in registrations))
+            logger.info("%i commands registered more than once", len(duplicates))
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,22 +1,51 @@
 import argparse
 import logging
+import os
 from pathlib import Path
 
+from .cache import get_default_cache_dir
+from .data import DEFAULT_GAME, GAMES
+from .rendercache import DEFAULT_MAX_ENTRIES
+
 logger = logging.getLogger(__name__)
 
 arg_parser = argparse.ArgumentParser(
     description="Generate function stubs for script commands"
 )
+arg_parser.add_argument(
+    "--game",
+    "-g",
+    help="Game whose definitions (and enums) to use, from the Sanny Builder Library",
+    choices=GAMES,
+    default=DEFAULT_GAME,
+)
 arg_parser.add_argument(
     "--definitions",
     "-d",
-    help="Link containing script command definitions in JSON format",
-    default="https://library.sannybuilder.com/assets/sa/sa.json",
+    help="Link containing script command definitions in JSON format (defaults to the definitions of `--game`)",
+    default=None,
 )
 arg_parser.add_argument(
     "--enum-definitions",
-    help="Link containing enum definitions",
-    default="https://library.sannybuilder.com/assets/sa/enums.txt",
+    help="Link containing enum definitions (defaults to the enums of `--game`)",
+    default=None,
+)
+arg_parser.add_argument(
+    "--cache-dir",
+    help="Directory for caching downloaded definitions (defaults to `$SCRIPT_FOX_CACHE_DIR` or the user cache directory)",
+    type=Path,
+    default=get_default_cache_dir(),
+)
+arg_parser.add_argument(
+    "--cache-max-age",
+    help="Seconds a cached download is used as-is before it's revalidated with the server",
+    type=float,
+    default=60 * 60,
+)
+arg_parser.add_argument(
+    "--offline",
+    action="store_true",
+    help="Never access the network, only use cached definitions (fails if nothing is cached yet)",
 )
 arg_parser.add_argument(
     "--input",
@@ -24,6 +53,152 @@ arg_parser.add_argument(
     help="Add missing docs and stubs to an existing file instead of generating a new one",
     default=None,
 )
+arg_parser.add_argument(
+    "--batch",
+    "-b",
+    help="Update all matching files in-place instead of a single `--input` file. Accepts directories (all `.cpp` files in them, recursively) and glob patterns, can be used multiple times",
+    action="append",
+    default=None,
+    metavar="DIR_OR_GLOB",
+)
+arg_parser.add_argument(
+    "--jobs-file",
+    help="Run all jobs of a TOML or JSON file (each with its own filters, options and `input`/`output`), loading the definitions only once. Command-line options are used as defaults for the jobs",
+    type=Path,
+    default=None,
+)
+arg_parser.add_argument(
+    "--coverage",
+    help="Don't change anything, instead report which commands (matching the filters) are implemented, stubbed, registered as NOP/unsupported/unimplemented or missing in the given source tree. Accepts directories and glob patterns like `--batch`",
+    action="append",
+    default=None,
+    metavar="DIR_OR_GLOB",
+)
+arg_parser.add_argument(
+    "--verify",
+    help="Don't change anything, instead check that the signatures of existing handlers (of commands matching the filters) in the given source tree match the ones that would be generated, exiting with a non-zero status if any don't. Accepts directories and glob patterns like `--batch`",
+    action="append",
+    default=None,
+    metavar="DIR_OR_GLOB",
+)
+arg_parser.add_argument(
+    "--coverage-json",
+    help="Also write the coverage report to this file (JSON), including the status of each command",
+    type=Path,
+    default=None,
+)
+arg_parser.add_argument(
+    "--report-json",
+    help="Write a report of the run to this file (JSON): what was changed in each file (docs, stubs and `REGISTER_` calls added, unresolved handlers) and the time spent on it",
+    type=Path,
+    default=None,
+)
+arg_parser.add_argument(
+    "--symbols",
+    help="Update the symbol index (handlers, docs and `REGISTER_` calls) of the given source tree and answer `--find`/`--find-duplicates` queries from it, without loading the definitions. Accepts directories and glob patterns like `--batch`",
+    action="append",
+    default=None,
+    metavar="DIR_OR_GLOB",
+)
+arg_parser.add_argument(
+    "--find",
+    help="Show where a command (with or without `COMMAND_` prefix) is registered and documented, or where a handler is defined. Can be used multiple times",
+    action="append",
+    default=[],
+    metavar="NAME",
+)
+arg_parser.add_argument(
+    "--find-duplicates",
+    action="store_true",
+    help="Show commands that are registered more than once",
+)
+arg_parser.add_argument(
+    "--symbol-index",
+    help="Symbol index database used by `--symbols`, `--coverage` and `--verify` (defaults to `symbols.sqlite` in the cache directory)",
+    type=Path,
+    default=None,
+)
+arg_parser.add_argument(
+    "--daemon",
+    action="store_true",
+    help="Keep the definitions loaded and answer JSON requests (one per line) from stdin on stdout, e.g. for editor integrations. See the readme for the protocol",
+)
+arg_parser.add_argument(
+    "--daemon-socket",
+    help="Like `--daemon`, but answer requests of any number of connections to a Unix socket at this path",
+    type=Path,
+    default=None,
+)
+arg_parser.add_argument(
+    "--workers",
+    "-j",
+    help="Number of worker processes used in batch mode, for jobs files, for scanning source trees and for generating many commands (defaults to the number of CPUs)",
+    type=int,
+    default=os.cpu_count() or 1,
+)
+arg_parser.add_argument(
+    "--manifest",
+    help="File recording processed files, used to skip files that haven't changed since (defaults to `manifest.json` in the cache directory)",
+    type=Path,
+    default=None,
+)
+arg_parser.add_argument(
+    "--render-cache",
+    help="Cache of rendered docs, stubs and `REGISTER_` calls, reused by later runs (defaults to `renders.sqlite` in the cache directory)",
+    type=Path,
+    default=None,
+)
+arg_parser.add_argument(
+    "--render-cache-size",
+    help="Maximum number of fragments (docs, stubs or `REGISTER_` calls of a command) kept in the render cache, the least recently used ones are evicted",
+    type=int,
+    default=DEFAULT_MAX_ENTRIES,
+)
+arg_parser.add_argument(
+    "--no-render-cache",
+    action="store_true",
+    help="Always render docs, stubs and `REGISTER_` calls, without reading or writing the render cache",
+)
+arg_parser.add_argument(
+    "--force",
+    "-f",
+    action="store_true",
+    help="Process all files, even if they're up-to-date according to the manifest",
+)
+arg_parser.add_argument(
+    "--watch",
+    "-w",
+    action="store_true",
+    help="Keep running and update the `--input`/`--batch` files again whenever they change",
+)
+arg_parser.add_argument(
+    "--watch-interval",
+    help="Seconds between checks for changed files in watch mode",
+    type=float,
+    default=0.25,
+)
+arg_parser.add_argument(
+    "--metrics",
+    action="store_true",
+    help="Log the time spent in each phase (fetching, indexing, scanning, writing, etc...) and counters (commands, lines scanned, docs written, etc...) at the end",
+)
+arg_parser.add_argument(
+    "--metrics-json",
+    help="Write the metrics to this file (JSON). Phases run in batch mode worker processes are only included with `--workers 1`",
+    type=Path,
+    default=None,
+)
+arg_parser.add_argument(
+    "--trace-memory",
+    action="store_true",
+    help="Also record the peak memory of each phase (with `tracemalloc`, which slows down the run considerably)",
+)
+arg_parser.add_argument(
+    "--profile",
+    help="Profile the run with `cProfile` and write the stats to this file (view with e.g. `python -m pstats` or snakeviz)",
+    type=Path,
+    default=None,
+)
 arg_parser.add_argument(
     "--output",
     "-o",
@@ -62,7 +237,48 @@ arg_parser.add_argument(
     default=False
 )
 
-args = arg_parser.parse_args()
-if not args.output:
-    args.output = args.input or (Path.cwd() / "output.cpp")
-    logger.warning("No output file specified, using %s", args.output)
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """
+    Parse command-line arguments (`sys.argv` if `argv` is not given)
+    """
+
+    args = arg_parser.parse_args(argv)
+    args.definitions = args.definitions or GAMES[args.game].definitions_url
+    args.enum_definitions = args.enum_definitions or GAMES[args.game].enum_definitions_url
+    if args.batch and (args.input or args.output):
+        arg_parser.error("`--batch` updates files in-place, it can't be combined with `--input`/`--output`")
+    if args.jobs_file and (args.batch or args.input or args.output or args.watch):
+        arg_parser.error("`--jobs-file` can't be combined with `--batch`, `--input`, `--output` or `--watch`")
+    if args.coverage and (args.batch or args.input or args.output or args.watch or args.jobs_file):
+        arg_parser.error("`--coverage` can't be combined with `--batch`, `--input`, `--output`, `--watch` or `--jobs-file`")
+    if args.verify and (args.batch or args.input or args.output or args.watch or args.jobs_file or args.coverage):
+        arg_parser.error("`--verify` can't be combined with other modes")
+    if args.symbols and (args.batch or args.input or args.output or args.watch or args.jobs_file or args.coverage or args.verify):
+        arg_parser.error("`--symbols` can't be combined with other modes")
+    if (args.daemon or args.daemon_socket) and (
+        args.batch or args.input or args.output or args.watch or args.jobs_file or args.coverage or args.symbols or args.verify
+    ):
+        arg_parser.error("`--daemon` and `--daemon-socket` can't be combined with other modes")
+    if args.daemon and args.daemon_socket:
+        arg_parser.error("`--daemon` and `--daemon-socket` are mutually exclusive")
+    if (args.find or args.find_duplicates) and not args.symbols:
+        arg_parser.error("`--find` and `--find-duplicates` require `--symbols`")
+    if not args.symbol_index:
+        args.symbol_index = args.cache_dir / "symbols.sqlite"
+    if args.coverage_json and not args.coverage:
+        arg_parser.error("`--coverage-json` requires `--coverage`")
+    if args.report_json and (args.watch or not (args.input or args.batch or args.jobs_file)):
+        arg_parser.error("`--report-json` requires `--input`, `--batch` or `--jobs-file` (without `--watch`)")
+    if not args.manifest:
+        args.manifest = args.cache_dir / "manifest.json"
+    if not args.render_cache:
+        args.render_cache = args.cache_dir / "renders.sqlite"
+    if args.watch and not (args.input or args.batch):
+        arg_parser.error("`--watch` requires `--input` or `--batch`")
+    if not args.output and not (
+        args.batch or args.jobs_file or args.coverage or args.verify or args.symbols or args.daemon or args.daemon_socket
+    ):
+        args.output = args.input or (Path.cwd() / "output.cpp")
+        logger.warning("No output file specified, using %s", args.output)
+    return args
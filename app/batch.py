@@ -0,0 +1,245 @@
+import glob
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import __version__, util
+from .logging import configure_logging
+from .manifest import Manifest, get_options_key
+from .model import Command
+from .options import Options
+from .session import Session
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FileSummary:
+    """
+    Result of updating a single file in batch mode
+    """
+
+    path: Path
+    status: str  # `updated`, `unchanged` (nothing to add), `skipped` (up-to-date according to the manifest) or `failed`
+    docs_added: int = 0
+    docs_updated: int = 0
+    stubs_added: int = 0
+    register_calls_added: int = 0
+    error: str | None = None
+    changes: dict | None = None  # Names of the commands that were changed, by kind of change (see `UpdateResult.to_json`)
+    seconds: float = 0.0  # Time spent processing the file
+
+    def to_json(self) -> dict:
+        return {
+            "path": str(self.path),
+            "status": self.status,
+            "error": self.error,
+            "seconds": round(self.seconds, 6),
+            "changes": self.changes,
+        }
+
+
+def find_input_files(patterns: list[str]) -> list[Path]:
+    """
+    Resolve directories (all `.cpp` files in them, recursively) and glob patterns to a sorted list of files
+    """
+
+    paths: set[Path] = set()
+    for pattern in patterns:
+        if Path(pattern).is_dir():
+            paths.update(Path(pattern).rglob("*.cpp"))
+        else:
+            paths.update(Path(p) for p in glob.glob(pattern, recursive=True) if Path(p).is_file())
+    return sorted(paths)
+
+
+def get_docs_to_refresh(
+    session: Session,
+    options: Options,
+    manifest: Manifest | None,
+    path: Path,
+    output_path: Path | None = None,
+) -> set[str] | None:
+    """
+    Get the commands whose existing docs in a file need refreshing (with `update_existing_docs`) - those that changed since the file's docs were last refreshed.
+    None if that's unknown (all docs are refreshed then), which is always the case if the file isn't updated in-place (`output_path` is another file),
+    or if the docs were rendered differently (by another tool version, or with other options affecting them).
+    """
+
+    if not options.update_existing_docs or manifest is None:
+        return None
+    if output_path is not None and output_path.resolve() != path.resolve():
+        return None
+    docs_version = manifest.get_docs_version(path)
+    if docs_version is None or docs_version["render_key"] != session.get_docs_version(options)["render_key"]:
+        return None
+    return session.get_changed_commands(docs_version["definitions_key"])
+
+
+def update_file(
+    session: Session,
+    options: Options,
+    commands: list[Command],
+    path: Path,
+    output_path: Path | None = None,
+    docs_to_refresh: set[str] | None = None,
+) -> FileSummary:
+    """
+    Update a single file with missing docs, stubs and `REGISTER_` calls (in-place, unless `output_path` is given)
+    """
+
+    start = time.perf_counter()
+    try:
+        text = path.read_text(encoding="utf-8")
+        result = session.update_existing(options, text, commands, docs_to_refresh)
+        written = util.write_text_if_changed(output_path or path, result.text)
+    except (NotImplementedError, OSError, UnicodeDecodeError) as e:
+        return FileSummary(path, "failed", error=str(e), seconds=time.perf_counter() - start)
+
+    return FileSummary(
+        path,
+        "updated" if written else "unchanged",
+        docs_added=len(result.docs_added),
+        docs_updated=len(result.docs_updated),
+        stubs_added=len(result.stubs_added),
+        register_calls_added=len(result.register_calls_added),
+        changes=result.to_json(),
+        seconds=time.perf_counter() - start,
+    )
+
+
+# State of pool worker processes, set up once per worker by `_init_worker`
+_worker_state: tuple[Session, Options, list[Command]] | None = None
+
+
+def _init_worker(session: Session, options: Options):
+    global _worker_state  # pylint: disable=global-statement
+    configure_logging()
+    _worker_state = (session, options, session.filter_commands(options))
+
+
+def _update_file_in_worker(path: Path, docs_to_refresh: set[str] | None) -> FileSummary:
+    assert _worker_state is not None
+    return update_file(*_worker_state, path, docs_to_refresh=docs_to_refresh)
+
+
+def run_batch(
+    session: Session,
+    options: Options,
+    paths: list[Path],
+    workers: int,
+    manifest: Manifest | None = None,
+    force: bool = False,
+) -> list[FileSummary]:
+    """
+    Update all `paths` in-place, using a pool of `workers` processes.
+    The session is sent to each worker once, so definitions are only loaded (and indexed) once.
+    If a `manifest` is given, files that are up-to-date according to it are skipped (unless `force` is set), and processed files are recorded in it.
+    """
+
+    options_key = get_options_key(options)
+    summaries_by_path = {
+        path: FileSummary(path, "skipped")
+        for path in paths
+        if manifest and not force and manifest.is_up_to_date(path, path, session.definitions_signature, options_key)
+    }
+    pending = [path for path in paths if path not in summaries_by_path]
+    docs_to_refresh = [get_docs_to_refresh(session, options, manifest, path) for path in pending]
+
+    if workers <= 1 or len(pending) <= 1:
+        commands = session.filter_commands(options)
+        summaries = [
+            update_file(session, options, commands, path, docs_to_refresh=docs)
+            for path, docs in zip(pending, docs_to_refresh)
+        ]
+    else:
+        from concurrent.futures import ProcessPoolExecutor  # pylint: disable=import-outside-toplevel # Imports `multiprocessing`, which is slow
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(pending)),
+            initializer=_init_worker,
+            initargs=(session, options),
+        ) as pool:
+            summaries = list(pool.map(_update_file_in_worker, pending, docs_to_refresh, chunksize=4))
+
+    for summary in summaries:
+        summaries_by_path[summary.path] = summary
+        if manifest and summary.status != "failed":
+            manifest.record(
+                summary.path,
+                summary.path,
+                session.definitions_signature,
+                options_key,
+                session.get_docs_version(options) if options.update_existing_docs else None,
+            )
+
+    return [summaries_by_path[path] for path in paths]
+
+
+def log_summary(summaries: list[FileSummary]):
+    """
+    Log a summary line for each file and the totals
+    """
+
+    for summary in summaries:
+        if summary.status == "failed":
+            logger.error("`%s`: failed - %s", summary.path, summary.error)
+        elif summary.status == "skipped":
+            logger.debug("`%s`: skipped, up-to-date", summary.path)
+        elif summary.status == "unchanged":
+            logger.info("`%s`: unchanged", summary.path)
+        else:
+            logger.info(
+                "`%s`: %s - %i docs added, %i docs updated, %i stubs added, %i `REGISTER_` calls added",
+                summary.path,
+                summary.status,
+                summary.docs_added,
+                summary.docs_updated,
+                summary.stubs_added,
+                summary.register_calls_added,
+            )
+
+    logger.info(
+        "Processed %i files (%i updated, %i unchanged, %i skipped, %i failed)",
+        len(summaries),
+        sum(1 for s in summaries if s.status == "updated"),
+        sum(1 for s in summaries if s.status == "unchanged"),
+        sum(1 for s in summaries if s.status == "skipped"),
+        sum(1 for s in summaries if s.status == "failed"),
+    )
+
+
+def get_exit_status(summaries: list[FileSummary]) -> int:
+    """
+    Exit status of a run processing files - non-zero if any of them failed
+    """
+
+    return 1 if any(summary.status == "failed" for summary in summaries) else 0
+
+
+def get_report(summaries: list[FileSummary], seconds: float) -> dict:
+    """
+    Get a machine-readable report of a run (e.g. for CI): the number of files by status, the totals of each kind of change, and what was changed in each file
+    """
+
+    totals = {status: sum(1 for s in summaries if s.status == status) for status in ("updated", "unchanged", "skipped", "failed")}
+    # Totals of each kind of change over all files, and of the kinds of change split into groups (`REGISTER_` calls) by group
+    change_totals: dict[str, int] = {}
+    group_totals: dict[str, dict[str, int]] = {}
+    for summary in summaries:
+        for kind, names in (summary.changes or {}).items():
+            if isinstance(names, dict):
+                kind_totals = group_totals.setdefault(kind, {})
+                for group, group_names in names.items():
+                    kind_totals[group] = kind_totals.get(group, 0) + len(group_names)
+            else:
+                change_totals[kind] = change_totals.get(kind, 0) + len(names)
+
+    return {
+        "tool_version": __version__,
+        "seconds": round(seconds, 6),
+        "files_processed": len(summaries),
+        "totals": totals,
+        "change_totals": {**change_totals, **group_totals},
+        "files": [summary.to_json() for summary in summaries],
+    }
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, TypedDict, NotRequired
+
+from .util import atomic_write_bytes
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts of a single attempt, in seconds
+HTTP_TIMEOUT = (5, 30)
+
+# Retries of failed connections and transient server errors (these statuses), with exponential backoff (0.5s, 1s, 2s)
+HTTP_RETRIES = 3
+HTTP_RETRY_BACKOFF = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Size of the chunks the response body is read (and decompressed) in
+HTTP_CHUNK_SIZE = 1 << 16
+
+# Metadata stored alongside each cached response body
+CacheEntryMeta = TypedDict(
+    "CacheEntryMeta",
+    {
+        "url": str,
+        "fetched_at": float,  # UNIX timestamp of the last successful fetch/revalidation
+        "etag": NotRequired[str],
+        "last_modified": NotRequired[str],
+        "key": NotRequired[str],  # Content key (e.g. definitions `version-last_update`)
+    },
+)
+
+
+def get_default_cache_dir() -> Path:
+    """
+    Get the default cache directory (`$SCRIPT_FOX_CACHE_DIR`, or the platform's user cache directory)
+    """
+
+    if env := os.environ.get("SCRIPT_FOX_CACHE_DIR"):
+        return Path(env)
+    if os.name == "nt" and (local_app_data := os.environ.get("LOCALAPPDATA")):
+        return Path(local_app_data) / "script-fox"
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "script-fox"
+
+
+def is_remote(location: str) -> bool:
+    return location.startswith(("http://", "https://"))
+
+
+class DownloadCache:
+    """
+    Persistent on-disk cache of downloaded files (definitions, enums).
+    Entries are revalidated using `ETag`/`Last-Modified` once they're older than `max_age` seconds.
+    """
+
+    def __init__(self, root: Path, offline: bool = False, max_age: float = 0):
+        self.root = root
+        self.offline = offline
+        self.max_age = max_age
+        self._http: "requests.Session | None" = None
+        self._http_lock = threading.Lock()
+
+    def _get_http_session(self) -> "requests.Session":
+        """
+        Get the (pooled) HTTP session shared by all downloads, so connections are reused
+        """
+
+        # `requests` takes longer to import than most runs (with everything cached) take, so only import it when needed
+        import requests  # pylint: disable=import-outside-toplevel
+        from requests.adapters import HTTPAdapter  # pylint: disable=import-outside-toplevel
+        from urllib3.util import Retry, make_headers  # pylint: disable=import-outside-toplevel
+
+        with self._http_lock:
+            if self._http is None:
+                self._http = requests.Session()
+                retry = Retry(
+                    total=HTTP_RETRIES,
+                    backoff_factor=HTTP_RETRY_BACKOFF,
+                    status_forcelist=HTTP_RETRY_STATUSES,
+                    allowed_methods=("GET",),
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=4)
+                self._http.mount("http://", adapter)
+                self._http.mount("https://", adapter)
+                # Every encoding urllib3 can decode here (gzip, deflate, and brotli/zstd if their packages are installed)
+                self._http.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+            return self._http
+
+    def _entry_paths(self, url: str) -> tuple[Path, Path]:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        return (
+            self.root / "downloads" / f"{digest}.body",
+            self.root / "downloads" / f"{digest}.json",
+        )
+
+    def get_meta(self, url: str) -> CacheEntryMeta | None:
+        body_path, meta_path = self._entry_paths(url)
+        if not body_path.exists():
+            return None
+        try:
+            return json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def get_key(self, url: str) -> str | None:
+        """
+        Content key of a cached entry recorded with `set_key`, None if there's none
+        """
+
+        return meta.get("key") if (meta := self.get_meta(url)) else None
+
+    def set_key(self, url: str, key: str):
+        """
+        Record the content key of a cached entry (e.g. the definitions version)
+        """
+
+        if (meta := self.get_meta(url)) is None or meta.get("key") == key:
+            return
+        meta["key"] = key
+        self._write_meta(url, meta)
+
+    def _write_meta(self, url: str, meta: CacheEntryMeta):
+        atomic_write_bytes(self._entry_paths(url)[1], json.dumps(meta).encode("utf-8"))
+
+    def _store(self, url: str, body: bytes, meta: CacheEntryMeta):
+        atomic_write_bytes(self._entry_paths(url)[0], body)
+        self._write_meta(url, meta)
+
+    def fetch(self, url: str) -> bytes:
+        """
+        Get the contents of `url`, either from the cache or from the network.
+        Local paths are read directly and never cached.
+        """
+
+        if not is_remote(url):
+            return Path(url).read_bytes()
+
+        body_path, _ = self._entry_paths(url)
+        meta = self.get_meta(url)
+
+        if self.offline:
+            if meta is None:
+                raise FileNotFoundError(
+                    f"`{url}` is not cached and `--offline` was specified - run once without `--offline` to populate the cache"
+                )
+            logger.debug("Offline mode, using cached `%s`", url)
+            return body_path.read_bytes()
+
+        if meta is not None and time.time() - meta["fetched_at"] < self.max_age:
+            logger.debug("Using cached `%s` (fetched %.0fs ago)", url, time.time() - meta["fetched_at"])
+            return body_path.read_bytes()
+
+        headers = {}
+        if meta is not None:
+            if etag := meta.get("etag"):
+                headers["If-None-Match"] = etag
+            if last_modified := meta.get("last_modified"):
+                headers["If-Modified-Since"] = last_modified
+
+        http = self._get_http_session()
+        import requests  # pylint: disable=import-outside-toplevel # Already imported by `_get_http_session`
+
+        try:
+            with http.get(url, headers=headers, timeout=HTTP_TIMEOUT, stream=True) as response:
+                if response.status_code != 304:
+                    response.raise_for_status()
+                # Decompressed as it's read, so the compressed body is never held in memory as a whole
+                body = b"".join(response.iter_content(HTTP_CHUNK_SIZE))
+        except requests.RequestException as e:
+            if meta is None:
+                raise
+            logger.warning("Failed to revalidate `%s` (%s), using cached copy", url, e)
+            return body_path.read_bytes()
+
+        if response.status_code == 304 and meta is not None:
+            logger.debug("`%s` not modified, using cached copy", url)
+            meta["fetched_at"] = time.time()
+            self._write_meta(url, meta)
+            return body_path.read_bytes()
+
+        new_meta: CacheEntryMeta = {"url": url, "fetched_at": time.time()}
+        if etag := response.headers.get("ETag"):
+            new_meta["etag"] = etag
+        if last_modified := response.headers.get("Last-Modified"):
+            new_meta["last_modified"] = last_modified
+        self._store(url, body, new_meta)
+        return body
+
+    def fetch_many(self, urls: list[str]) -> list[bytes]:
+        """
+        Get the contents of all `urls` (see `fetch`), downloading them concurrently
+        """
+
+        if sum(1 for url in urls if is_remote(url)) <= 1:
+            return [self.fetch(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="fetch") as pool:
+            return list(pool.map(self.fetch, urls))
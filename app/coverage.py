@@ -0,0 +1,164 @@
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .model import Command
+from .options import Options
+from .session import Session
+
+logger = logging.getLogger(__name__)
+
+# Coverage status of a command, in order of the report columns
+STATUSES = ("implemented", "stubbed", "nop", "unsupported", "unimplemented", "missing")
+
+STATUS_BY_MACRO = {
+    "REGISTER_COMMAND_NOP": "nop",
+    "REGISTER_UNSUPPORTED_COMMAND_HANDLER": "unsupported",
+    "REGISTER_COMMAND_UNIMPLEMENTED": "unimplemented",
+}
+
+
+@dataclass(frozen=True)
+class FileScan:
+    """
+    What's relevant for coverage in a single source file (see `SymbolIndex.file_scans`)
+    """
+
+    path: Path
+    register_calls: list[tuple[str, str, str | None]] = field(default_factory=list)  # (macro, command name, handler) of calls that aren't commented out
+    handlers: dict[str, bool] = field(default_factory=dict)  # Name of each handler defined in the file -> whether its body is just the stub
+    error: str | None = None
+
+
+@dataclass(frozen=True)
+class CommandCoverage:
+    command: Command
+    extension: str
+    status: str
+    path: Path | None  # File the command is registered in, None if it's missing
+
+
+@dataclass
+class CoverageReport:
+    commands: list[CommandCoverage]
+    unknown_commands: dict[str, Path]  # Registered commands not in the definitions -> file they're registered in
+    failed_files: dict[Path, str]  # File -> error
+
+    def count_by(self, get_key) -> dict[str, dict[str, int]]:
+        """
+        Number of commands with each status, grouped by `get_key(command_coverage)` (sorted)
+        """
+
+        counts: dict[str, dict[str, int]] = {}
+        for coverage in self.commands:
+            group = counts.setdefault(get_key(coverage), dict.fromkeys(STATUSES, 0))
+            group[coverage.status] += 1
+        return dict(sorted(counts.items()))
+
+    @property
+    def by_extension(self) -> dict[str, dict[str, int]]:
+        return self.count_by(lambda coverage: coverage.extension)
+
+    @property
+    def by_class(self) -> dict[str, dict[str, int]]:
+        return self.count_by(lambda coverage: coverage.command.klass or "(no class)")
+
+    @property
+    def totals(self) -> dict[str, int]:
+        return self.count_by(lambda _: "total").get("total", dict.fromkeys(STATUSES, 0))
+
+    def to_json(self) -> dict:
+        return {
+            "totals": self.totals,
+            "by_extension": self.by_extension,
+            "by_class": self.by_class,
+            "commands": {
+                coverage.command.name: {
+                    "id": coverage.command.id,
+                    "extension": coverage.extension,
+                    "class": coverage.command.klass,
+                    "status": coverage.status,
+                    "path": str(coverage.path) if coverage.path else None,
+                }
+                for coverage in self.commands
+            },
+            "unknown_commands": {name: str(path) for name, path in self.unknown_commands.items()},
+            "failed_files": {str(path): error for path, error in self.failed_files.items()},
+        }
+
+
+def build_report(session: Session, options: Options, scans: list[FileScan]) -> CoverageReport:
+    """
+    Join the scanned files against the commands matching `options`.
+    If a command is registered more than once, the first registration (in order of `scans`) counts.
+    A registered handler is the one defined in the same file if there's one (other files may define handlers of the same name, e.g. for another game),
+    otherwise (e.g. `REGISTER_` calls written to a file of their own) it's stubbed only if all handlers of that name are.
+    """
+
+    # Handler name -> whether each of its definitions is just the stub
+    is_stub_by_handler: dict[str, list[bool]] = {}
+    for file_scan in scans:
+        for name, is_stub in file_scan.handlers.items():
+            is_stub_by_handler.setdefault(name, []).append(is_stub)
+
+    def is_stubbed(file_scan: FileScan, handler: str | None) -> bool:
+        if handler is None:  # Only for the macros without one, which have a status of their own
+            return False
+        if handler in file_scan.handlers:
+            return file_scan.handlers[handler]
+        return all(is_stub_by_handler.get(handler, [False]))
+
+    # Command name -> (status, file)
+    registered: dict[str, tuple[str, Path]] = {}
+    for file_scan in scans:
+        for macro, command_name, handler in file_scan.register_calls:
+            if command_name in registered:
+                continue
+            if not (status := STATUS_BY_MACRO.get(macro)):
+                status = "stubbed" if is_stubbed(file_scan, handler) else "implemented"
+            registered[command_name] = (status, file_scan.path)
+
+    commands = []
+    for cmd in session.filter_commands(options):
+        status, path = registered.get(cmd.name, ("missing", None))
+        commands.append(CommandCoverage(cmd, session.index.get_extension_name(cmd), status, path))
+
+    return CoverageReport(
+        commands=commands,
+        unknown_commands={
+            name: path
+            for name, (_, path) in registered.items()
+            if name not in session.index.by_name
+        },
+        failed_files={file_scan.path: file_scan.error for file_scan in scans if file_scan.error},
+    )
+
+
+def _log_table(title: str, rows: dict[str, dict[str, int]]):
+    logger.info("%-24s %7s " + " %13s" * len(STATUSES) + " %9s", title, "total", *STATUSES, "coverage")
+    for name, counts in rows.items():
+        total = sum(counts.values())
+        done = counts["implemented"] + counts["nop"] + counts["unsupported"]
+        logger.info(
+            "%-24s %7i " + " %13i" * len(STATUSES) + " %8.1f%%",
+            name,
+            total,
+            *counts.values(),
+            done / total * 100 if total else 0,
+        )
+
+
+def log_report(report: CoverageReport):
+    """
+    Log per-extension and per-class coverage tables.
+    Coverage is the share of commands that are implemented, or registered as NOP/unsupported (i.e. need no further work).
+    """
+
+    _log_table("Extension", report.by_extension)
+    _log_table("Class", report.by_class)
+    _log_table("", {"Total": report.totals})
+
+    for name, path in report.unknown_commands.items():
+        logger.warning("`%s` registers `%s`, which isn't in the definitions", path, name)
+    for path, error in report.failed_files.items():
+        logger.error("`%s`: failed - %s", path, error)
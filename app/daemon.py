@@ -0,0 +1,208 @@
+import io
+import json
+import logging
+import socketserver
+import stat
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, TextIO
+
+from . import __version__, util
+from .model import Command
+from .options import Options
+from .session import Session
+from .writers import write_docs, write_handler_function_stub, write_register_handler
+
+logger = logging.getLogger(__name__)
+
+
+class RequestError(Exception):
+    """
+    Invalid request, reported back to the client
+    """
+
+
+class Daemon:
+    """
+    Answers JSON requests using a loaded session, so clients (e.g. editors) don't pay for startup and loading definitions on every call.
+
+    The protocol is JSON lines - one request object per line, answered by one response object per line:
+    - Request: `{"id": <any>, "method": <str>, "params": {...}}` (`id` is optional and echoed back)
+    - Response: `{"id": <any>, "result": <any>}` or `{"id": <any>, "error": {"message": <str>}}`
+
+    Requests accepting `options` use the daemon's options (from the command-line) with the given fields replaced.
+    """
+
+    def __init__(self, session: Session, options: Options):
+        self.session = session
+        self.options = options
+        self.shutdown_requested = False
+        self.methods: dict[str, Callable[[dict], Any]] = {
+            "ping": self.ping,
+            "render": self.render,
+            "update": self.update,
+            "resolve_handler": self.resolve_handler,
+            "shutdown": self.shutdown,
+        }
+
+    def handle_line(self, line: str) -> str:
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise RequestError(f"Invalid JSON: {e}") from None
+            if not isinstance(request, dict):
+                raise RequestError("Request must be an object")
+            request_id = request.get("id")
+            method_name = request.get("method")
+            if not isinstance(method_name, str) or (method := self.methods.get(method_name)) is None:
+                raise RequestError(f"Unknown method `{method_name}`")
+            if not isinstance(params := request.get("params", {}), dict):
+                raise RequestError("`params` must be an object")
+
+            start = time.perf_counter()
+            result = method(params)
+            logger.debug("%s took %.2f ms", method_name, (time.perf_counter() - start) * 1000)
+            response = {"id": request_id, "result": result}
+        except (RequestError, NotImplementedError, ValueError, TypeError) as e:
+            response = {"id": request_id, "error": {"message": str(e)}}
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.exception("Failed to handle request")
+            response = {"id": request_id, "error": {"message": f"Internal error: {e}"}}
+        return json.dumps(response)
+
+    def _get_options(self, params: dict) -> Options:
+        if not isinstance(overrides := params.get("options", {}), dict):
+            raise RequestError("`options` must be an object")
+        return self.options.merged(overrides)
+
+    def _get_command(self, params: dict) -> Command:
+        """
+        Find the command given by name (with or without `COMMAND_` prefix) or opcode (with or without `0x` prefix)
+        """
+
+        if not isinstance(name := params.get("command"), str):
+            raise RequestError("`command` (name or opcode) is required")
+        index = self.session.index
+        command = index.by_name.get(name.upper().removeprefix("COMMAND_")) or index.by_opcode.get(
+            name.upper().removeprefix("0X")
+        )
+        if command is None:
+            raise RequestError(f"Unknown command `{name}`")
+        return command
+
+    def ping(self, params: dict) -> dict:
+        return {"tool_version": __version__, "definitions_key": self.session.definitions_key}
+
+    def render(self, params: dict) -> dict:
+        """
+        Render the docs, handler stub and `REGISTER_` call of a command (`null` for a stub of a command without a handler, e.g. a NOP)
+        """
+
+        command, options = self._get_command(params), self._get_options(params)
+
+        def render_with(write: Callable[[TextIO, Command, Any, Options], None]) -> str:
+            with io.StringIO() as f:
+                write(f, command, self.session.mapper, options)
+                return f.getvalue()
+
+        return {
+            "docs": render_with(write_docs),
+            "stub": render_with(write_handler_function_stub) if util.get_handler_name(command) else None,
+            "register": render_with(write_register_handler),
+        }
+
+    def update(self, params: dict) -> dict:
+        """
+        Add missing docs, stubs and `REGISTER_` calls (for commands matching `options`) to the contents of a file (`text`)
+        """
+
+        if not isinstance(text := params.get("text"), str):
+            raise RequestError("`text` is required")
+        result = self.session.update_existing(self._get_options(params), text)
+        return {
+            "text": result.text,
+            "changed": result.text != text,
+            "docs_added": result.docs_added,
+            "docs_updated": result.docs_updated,
+            "stubs_added": result.stubs_added,
+            "register_calls_added": result.register_calls_added,
+        }
+
+    def resolve_handler(self, params: dict) -> dict | None:
+        """
+        Find the command a handler function (`name`) belongs to, `null` if none
+        """
+
+        if not isinstance(name := params.get("name"), str):
+            raise RequestError("`name` is required")
+        if (command := self.session.index.by_handler_name.get(name.lower())) is None:
+            return None
+        return {"name": command.name, "id": command.id, "class": command.klass, "member": command.member}
+
+    def shutdown(self, params: dict) -> dict:
+        self.shutdown_requested = True
+        return {}
+
+
+def serve_stdio(daemon: Daemon, stdin: TextIO = sys.stdin, stdout: TextIO = sys.stdout):
+    """
+    Answer requests read from `stdin` until it's closed or a `shutdown` request
+    """
+
+    logger.info("Daemon ready, reading requests from stdin")
+    for line in stdin:
+        if not line.strip():
+            continue
+        stdout.write(daemon.handle_line(line) + "\n")
+        stdout.flush()
+        if daemon.shutdown_requested:
+            break
+
+
+def remove_socket(path: Path):
+    """
+    Remove the (stale) socket at `path`, if there's one. Anything else there is left alone
+    """
+
+    try:
+        mode = path.lstat().st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"`{path}` exists and isn't a socket, not replacing it")
+    path.unlink(missing_ok=True)
+
+
+def serve_unix_socket(daemon: Daemon, path: Path):
+    """
+    Answer requests of any number of (concurrent) connections to a Unix socket at `path` until a `shutdown` request.
+    Raises `FileExistsError` if there's something other than a socket at `path`
+    """
+
+    if not hasattr(socketserver, "UnixStreamServer"):
+        raise NotImplementedError("Unix sockets aren't supported on this platform, use stdio instead")
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                self.wfile.write((daemon.handle_line(line.decode("utf-8")) + "\n").encode("utf-8"))
+                self.wfile.flush()
+                if daemon.shutdown_requested:
+                    self.server.shutdown()  # Waits for `serve_forever` (in the main thread) to stop
+                    break
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):  # type: ignore[name-defined]
+        daemon_threads = True
+
+    remove_socket(path)
+    with Server(str(path), Handler) as server:
+        logger.info("Daemon ready, listening on `%s`", path)
+        try:
+            server.serve_forever()
+        finally:
+            remove_socket(path)
@@ -1,27 +1,130 @@
 import datetime
+import json
 import logging
-import requests
+import re
+from dataclasses import dataclass
 
-from .jsontypes import Definitions
-from .args import args
+from .jsontypes import Extension, Meta
 
 logger = logging.getLogger(__name__)
 
-# Load command definitions
-DEFINITIONS: Definitions = requests.get(args.definitions, timeout=15).json()
-logger.info(
-    "Loaded definitions from `%s`, version %s, last updated at %s (UTC)",
-    args.definitions,
-    DEFINITIONS["meta"]["version"],
-    datetime.datetime.fromtimestamp(DEFINITIONS["meta"]["last_update"] / 1000).strftime(
-        "%Y-%m-%d %H:%M:%S"
-    ),
-)
-
-# Load enum definitions to apply additional type mappings
-ENUMS = {
-    line.split(" ", 1)[1].strip()  # enum name
-    for line in requests.get(args.enum_definitions, timeout=15).text.splitlines()
-    if line.startswith("enum ")
-}
-logger.info("Loaded %d enums from `%s`", len(ENUMS), args.enum_definitions)
+
+@dataclass(frozen=True)
+class DefinitionSet:
+    """
+    Command and enum definitions (URLs or local paths) of a game
+    """
+
+    definitions_url: str
+    enum_definitions_url: str
+
+
+def get_library_definition_set(game: str) -> DefinitionSet:
+    return DefinitionSet(
+        f"https://library.sannybuilder.com/assets/{game}/{game}.json",
+        f"https://library.sannybuilder.com/assets/{game}/enums.txt",
+    )
+
+
+# Definition sets published by the Sanny Builder Library, by game
+GAMES = {game: get_library_definition_set(game) for game in ("gta3", "vc", "sa", "sa_mobile")}
+DEFAULT_GAME = "sa"
+
+DEFAULT_DEFINITIONS_URL = GAMES[DEFAULT_GAME].definitions_url
+DEFAULT_ENUM_DEFINITIONS_URL = GAMES[DEFAULT_GAME].enum_definitions_url
+
+
+def get_definitions_key(meta: Meta) -> str:
+    """
+    Get a key identifying the version of the definitions with the given metadata
+    """
+
+    return f'{meta["version"]}-{meta["last_update"]}'
+
+
+def read_definitions_meta(raw: bytes) -> Meta:
+    """
+    Read the `meta` object of raw definitions JSON without decoding the rest of it
+    """
+
+    # `meta` is a flat object at the start of the file
+    if (i_meta := raw.find(b'"meta"')) != -1:
+        i_object = raw.find(b"{", i_meta)
+        try:
+            meta = json.loads(raw[i_object : raw.find(b"}", i_object) + 1])
+            if "version" in meta and "last_update" in meta:
+                return meta
+        except ValueError:
+            pass  # Not what we expected, decode the whole thing instead
+    return json.loads(raw)["meta"]
+
+
+# Start of an extension object. Quotes inside JSON strings are always escaped, so these can't match inside of one
+EXTENSION_START_PATTERN = re.compile(rb'\{\s*"name"\s*:\s*"((?:[^"\\]|\\.)*)"\s*,\s*"commands"\s*:\s*\[')
+EXTENSION_COMMANDS_PATTERN = re.compile(rb'"commands"\s*:\s*\[')
+CLASS_NAME_PATTERN = re.compile(rb'"class"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def find_extensions(raw: bytes) -> dict[str, tuple[int, int]] | None:
+    """
+    Find the byte range of each extension in raw definitions JSON without decoding it, by extension name (in definitions order).
+    A range starts at the extension object and ends where the next one starts (so it may include separators after the object).
+    None if the layout isn't as expected, in which case the definitions have to be decoded as a whole.
+    """
+
+    # Only extensions have `commands`, so find those (a cheap search for a literal) and check the start of their object
+    starts = []
+    i_commands = raw.find(b'"commands"')
+    while i_commands != -1:
+        if match := EXTENSION_COMMANDS_PATTERN.match(raw, i_commands):
+            i_start = raw.rfind(b"{", 0, i_commands)
+            if not (start := EXTENSION_START_PATTERN.match(raw, i_start)) or start.end() != match.end():
+                return None
+            starts.append((i_start, json.loads(b'"%s"' % start[1])))
+        i_commands = raw.find(b'"commands"', i_commands + 1)
+    if not starts:
+        return None
+
+    ends = [i_start for i_start, _ in starts[1:]] + [len(raw)]
+    spans = {name: (i_start, i_end) for (i_start, name), i_end in zip(starts, ends)}
+    return spans if len(spans) == len(starts) else None
+
+
+def decode_extension(raw: bytes, span: tuple[int, int]) -> Extension:
+    """
+    Decode a single extension found by `find_extensions`
+    """
+
+    extension, _ = json.JSONDecoder().raw_decode(raw[span[0] : span[1]].decode("utf-8"))
+    return extension
+
+
+def read_class_names(raw: bytes) -> set[str]:
+    """
+    Get the class names of all commands from raw definitions JSON without decoding it
+    """
+
+    return {json.loads(b'"%s"' % name) for name in set(CLASS_NAME_PATTERN.findall(raw)) if name}
+
+
+def parse_enums(raw: bytes) -> set[str]:
+    """
+    Get the enum names from raw enum definitions, used to apply additional type mappings
+    """
+
+    return {
+        line.split(" ", 1)[1].strip()  # enum name
+        for line in raw.decode("utf-8").splitlines()
+        if line.startswith("enum ")
+    }
+
+
+def log_loaded_definitions(url: str, meta: Meta):
+    logger.info(
+        "Loaded definitions from `%s`, version %s, last updated at %s (UTC)",
+        url,
+        meta["version"],
+        datetime.datetime.fromtimestamp(meta["last_update"] / 1000).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        ),
+    )
@@ -0,0 +1,366 @@
+import io
+import logging
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from .metrics import metrics
+from .model import Command
+from .options import Options
+from .rendercache import RenderCache, Renderer
+from .scanner import scan
+from .typemapper import TypeMapper
+
+if TYPE_CHECKING:
+    from .session import Session
+
+logger = logging.getLogger(__name__)
+
+# Groups `REGISTER_` calls are written in by `update_existing`, in order
+REGISTER_CALL_GROUPS = ("regular", "nop", "unsupported")
+
+
+@dataclass
+class UpdateResult:
+    """
+    Output of `update_existing`
+    """
+
+    text: str  # New contents of the file
+    # Names of commands (without `COMMAND_` prefix) for which...
+    docs_added: list[str] = field(default_factory=list)  # ...docs were added to an existing handler
+    docs_updated: list[str] = field(default_factory=list)  # ...existing docs were updated
+    stubs_added: list[str] = field(default_factory=list)  # ...a handler stub (with docs) was added
+    register_calls_added: list[str] = field(default_factory=list)  # ...a `REGISTER_` call was added
+    # ...a `REGISTER_` call was added, by group the call was written in (see `REGISTER_CALL_GROUPS`)
+    register_calls_added_by_group: dict[str, list[str]] = field(default_factory=lambda: {group: [] for group in REGISTER_CALL_GROUPS})
+    unknown_commands: list[str] = field(default_factory=list)  # ...docs were found, but which aren't in the definitions
+    unresolved_handlers: list[str] = field(default_factory=list)  # Handler functions that couldn't be resolved to any command
+
+    def to_json(self) -> dict:
+        """
+        What was changed (everything but the new contents), for reports
+        """
+
+        return {
+            "docs_added": self.docs_added,
+            "docs_updated": self.docs_updated,
+            "stubs_added": self.stubs_added,
+            "register_calls_added": self.register_calls_added_by_group,
+            "unknown_commands": self.unknown_commands,
+            "unresolved_handlers": self.unresolved_handlers,
+        }
+
+
+@dataclass(frozen=True)
+class GeneratedFiles:
+    """
+    Output of `generate_new`
+    """
+
+    stubs: str  # Docs and handler stubs
+    handlers: str  # `REGISTER_` calls
+
+
+def update_existing(
+    session: "Session",
+    options: Options,
+    text: str,
+    commands_by_criteria: list[Command],
+    docs_to_refresh: set[str] | None = None,
+) -> UpdateResult:
+    """
+    Update the contents of an existing file with missing docs, stubs and `REGISTER_` calls.
+    With `update_existing_docs`, existing docs are rewritten if their command is in `docs_to_refresh` (or always, if it's None).
+    """
+
+    commands_by_name = session.index.by_name
+    mapper = session.mapper
+
+    with metrics.phase("scan"):
+        scanned = scan(text)
+    lines = scanned.lines
+    metrics.count("lines_scanned", len(lines))
+    result = UpdateResult(text)
+    renderer = Renderer(mapper, options, session.render_cache)
+
+    with io.StringIO() as f:
+        # We assume `RegisterHandlers` is at the end of the file, if not, the code below won't work all that good...
+        register_handlers_line_index = scanned.register_handlers_line
+        if register_handlers_line_index == -1:
+            raise NotImplementedError(
+                "Could not find `RegisterHandlers()` function in the input file - cannot add missing handlers"
+            ) from None
+        register_command_handler_begin_line_index = scanned.register_handler_begin_line
+        if register_command_handler_begin_line_index == -1:
+            raise NotImplementedError(
+                "Could not find `REGISTER_COMMAND_HANDLER_BEGIN` in the input file - cannot add missing handlers"
+            ) from None
+
+        # All already registered handlers in the file, to avoid adding duplicate registrations/stubs
+        # (Includes commented out register lines as well)
+        register_call_by_command = {
+            call.command_name: (call.handler, call.macro)  # No COMMAND_ prefix
+            for call in scanned.register_calls
+        }
+
+        commands_by_handler_name = session.index.by_handler_name
+
+        # Find commands that match the criteria but don't have a handler registered (in definitions order)
+        missing_register_handler_commands = [
+            cmd
+            for cmd in commands_by_criteria
+            if cmd.name not in register_call_by_command
+        ]
+
+        # Check if line should be written as-is, or needs to be replaced by new docs comment
+        def get_line_info(
+            i_line: int,
+        ) -> tuple[Command, bool] | tuple[None, None]:
+            # Handle old-style single-line docs comments (of registered commands) and replace them with new-style
+            if (command_name := scanned.singleline_docs.get(i_line)) in register_call_by_command:
+                command = commands_by_name.get(command_name)
+
+                if command:
+                    return command, True
+
+                logger.warning(
+                    "Command `%s` found in docs comment but not in definitions, skipping doc generation for it",
+                    command_name,
+                )
+                result.unknown_commands.append(command_name)
+
+            # Try matching to a function
+            elif handler := scanned.handlers.get(i_line):
+                command = commands_by_handler_name.get(handler.handler_name.lower())
+
+                if command:
+                    return command, False
+
+                logger.warning(
+                    "Can't resolve function `%s` to any command in definitions, skipping doc generation for it",
+                    handler.handler_name,
+                )
+                result.unresolved_handlers.append(handler.handler_name)
+
+            return None, None
+
+        # Keep track of handlers we've already added docs for
+        has_docs_commands = set()
+        handlers_found = set()
+
+        # Process rest of the file
+        i_line = 0
+        while i_line < register_handlers_line_index:
+            line = lines[i_line]
+
+            if doc_block := scanned.doc_blocks.get(i_line):
+                if doc_block.end is None:
+                    raise NotImplementedError(
+                        f"Unclosed comment block starting at line {i_line}, cannot update existing docs"
+                    ) from None
+
+                if command_name := doc_block.command_name:
+                    # Avoid generating docs again
+                    has_docs_commands.add(command_name)
+
+                    if options.update_existing_docs and (docs_to_refresh is None or command_name in docs_to_refresh):
+                        # Write new docs and skip to line after the docs end
+                        try:
+                            renderer.write("docs", f, commands_by_name[command_name])
+                            result.docs_updated.append(command_name)
+                            logger.info(
+                                "Updated docs for command `%s` based on definitions file",
+                                command_name
+                            )
+                        except KeyError:
+                            logger.warning(
+                                "Command `%s` found in docs comment but not in definitions, skipping doc generation for it",
+                                command_name,
+                            )
+                            result.unknown_commands.append(command_name)
+                        i_line = doc_block.end + 1
+                        continue
+
+            command, replace_line = get_line_info(i_line)
+            if command:
+                handlers_found.add(command.name)
+                if command.name not in has_docs_commands:
+                    renderer.write("docs", f, command)
+                    has_docs_commands.add(command.name)
+                    result.docs_added.append(command.name)
+                    if replace_line:
+                        i_line += 1
+                        continue
+
+            f.write(line)
+            i_line += 1
+
+        logger.info("Added missing docs to %i handlers", len(has_docs_commands))
+
+        # Add missing stubs (after existing handlers but before the `RegisterHandlers` function)
+        for cmd in missing_register_handler_commands:
+            if cmd.name in handlers_found:
+                continue
+            renderer.write("docs", f, cmd)
+            renderer.write("stub", f, cmd)
+            f.write("\n")
+            result.stubs_added.append(cmd.name)
+
+        # Write the line with `RegisterHandlers()` function declaration and `REGISTER_COMMAND_HANDLER_BEGIN` before adding new handlers
+        for v in lines[
+            register_handlers_line_index : register_command_handler_begin_line_index + 1
+        ]:
+            f.write(v)
+
+        # Add missing register handler calls
+        # They're written in groups - regular, nops, unsupported
+        if options.generate_register_calls and missing_register_handler_commands:
+            handlers_f_by_group = {group: io.StringIO() for group in REGISTER_CALL_GROUPS}
+
+            def get_group_for_command(cmd: Command) -> str:
+                if (
+                    cmd.is_unsupported
+                ):  # This should be before the nop handler, since some commands can be both unsupported and nop, but we want to prioritize unsupported in that case
+                    return "unsupported"
+
+                if cmd.is_nop:
+                    return "nop"
+
+                return "regular"
+
+            for cmd in missing_register_handler_commands:
+                group = get_group_for_command(cmd)
+                renderer.write("register", handlers_f_by_group[group], cmd)
+                result.register_calls_added.append(cmd.name)
+                result.register_calls_added_by_group[group].append(cmd.name)
+
+            # Write these back into the file in the correct order
+            for handlers_f in handlers_f_by_group.values():
+                if content := handlers_f.getvalue():  # maybe seek?
+                    f.write("\n")
+                    f.write(content)
+
+            logger.info(
+                "Added missing handlers for %i commands",
+                len(missing_register_handler_commands),
+            )
+
+        # Write rest of the file as-is
+        for v in lines[register_command_handler_begin_line_index + 1 :]:
+            f.write(v)
+
+        result.text = f.getvalue()
+    renderer.flush()
+
+    metrics.count("docs_written", len(result.docs_added) + len(result.docs_updated) + len(result.stubs_added))
+    metrics.count("docs_added", len(result.docs_added))
+    metrics.count("docs_updated", len(result.docs_updated))
+    metrics.count("stubs_added", len(result.stubs_added))
+    metrics.count("register_calls_added", len(result.register_calls_added))
+    return result
+
+
+# Below this many commands, starting worker processes takes longer than rendering serially
+PARALLEL_MIN_COMMANDS = 1000
+# Number of commands rendered by each task of a worker process
+CHUNK_SIZE = 250
+
+
+@dataclass(frozen=True)
+class RenderedChunk:
+    """
+    Output of `render_chunk`, for a consecutive range of commands
+    """
+
+    stubs: str  # Docs and handler stubs
+    register_calls: str  # `REGISTER_` calls of regular commands
+    nop_register_calls: str  # `REGISTER_` calls of NOP commands (grouped after the regular ones in the output)
+    nop_commands: list[tuple[str, str]]  # (name, id) of NOP commands, which have no stub
+
+
+def render_chunk(mapper: TypeMapper, options: Options, commands: list[Command], cache: RenderCache | None = None) -> RenderedChunk:
+    """
+    Render the docs, stubs and `REGISTER_` calls (if enabled) of `commands` in a single pass, reusing fragments of `cache` (if any)
+    """
+
+    renderer = Renderer(mapper, options, cache)
+    stub_commands = [cmd for cmd in commands if not cmd.is_nop]
+    renderer.prefetch("docs", stub_commands)
+    renderer.prefetch("stub", stub_commands)
+    if options.generate_register_calls:
+        renderer.prefetch("register", commands)
+
+    with io.StringIO() as stubs_f, io.StringIO() as register_calls_f, io.StringIO() as nop_register_calls_f:
+        nop_commands = []
+        for cmd in commands:
+            if cmd.is_nop:
+                nop_commands.append((cmd.name, cmd.id))
+            else:
+                renderer.write("docs", stubs_f, cmd)
+                renderer.write("stub", stubs_f, cmd)
+                stubs_f.write("\n")
+
+            if options.generate_register_calls:
+                renderer.write("register", nop_register_calls_f if cmd.is_nop else register_calls_f, cmd)
+
+        renderer.flush()
+        return RenderedChunk(stubs_f.getvalue(), register_calls_f.getvalue(), nop_register_calls_f.getvalue(), nop_commands)
+
+
+# Type mapper, options and render cache of pool worker processes, set up once per worker by `_init_worker`
+_worker_state: tuple[TypeMapper, Options, RenderCache | None] | None = None
+
+
+def _init_worker(type_mapping: dict[str, str], options: Options, cache: RenderCache | None):
+    global _worker_state  # pylint: disable=global-statement
+    _worker_state = (TypeMapper(type_mapping), options, cache)
+
+
+def _render_chunk_in_worker(commands: list[Command]) -> RenderedChunk:
+    assert _worker_state is not None
+    mapper, options, cache = _worker_state
+    return render_chunk(mapper, options, commands, cache)
+
+
+def generate_new(
+    session: "Session",
+    options: Options,
+    commands_by_criteria: list[Command],
+    workers: int = 1,
+) -> GeneratedFiles:
+    """
+    Generate docs and stubs, and `REGISTER_` calls (if enabled) for the given commands.
+    Many commands are rendered in chunks by a pool of `workers` processes, the output is the same as rendering them serially.
+    """
+
+    if workers <= 1 or len(commands_by_criteria) < PARALLEL_MIN_COMMANDS:
+        chunks = [render_chunk(session.mapper, options, commands_by_criteria, session.render_cache)]
+    else:
+        from concurrent.futures import ProcessPoolExecutor  # pylint: disable=import-outside-toplevel # Imports `multiprocessing`, which is slow
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(session.mapper.type_mapping, options, session.render_cache),
+        ) as pool:
+            chunks = list(
+                pool.map(
+                    _render_chunk_in_worker,
+                    [commands_by_criteria[i : i + CHUNK_SIZE] for i in range(0, len(commands_by_criteria), CHUNK_SIZE)],
+                )
+            )
+
+    for chunk in chunks:
+        for name, opcode in chunk.nop_commands:
+            logger.warning("No stub will be generated for command %s (%s) since it is marked as a no-op", name, opcode)
+
+    num_stubs = len(commands_by_criteria) - sum(len(chunk.nop_commands) for chunk in chunks)
+    metrics.count("docs_written", num_stubs)
+    metrics.count("stubs_added", num_stubs)
+    if options.generate_register_calls:
+        metrics.count("register_calls_added", len(commands_by_criteria))
+
+    # Regular commands are grouped before NOPs
+    return GeneratedFiles(
+        stubs="".join(chunk.stubs for chunk in chunks),
+        handlers="".join(chunk.register_calls for chunk in chunks) + "".join(chunk.nop_register_calls for chunk in chunks),
+    )
@@ -0,0 +1,206 @@
+import json
+import logging
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import util
+from .batch import FileSummary, get_docs_to_refresh, update_file
+from .data import GAMES, DefinitionSet
+from .generate import REGISTER_CALL_GROUPS
+from .logging import configure_logging
+from .manifest import Manifest, get_options_key
+from .model import Command
+from .options import OPTION_NAMES, Options
+from .session import Session
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Job:
+    """
+    A single generation request of a jobs file
+    """
+
+    options: Options
+    input: Path | None  # File to update (generate a new file if None)
+    output: Path  # File to write (for new files, `REGISTER_` calls are written next to it, to `<stem>.handlers<suffix>`)
+    game: str | None = None  # Game whose definitions are used (see `GAMES`), None for the command-line definitions
+
+
+def _parse_game(data: dict, default: str | None, where: str) -> str | None:
+    if (game := data.get("game", default)) is not None and game not in GAMES:
+        raise ValueError(f"{where}: unknown game `{game}` (expected one of `{'`, `'.join(GAMES)}`)")
+    return game
+
+
+def _parse_job(data: dict, defaults: Options, default_game: str | None, base_dir: Path, where: str) -> Job:
+    if unknown := set(data) - OPTION_NAMES - {"input", "output", "game"}:
+        raise ValueError(f"{where}: unknown keys `{'`, `'.join(sorted(unknown))}`")
+
+    input_path = base_dir / data["input"] if "input" in data else None
+    if "output" in data:
+        output_path = base_dir / data["output"]
+    elif input_path is not None:
+        output_path = input_path  # Update in-place
+    else:
+        raise ValueError(f"{where}: either `input` or `output` is required")
+
+    return Job(
+        options=defaults.merged({name: value for name, value in data.items() if name in OPTION_NAMES}),
+        input=input_path,
+        output=output_path,
+        game=_parse_game(data, default_game, where),
+    )
+
+
+def load_jobs(path: Path, defaults: Options) -> list[Job]:
+    """
+    Load jobs from a TOML or JSON (by extension) file with an optional `defaults` table and a `jobs` array.
+    Jobs have the same keys as `Options`, plus `input` (update an existing file) and/or `output` (generate a new file if there's no `input`),
+    and `game` (use the definitions of that game instead of the command-line ones, may also be set in `defaults`).
+    Options not given in a job are taken from `defaults`, then from the `defaults` argument (i.e. the command-line).
+    Relative paths are relative to the jobs file.
+    """
+
+    with path.open("rb") as f:
+        data = json.load(f) if path.suffix.lower() == ".json" else tomllib.load(f)
+
+    if unknown := set(data) - {"defaults", "jobs"}:
+        raise ValueError(f"`{path}`: unknown keys `{'`, `'.join(sorted(unknown))}`")
+    default_options = dict(data.get("defaults", {}))
+    default_game = _parse_game(default_options, None, f"`{path}` defaults")
+    default_options.pop("game", None)
+    defaults = defaults.merged(default_options, f"`{path}` defaults")
+
+    jobs = [
+        _parse_job(job, defaults, default_game, path.parent, f"`{path}` job #{i + 1}")
+        for i, job in enumerate(data.get("jobs", []))
+    ]
+
+    # Jobs run concurrently, so they must not write the same file
+    outputs: dict[Path, int] = {}
+    for i, job in enumerate(jobs):
+        if (other := outputs.setdefault(job.output.resolve(), i)) != i:
+            raise ValueError(f"`{path}`: jobs #{other + 1} and #{i + 1} both write `{job.output}`")
+
+    return jobs
+
+
+def get_definition_sets(jobs: list[Job], default: DefinitionSet) -> dict[str | None, DefinitionSet]:
+    """
+    Definition sets used by `jobs`, by game (None for the command-line definitions, `default`)
+    """
+
+    return {job.game: GAMES[job.game] if job.game else default for job in jobs}
+
+
+def generate_file(session: Session, options: Options, commands: list[Command], output_path: Path) -> FileSummary:
+    """
+    Generate a new file with docs and stubs (and one with the `REGISTER_` calls next to it)
+    """
+
+    start = time.perf_counter()
+    try:
+        generated = session.generate_new(options, commands)
+        written = util.write_text_if_changed(output_path, generated.stubs)
+        written |= util.write_text_if_changed(output_path.with_stem(f"{output_path.stem}.handlers"), generated.handlers)
+    except OSError as e:
+        return FileSummary(output_path, "failed", error=str(e), seconds=time.perf_counter() - start)
+
+    # NOP commands get no stub, and their `REGISTER_` calls are written after the regular ones
+    register_calls_added: dict[str, list[str]] = {group: [] for group in REGISTER_CALL_GROUPS}
+    if options.generate_register_calls:
+        for cmd in commands:
+            register_calls_added["nop" if cmd.is_nop else "regular"].append(cmd.name)
+    return FileSummary(
+        output_path,
+        "updated" if written else "unchanged",
+        stubs_added=sum(1 for cmd in commands if not cmd.is_nop),
+        register_calls_added=len(commands) if options.generate_register_calls else 0,
+        changes={
+            "stubs_added": [cmd.name for cmd in commands if not cmd.is_nop],
+            "register_calls_added": register_calls_added,
+        },
+        seconds=time.perf_counter() - start,
+    )
+
+
+def run_job(session: Session, job: Job, docs_to_refresh: set[str] | None = None) -> FileSummary:
+    commands = session.filter_commands(job.options)
+    if not commands:
+        return FileSummary(job.input or job.output, "failed", error="No commands matched the given criteria")
+    if job.input is None:
+        return generate_file(session, job.options, commands, job.output)
+    return update_file(session, job.options, commands, job.input, job.output, docs_to_refresh)
+
+
+# Sessions (by game) of pool worker processes, set up once per worker by `_init_worker`
+_worker_sessions: dict[str | None, Session] | None = None
+
+
+def _init_worker(sessions: dict[str | None, Session]):
+    global _worker_sessions  # pylint: disable=global-statement
+    configure_logging()
+    _worker_sessions = sessions
+
+
+def _run_job_in_worker(job: Job, docs_to_refresh: set[str] | None) -> FileSummary:
+    assert _worker_sessions is not None
+    return run_job(_worker_sessions[job.game], job, docs_to_refresh)
+
+
+def run_jobs(
+    sessions: dict[str | None, Session],
+    jobs: list[Job],
+    workers: int,
+    manifest: Manifest | None = None,
+    force: bool = False,
+) -> list[FileSummary]:
+    """
+    Run all `jobs` with the session of their game (see `get_definition_sets`), using a pool of `workers` processes.
+    The sessions are sent to each worker once, so definitions are only loaded (and indexed) once for all jobs.
+    If a `manifest` is given, update jobs whose files are up-to-date according to it are skipped (unless `force` is set).
+    """
+
+    def is_up_to_date(job: Job) -> bool:
+        return bool(
+            manifest
+            and not force
+            and job.input
+            and manifest.is_up_to_date(job.input, job.output, sessions[job.game].definitions_signature, get_options_key(job.options))
+        )
+
+    summaries_by_job = {i: FileSummary(job.input or job.output, "skipped") for i, job in enumerate(jobs) if is_up_to_date(job)}
+    pending = [i for i in range(len(jobs)) if i not in summaries_by_job]
+    docs_to_refresh = [
+        get_docs_to_refresh(sessions[job.game], job.options, manifest, job.input, job.output) if job.input else None
+        for job in (jobs[i] for i in pending)
+    ]
+
+    if workers <= 1 or len(pending) <= 1:
+        summaries = [run_job(sessions[jobs[i].game], jobs[i], docs) for i, docs in zip(pending, docs_to_refresh)]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(pending)),
+            initializer=_init_worker,
+            initargs=(sessions,),
+        ) as pool:
+            summaries = list(pool.map(_run_job_in_worker, [jobs[i] for i in pending], docs_to_refresh))
+
+    for i, summary in zip(pending, summaries):
+        summaries_by_job[i] = summary
+        job = jobs[i]
+        if manifest and job.input and summary.status != "failed":
+            manifest.record(
+                job.input,
+                job.output,
+                sessions[job.game].definitions_signature,
+                get_options_key(job.options),
+                sessions[job.game].get_docs_version(job.options) if job.options.update_existing_docs else None,
+            )
+
+    return [summaries_by_job[i] for i in range(len(jobs))]
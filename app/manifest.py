@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+from dataclasses import asdict
+from pathlib import Path
+from typing import TypedDict, NotRequired
+
+from . import __version__
+from .util import atomic_write_bytes
+from .options import Options
+
+logger = logging.getLogger(__name__)
+
+FileSignature = TypedDict("FileSignature", {"mtime_ns": int, "size": int, "hash": str})
+
+# Definitions version docs were rendered from, and a key of how they were rendered (see `Session.get_docs_version`)
+DocsVersion = TypedDict("DocsVersion", {"definitions_key": str, "render_key": str})
+
+ManifestEntry = TypedDict(
+    "ManifestEntry",
+    {
+        "input": FileSignature,  # Input file after processing (which is the output if it was updated in-place)
+        "output": NotRequired[FileSignature],  # Only present if the output is a different file
+        "definitions_signature": str,  # See `Session.definitions_signature`
+        "options_key": str,
+        "tool_version": str,
+        "docs_version": NotRequired[DocsVersion],  # What the existing docs were last refreshed with (`--update-existing-docs`)
+    },
+)
+
+
+def get_options_key(options: Options) -> str:
+    return hashlib.sha256(json.dumps(asdict(options), sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def get_file_signature(path: Path, known: FileSignature | None = None) -> FileSignature | None:
+    """
+    Get the signature of a file, or None if it doesn't exist.
+    If the modification time and size match `known`, it's returned as-is without reading the file.
+    """
+
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    if known and known["mtime_ns"] == stat.st_mtime_ns and known["size"] == stat.st_size:
+        return known
+    return {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": hashlib.sha256(path.read_bytes()).hexdigest(),
+    }
+
+
+class Manifest:
+    """
+    Persistent record of processed files, used to skip files whose inputs haven't changed since they were last processed.
+    A file is up-to-date if its contents, the definitions (their source, version and type mappings), the options and the tool version are all the same.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[str, ManifestEntry] = {}
+        self.dirty = False
+        try:
+            self.entries = json.loads(path.read_text(encoding="utf-8"))["files"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable manifest `%s` (%s)", path, e)
+
+    def _is_same_file(self, path: Path, known: FileSignature) -> bool:
+        if (signature := get_file_signature(path, known)) is None or signature["hash"] != known["hash"]:
+            return False
+        if signature is not known:  # Touched, but the contents are the same - avoid hashing it again next time
+            known.update(signature)
+            self.dirty = True
+        return True
+
+    def is_up_to_date(self, path: Path, output_path: Path, definitions_signature: str, options_key: str) -> bool:
+        entry = self.entries.get(str(path.resolve()))
+        if entry is None or (
+            entry.get("definitions_signature") != definitions_signature
+            or entry["options_key"] != options_key
+            or entry["tool_version"] != __version__
+        ):
+            return False
+        if not self._is_same_file(path, entry["input"]):
+            return False
+        if output_path.resolve() != path.resolve():
+            return "output" in entry and self._is_same_file(output_path, entry["output"])
+        return True
+
+    def get_docs_version(self, path: Path) -> DocsVersion | None:
+        """
+        Get what the docs of a file were last refreshed with, if known
+        """
+
+        entry = self.entries.get(str(path.resolve()))
+        return entry.get("docs_version") if entry is not None else None
+
+    def record(
+        self,
+        path: Path,
+        output_path: Path,
+        definitions_signature: str,
+        options_key: str,
+        docs_version: DocsVersion | None = None,
+    ):
+        """
+        Record a file as processed, should be called after the output was written.
+        `docs_version` is what its existing docs were refreshed with (`--update-existing-docs`), if they were.
+        That's only recorded for files updated in-place - otherwise the docs are read from an input that was never updated, so they all have to be refreshed every time.
+        """
+
+        input_signature = get_file_signature(path)
+        if input_signature is None:
+            return
+        entry: ManifestEntry = {
+            "input": input_signature,
+            "definitions_signature": definitions_signature,
+            "options_key": options_key,
+            "tool_version": __version__,
+        }
+        if output_path.resolve() != path.resolve() and (output_signature := get_file_signature(output_path)):
+            entry["output"] = output_signature
+        if output_path.resolve() == path.resolve():
+            if docs_version := docs_version or self.get_docs_version(path):
+                entry["docs_version"] = docs_version
+        self.entries[str(path.resolve())] = entry
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        atomic_write_bytes(self.path, json.dumps({"files": self.entries}, indent=1).encode("utf-8"))
+        self.dirty = False
@@ -0,0 +1,102 @@
+import contextlib
+import logging
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PhaseMetrics:
+    """
+    Totals of all runs of a phase
+    """
+
+    calls: int = 0
+    seconds: float = 0
+    peak_memory: int | None = None  # Peak traced memory in bytes (while any run of the phase was active), None if memory isn't traced
+
+
+class Metrics:
+    """
+    Collects wall time (and optionally peak memory) per phase, and counters (commands, lines scanned, docs written, etc...).
+    Disabled by default, in which case recording is (almost) free.
+    Phases may be nested, the time of a nested phase is included in the outer one.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.phases: dict[str, PhaseMetrics] = {}
+        self.counters: dict[str, int] = {}
+        self._peaks: list[int] = []  # Peak memory of each active phase so far, innermost last
+
+    def enable(self, trace_memory: bool = False):
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Record the wall time (and peak memory) of the block as a run of the phase `name`
+        """
+
+        if not self.enabled:
+            yield
+            return
+
+        if self.trace_memory:
+            # `tracemalloc` has a single peak, so carry the peak of outer phases over before resetting it
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase = self.phases.setdefault(name, PhaseMetrics())
+            phase.calls += 1
+            phase.seconds += time.perf_counter() - start
+
+            if self.trace_memory:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                phase.peak_memory = max(phase.peak_memory or 0, peak)
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_json(self) -> dict:
+        return {
+            "phases": {name: asdict(phase) for name, phase in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+
+    def log_summary(self):
+        """
+        Log a table of the phases (in order of first completion) and counters
+        """
+
+        logger.info("%-24s %8s %12s %14s", "Phase", "Calls", "Time (ms)", "Peak mem (MiB)")
+        for name, phase in self.phases.items():
+            logger.info(
+                "%-24s %8i %12.2f %14s",
+                name,
+                phase.calls,
+                phase.seconds * 1000,
+                "-" if phase.peak_memory is None else f"{phase.peak_memory / 2**20:.2f}",
+            )
+        for name, value in self.counters.items():
+            logger.info("%-24s %8i", name, value)
+
+
+# Metrics of this process, enabled by `--metrics`, `--metrics-json` or `--trace-memory`
+metrics = Metrics()
@@ -0,0 +1,157 @@
+import sys
+from typing import NamedTuple
+
+from . import jsontypes
+
+
+class Param(NamedTuple):
+    """
+    Input or output parameter of a command
+    """
+
+    name: str
+    type: str
+
+
+class Command:
+    """
+    Compact, read-only representation of a command's definition.
+    Strings are interned and identical parameter lists are shared (see `Interner`), so many commands (or definition sets) can be kept in memory cheaply.
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "num_params",
+        "short_desc",
+        "input",
+        "output",
+        "klass",
+        "member",
+        "operator",
+        "attrs",
+    )
+
+    id: str  # Command ID (opcode) in hex form (without 0x prefix)
+    name: str  # Command enum name (e.g. `FOO_BAR`) [Without the `COMMAND_` prefix]
+    num_params: int
+    short_desc: str
+    input: tuple[Param, ...]
+    output: tuple[Param, ...]
+    klass: str | None  # Class name, if the command is a class member
+    member: str | None  # Member name, if the command is a class member
+    operator: str | None
+    attrs: frozenset[str]  # Names of attributes set for the command (e.g. `is_nop`)
+
+    def __init__(
+        self,
+        id: str,  # pylint: disable=redefined-builtin
+        name: str,
+        num_params: int = 0,
+        short_desc: str = "",
+        input: tuple[Param, ...] = (),  # pylint: disable=redefined-builtin
+        output: tuple[Param, ...] = (),
+        klass: str | None = None,
+        member: str | None = None,
+        operator: str | None = None,
+        attrs: frozenset[str] = frozenset(),
+    ):
+        self.id = id
+        self.name = name
+        self.num_params = num_params
+        self.short_desc = short_desc
+        self.input = input
+        self.output = output
+        self.klass = klass
+        self.member = member
+        self.operator = operator
+        self.attrs = attrs
+
+    def __repr__(self):
+        return f"Command({self.id}, {self.name})"
+
+    def astuple(self) -> tuple:
+        """
+        All fields of the command, for comparing definitions (commands themselves compare by identity)
+        """
+
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __getstate__(self):
+        return self.astuple()
+
+    def __setstate__(self, state: tuple):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    @property
+    def is_nop(self) -> bool:
+        return "is_nop" in self.attrs
+
+    @property
+    def is_unsupported(self) -> bool:
+        return "is_unsupported" in self.attrs
+
+    @property
+    def is_static(self) -> bool:
+        return "is_static" in self.attrs
+
+    @property
+    def is_condition(self) -> bool:
+        return "is_condition" in self.attrs
+
+
+class Interner:
+    """
+    Deduplicates strings, parameters, attribute sets and whole commands.
+    Share an instance between definition sets to deduplicate across them as well.
+    """
+
+    def __init__(self):
+        self._commands: dict[tuple, Command] = {}  # By all fields, so identical commands (e.g. of different games) are shared
+        self._param: dict[Param, Param] = {}
+        self._params: dict[tuple[Param, ...], tuple[Param, ...]] = {}
+        self._attrs: dict[frozenset[str], frozenset[str]] = {}
+
+    def param(self, param: jsontypes.CommandInputParameter | jsontypes.CommandOutputParameter):
+        key = Param(sys.intern(param["name"]), sys.intern(param["type"]))
+        return self._param.setdefault(key, key)
+
+    def params(self, params: list[jsontypes.CommandInputParameter] | list[jsontypes.CommandOutputParameter]):
+        key = tuple(self.param(param) for param in params)
+        return self._params.setdefault(key, key)
+
+    def attrs(self, attrs: jsontypes.CommandAttributes):
+        key = frozenset(sys.intern(name) for name, value in attrs.items() if value)
+        return self._attrs.setdefault(key, key)
+
+    def command(self, command: jsontypes.Command) -> Command:
+        """
+        Create a `Command` from its JSON definition
+        """
+
+        return self.share(Command(
+            id=sys.intern(command["id"]),
+            name=sys.intern(command["name"]),
+            num_params=command["num_params"],
+            short_desc=command.get("short_desc", ""),
+            input=self.params(command.get("input", [])),
+            output=self.params(command.get("output", [])),
+            klass=sys.intern(klass) if (klass := command.get("class")) else None,
+            member=sys.intern(member) if (member := command.get("member")) else None,
+            operator=command.get("operator"),
+            attrs=self.attrs(command.get("attrs", {})),
+        ))
+
+    def share(self, command: Command) -> Command:
+        """
+        Get the command with the same definition seen before, if any, otherwise remember `command` (sharing its parameters with other commands).
+        Use it for commands that weren't created by this instance (e.g. unpickled), to deduplicate them as well.
+        """
+
+        if (shared := self._commands.setdefault(command.astuple(), command)) is command:
+            # Same values, so this doesn't change the key
+            command.input = self._params.setdefault(command.input, command.input)
+            command.output = self._params.setdefault(command.output, command.output)
+            command.attrs = self._attrs.setdefault(command.attrs, command.attrs)
+        return shared
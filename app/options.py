@@ -0,0 +1,34 @@
+import argparse
+from dataclasses import dataclass, fields, replace
+
+
+@dataclass(frozen=True)
+class Options:
+    """
+    Options affecting which commands are processed and how the code is generated.
+    Field names (and defaults) match the command-line arguments of the same name.
+    """
+
+    name: str = "."  # Regex pattern to match command names
+    klass: str | None = None  # Regex pattern to match class names
+    extension: str | None = "default"  # Regex pattern to match extension names
+    generate_register_calls: bool = False
+    commented_out: bool = False
+    vectorize_params: bool = True
+    update_existing_docs: bool = False
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "Options":
+        return cls(**{field.name: getattr(args, field.name) for field in fields(cls)})
+
+    def merged(self, overrides: dict, where: str = "options") -> "Options":
+        """
+        Get a copy with the fields in `overrides` (e.g. from a jobs file or request) replaced
+        """
+
+        if unknown := set(overrides) - OPTION_NAMES:
+            raise ValueError(f"{where}: unknown keys `{'`, `'.join(sorted(unknown))}`")
+        return replace(self, **overrides)
+
+
+OPTION_NAMES = frozenset(field.name for field in fields(Options))
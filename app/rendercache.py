@@ -0,0 +1,243 @@
+import functools
+import hashlib
+import io
+import json
+import logging
+import threading
+import time
+import typing
+from pathlib import Path
+
+from . import __version__, model, typemapper, util, writers
+from .metrics import metrics
+from .model import Command
+from .options import Options
+from .typemapper import TypeMapper
+from .writers import write_docs, write_handler_function_stub, write_register_handler
+
+if typing.TYPE_CHECKING:
+    import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the schema (or how keys are computed) changes.
+# Each version has its own table, so processes of different versions sharing a cache don't break each other
+SCHEMA_VERSION = 1
+TABLE = f"fragments_v{SCHEMA_VERSION}"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    key BLOB PRIMARY KEY,
+    text TEXT NOT NULL,
+    last_used INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+# Number of fragments kept by default (a few per command)
+DEFAULT_MAX_ENTRIES = 200_000
+# Number of keys looked up by a single query
+LOOKUP_BATCH_SIZE = 500
+# Fragments used again within this many nanoseconds aren't marked as used again (which would mean rewriting them all on every run)
+LAST_USED_RESOLUTION_NS = 3600 * 1_000_000_000
+
+# Functions rendering each kind of fragment
+WRITERS_BY_KIND: dict[str, typing.Callable[[typing.TextIO, Command, TypeMapper, Options], None]] = {
+    "docs": write_docs,
+    "stub": write_handler_function_stub,
+    "register": write_register_handler,
+}
+
+# Modules whose code determines the rendered text
+RENDERING_MODULES = (writers, typemapper, util, model)
+
+
+@functools.cache
+def get_rendering_code_digest() -> str:
+    """
+    Hash of the source of the code rendering fragments, so changing it (even without a new tool version) doesn't reuse fragments rendered by the old code
+    """
+
+    digest = hashlib.sha256()
+    for module in RENDERING_MODULES:
+        assert module.__file__ is not None
+        digest.update(Path(module.__file__).read_bytes())
+    return digest.hexdigest()
+
+
+def get_rendering_signature(options: Options) -> list:
+    """
+    Everything rendered text depends on besides the commands and the type mapping: the tool version, the rendering code and the options affecting the output
+    """
+
+    return [__version__, get_rendering_code_digest(), options.commented_out, options.vectorize_params]
+
+
+def get_command_digest(prefix: "hashlib._Hash", command: Command) -> bytes:
+    """
+    Hash of a command's definition, continuing the hash of the rendering context `prefix`. Stable across processes
+    """
+
+    fields = command.astuple()
+    # Attributes are a set, whose iteration order depends on the (randomized) string hashes of the process
+    fields = (*fields[:-1], sorted(command.attrs))
+    digest = prefix.copy()
+    digest.update(repr(fields).encode("utf-8"))
+    return digest.digest()
+
+
+class RenderCache:
+    """
+    Persistent (SQLite) cache of rendered docs, handler stubs and `REGISTER_` calls.
+    Fragments are keyed by a hash of the command's definition, the type mapping, the options affecting the output, the tool version and the rendering code, so they never go stale.
+    The least recently used fragments are evicted when there are more than `max_entries`.
+    Can be sent to other processes, each one opens its own connection. Within a process it can be used by several threads (e.g. of the daemon).
+    """
+
+    def __init__(self, path: Path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._db: "sqlite3.Connection | None" = None
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Without the connection and lock, a copy opens its own connection
+        return type(self), (self.path, self.max_entries)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    @property
+    def db(self) -> "sqlite3.Connection":
+        """
+        Connection to the database, opened on first use. Only use it while holding `_lock`
+        """
+
+        if self._db is None:
+            import sqlite3  # pylint: disable=import-outside-toplevel # Only needed when the cache is used
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Batch workers write to it concurrently, and threads take turns using the connection (see `_lock`)
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # Other processes may be creating the table at the same time, so check (and create it) while holding the write lock
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)).fetchone() is None:
+                    db.execute(SCHEMA)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                db.close()
+                raise
+            self._db = db
+        return self._db
+
+    def get_many(self, keys: list[bytes]) -> list[tuple[bytes, str, int]]:
+        """
+        Look up the fragments with the given keys, returning the key, text and last use time of those that are cached
+        """
+
+        found = []
+        with self._lock:
+            for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                batch = keys[i : i + LOOKUP_BATCH_SIZE]
+                found.extend(
+                    self.db.execute(
+                        f"SELECT key, text, last_used FROM {TABLE} WHERE key IN ({', '.join('?' * len(batch))})",
+                        batch,
+                    ).fetchall()
+                )
+        return found
+
+    def store(self, used: list[bytes], rendered: dict[bytes, str]):
+        """
+        Mark `used` fragments as recently used, add newly `rendered` ones and evict the least recently used ones if there are too many
+        """
+
+        now = time.time_ns()
+        with self._lock, self.db:
+            self.db.executemany(f"UPDATE {TABLE} SET last_used = ? WHERE key = ?", [(now, key) for key in used])
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO {TABLE} VALUES (?, ?, ?)",
+                [(key, rendered[key], now) for key in sorted(rendered)],  # In key order, which is much faster to insert
+            )
+            if rendered and (excess := self.db.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0] - self.max_entries) > 0:
+                self.db.execute(
+                    f"DELETE FROM {TABLE} WHERE key IN (SELECT key FROM {TABLE} ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                logger.debug("Render cache: evicted %i fragments", excess)
+
+
+class Renderer:
+    """
+    Renders the docs, handler stubs and `REGISTER_` calls of commands, reusing fragments of a `RenderCache` (if any).
+    Call `flush` when done, to store what was rendered in the cache.
+    """
+
+    def __init__(self, mapper: TypeMapper, options: Options, cache: RenderCache | None = None):
+        self.mapper = mapper
+        self.options = options
+        self.cache = cache
+        # Everything the output depends on besides the command itself
+        self._prefix = hashlib.sha256(
+            json.dumps([*get_rendering_signature(options), sorted(mapper.type_mapping.items())]).encode("utf-8")
+        )
+        self._digests: dict[Command, bytes] = {}
+        self._fragments: dict[bytes, str | None] = {}  # Fragments looked up (or rendered) so far by key, None if they aren't cached
+        self._hits = 0
+        self._stale: list[bytes] = []  # Keys of fragments found in the cache that haven't been marked as used recently
+        self._rendered: dict[bytes, str] = {}  # Fragments that weren't in the cache, by key
+
+    def _get_key(self, kind: str, command: Command) -> bytes:
+        if (digest := self._digests.get(command)) is None:
+            digest = self._digests[command] = get_command_digest(self._prefix, command)
+        return digest + kind.encode("ascii")
+
+    def _look_up(self, keys: list[bytes]):
+        assert self.cache is not None
+        self._fragments.update(dict.fromkeys(keys))
+        stale_before = time.time_ns() - LAST_USED_RESOLUTION_NS
+        for key, text, last_used in self.cache.get_many(keys):
+            self._fragments[key] = text
+            if last_used < stale_before:
+                self._stale.append(key)
+
+    def prefetch(self, kind: str, commands: list[Command]):
+        """
+        Look up fragments of many commands at once (much faster than one by one)
+        """
+
+        if self.cache is not None:
+            self._look_up([key for command in commands if (key := self._get_key(kind, command)) not in self._fragments])
+
+    def write(self, kind: str, f: typing.TextIO, command: Command):
+        """
+        Write a fragment (`docs`, `stub` or `register`, see `WRITERS_BY_KIND`) of a command
+        """
+
+        if self.cache is None:
+            WRITERS_BY_KIND[kind](f, command, self.mapper, self.options)
+            return
+
+        key = self._get_key(kind, command)
+        if key not in self._fragments:
+            self._look_up([key])
+        if (text := self._fragments[key]) is None:
+            with io.StringIO() as fragment_f:
+                WRITERS_BY_KIND[kind](fragment_f, command, self.mapper, self.options)
+                text = self._fragments[key] = self._rendered[key] = fragment_f.getvalue()
+        else:
+            self._hits += 1
+        f.write(text)
+
+    def flush(self):
+        if self.cache is None:
+            return
+        metrics.count("render_cache_hits", self._hits)
+        metrics.count("render_cache_misses", len(self._rendered))
+        if self._stale or self._rendered:
+            self.cache.store(self._stale, self._rendered)
+        self._hits, self._stale, self._rendered = 0, [], {}
@@ -0,0 +1,152 @@
+import io
+import re
+from dataclasses import dataclass, field
+
+# `REGISTER_` macros, matched on commented out (`//`) lines as well
+# The `COMMAND_` prefix is optional, so calls written by `write_register_handler` are recognized too
+# `REGISTER_COMMAND_NOP` calls are followed by the parameter types instead of a handler
+REGISTER_HANDLER_MACROS_REGEX = re.compile(
+    r"^\s*(?P<comment>\/\/)?\s*(?P<macro>"
+    + "|".join(
+        (
+            "REGISTER_COMMAND_HANDLER",
+            "REGISTER_UNSUPPORTED_COMMAND_HANDLER",
+            "REGISTER_COMMAND_NOP",
+            "REGISTER_COMMAND_UNIMPLEMENTED",
+        )
+    )
+    + r")\s*\(\s*(?:COMMAND_)?(?P<command_name>[A-Za-z0-9_]+)\s*(?:,\s*(?P<handler>[A-Za-z0-9_]+)?[^;]*?)?\s*\)\s*;"
+)
+
+# Old-style single-line docs comment (e.g. `// COMMAND_FOO` or `/// COMMAND_FOO - some description` with or without the `COMMAND_` prefix)
+# Only lines naming a command that's registered in the file are considered docs
+SINGLELINE_DOCS_COMMENT_REGEX = re.compile(
+    r"^\s*//+\s*(?:COMMAND_)?(?P<command_name>[A-Za-z0-9_]+)(?:\s*-\s*(?P<description>.*))?$"
+)
+
+# Handler function regex - matches function definitions that look like command handlers
+# Don't want to match only to known handlers though so we can print warnings for handlers that we can't resolve to any command in the definitions
+CPP_FUNCTION_REGEX = re.compile(
+    r"^\s*(?!if)(?P<return_type>[A-Za-z0-9_<>,\s:]+)\s+(?!constexpr)(?P<handler_name>[a-zA-Z_][a-zA-Z0-9_]*)\s*\((?P<params>[^)]*)\)\s*{\s*$",
+    re.IGNORECASE,
+)
+
+# `@command` tag of a (multi-line) docs comment
+DOCS_COMMAND_TAG_REGEX = re.compile(r"\s*\*\s*@command\s+(?P<command_name>[A-Za-z0-9_]+)\s*$")
+
+# Body of handler stubs written by `write_handler_function_stub`
+STUB_BODY = 'NOTSA_UNREACHABLE("Not implemented");'
+
+
+@dataclass(frozen=True)
+class DocBlock:
+    """
+    A `/* ... */` comment block
+    """
+
+    start: int  # Index of the line the block starts on
+    end: int | None  # Index of the line the block ends on, None if it's never closed
+    command_name: str | None  # Value of the `@command` tag, if any
+
+
+@dataclass(frozen=True)
+class HandlerDefinition:
+    line: int
+    return_type: str
+    handler_name: str
+    params: str  # Parameter list as written in the source (without parentheses)
+
+
+@dataclass(frozen=True)
+class RegisterCall:
+    line: int
+    macro: str
+    command_name: str  # Without `COMMAND_` prefix
+    handler: str | None
+    commented_out: bool
+
+
+@dataclass
+class ScannedFile:
+    """
+    Everything of interest found in a handlers file, by line index
+    """
+
+    lines: list[str]
+    register_handlers_line: int = -1  # First line containing `RegisterHandlers()`, -1 if none
+    register_handler_begin_line: int = -1  # First line containing `REGISTER_COMMAND_HANDLER_BEGIN`, -1 if none
+    doc_blocks: dict[int, DocBlock] = field(default_factory=dict)  # Start line -> block
+    handlers: dict[int, HandlerDefinition] = field(default_factory=dict)
+    singleline_docs: dict[int, str] = field(default_factory=dict)  # Line -> command name, for comments that may be old-style docs
+    register_calls: list[RegisterCall] = field(default_factory=list)
+
+
+def scan(text: str) -> ScannedFile:
+    """
+    Classify the lines of a handlers file in a single pass
+    """
+
+    lines = io.StringIO(text).readlines()
+    result = ScannedFile(lines)
+
+    # Currently open comment block - start line and command name found so far
+    block_start: int | None = None
+    block_command_name: str | None = None
+
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+
+        if block_start is None and stripped.startswith("/*"):
+            block_start, block_command_name = i, None
+        if block_start is not None:
+            if stripped.endswith("*/"):
+                result.doc_blocks[block_start] = DocBlock(block_start, i, block_command_name)
+                block_start = None
+            elif block_command_name is None and "@command" in line and (match := DOCS_COMMAND_TAG_REGEX.search(line)):
+                block_command_name = match.group("command_name")
+
+        if result.register_handlers_line == -1 and "RegisterHandlers()" in line:
+            result.register_handlers_line = i
+
+        # Cheap checks first, so most lines aren't matched against any regex
+        if "REGISTER_" in stripped:
+            if result.register_handler_begin_line == -1 and "REGISTER_COMMAND_HANDLER_BEGIN" in line:
+                result.register_handler_begin_line = i
+            if match := REGISTER_HANDLER_MACROS_REGEX.match(stripped):
+                macro = match.group("macro")
+                result.register_calls.append(
+                    RegisterCall(
+                        i,
+                        macro,
+                        match.group("command_name"),
+                        match.group("handler") if macro != "REGISTER_COMMAND_NOP" else None,
+                        match.group("comment") is not None,
+                    )
+                )
+        elif stripped.startswith("//"):
+            if match := SINGLELINE_DOCS_COMMENT_REGEX.match(stripped):
+                result.singleline_docs[i] = match.group("command_name")
+        elif stripped.endswith("{") and "(" in stripped:
+            if match := CPP_FUNCTION_REGEX.match(stripped):
+                result.handlers[i] = HandlerDefinition(
+                    i, match.group("return_type"), match.group("handler_name"), match.group("params")
+                )
+
+    if block_start is not None:
+        result.doc_blocks[block_start] = DocBlock(block_start, None, block_command_name)
+
+    return result
+
+
+def is_stub_handler(lines: list[str], i_line: int) -> bool:
+    """
+    Check whether the body of the function starting on line `i_line` is just the stub
+    """
+
+    statements = []
+    for line in lines[i_line + 1 :]:
+        if line.startswith("}"):
+            break
+        if (stripped := line.strip()) and not stripped.startswith("//"):
+            statements.append(stripped)
+    return statements == [STUB_BODY]
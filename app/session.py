@@ -0,0 +1,165 @@
+import functools
+import hashlib
+import json
+import re
+from typing import TypeVar
+
+from .cache import DownloadCache, get_default_cache_dir
+from .data import DEFAULT_DEFINITIONS_URL, DEFAULT_ENUM_DEFINITIONS_URL, DefinitionSet, get_definitions_key
+from .generate import GeneratedFiles, UpdateResult, generate_new, update_existing
+from .jsontypes import Definitions
+from .manifest import DocsVersion
+from .metrics import metrics
+from .model import Command, Interner
+from .options import Options
+from .rendercache import RenderCache, get_rendering_signature
+from .snapshot import DefinitionsIndex, SnapshotStore, get_changed_commands, get_snapshot_store, load_index, load_indexes
+
+K = TypeVar("K")
+
+
+class Session:
+    """
+    Loaded definitions and everything derived from them.
+    Load it once, then use it for any number of generation requests.
+    """
+
+    def __init__(self, index: DefinitionsIndex, snapshots: SnapshotStore | None = None, definitions_url: str | None = None):
+        self.index = index
+        self.mapper = index.mapper
+        # Snapshots of previous definitions versions, to tell which commands changed since (see `get_changed_commands`)
+        self.snapshots = snapshots
+        self.definitions_url = definitions_url
+        self._changed_commands: dict[str, set[str] | None] = {}
+        # Cache of rendered docs, stubs and `REGISTER_` calls shared with other runs, None to always render them
+        self.render_cache: RenderCache | None = None
+
+    @property
+    def definitions_key(self) -> str:
+        """
+        Key identifying the version of the loaded definitions
+        """
+
+        return get_definitions_key(self.index.meta)
+
+    @functools.cached_property
+    def definitions_signature(self) -> str:
+        """
+        Key identifying everything generated code depends on besides the options: where the definitions are from, their version, and the type mappings (which also depend on the enums)
+        """
+
+        return hashlib.sha256(
+            json.dumps([self.definitions_url, self.definitions_key, sorted(self.mapper.type_mapping.items())]).encode("utf-8")
+        ).hexdigest()[:16]
+
+    def get_docs_version(self, options: Options) -> DocsVersion:
+        """
+        What docs rendered with `options` depend on: the definitions version, and the tool version, rendering code and options affecting them.
+        If only the definitions changed since docs were rendered, just the docs of the changed commands need refreshing (see `get_changed_commands`).
+        """
+
+        return {
+            "definitions_key": self.definitions_key,
+            "render_key": hashlib.sha256(json.dumps(get_rendering_signature(options)).encode("utf-8")).hexdigest()[:16],
+        }
+
+    @classmethod
+    def from_definitions(cls, definitions: Definitions, enums: set[str]) -> "Session":
+        return cls(DefinitionsIndex.build(definitions, enums))
+
+    @classmethod
+    def load(
+        cls,
+        definitions_url: str = DEFAULT_DEFINITIONS_URL,
+        enum_definitions_url: str = DEFAULT_ENUM_DEFINITIONS_URL,
+        cache: DownloadCache | None = None,
+    ) -> "Session":
+        """
+        Load definitions and enums from the given URLs (or local paths)
+        """
+
+        cache = cache or DownloadCache(get_default_cache_dir())
+        return cls(
+            load_index(cache, definitions_url, enum_definitions_url),
+            get_snapshot_store(cache),
+            definitions_url,
+        )
+
+    @classmethod
+    def load_many(
+        cls,
+        definition_sets: dict[K, DefinitionSet],
+        cache: DownloadCache | None = None,
+    ) -> dict[K, "Session"]:
+        """
+        Load several named definition sets (e.g. of different games) side by side, by name.
+        They're fetched concurrently, and share strings, parameters and identical commands, so loading more sets costs less than loading each one alone.
+        """
+
+        cache = cache or DownloadCache(get_default_cache_dir())
+        indexes = load_indexes(cache, list(definition_sets.values()), Interner())
+        snapshots = get_snapshot_store(cache)
+        return {
+            name: cls(index, snapshots, definition_set.definitions_url)
+            for (name, definition_set), index in zip(definition_sets.items(), indexes)
+        }
+
+    def get_changed_commands(self, definitions_key: str) -> set[str] | None:
+        """
+        Names of commands whose definitions changed since the definitions version `definitions_key`.
+        None if that version is unknown (no snapshot of it), in which case any command may have changed.
+        """
+
+        if definitions_key == self.definitions_key:
+            return set()
+        if definitions_key not in self._changed_commands:
+            old = self.snapshots.find(self.definitions_url, definitions_key) if self.snapshots and self.definitions_url else None
+            self._changed_commands[definitions_key] = get_changed_commands(old, self.index) if old else None
+        return self._changed_commands[definitions_key]
+
+    def filter_commands(self, options: Options) -> list[Command]:
+        """
+        Gather commands matching the criteria in `options` (extension, command name pattern, class name pattern, etc...).
+        Only extensions matching the extension pattern are decoded.
+        """
+
+        with metrics.phase("filter_commands"):
+            commands = [
+                command
+                for extension_name in self.index.extension_names
+                if not options.extension or re.search(options.extension, extension_name)
+                for command in self.index.get_commands(extension_name)
+                if re.search(options.name, command.name)
+                and (
+                    not options.klass
+                    or (command.klass is not None and re.search(options.klass, command.klass))
+                )
+            ]
+        metrics.count("commands", len(commands))
+        return commands
+
+    def generate_new(self, options: Options, commands: list[Command] | None = None, workers: int = 1) -> GeneratedFiles:
+        """
+        Generate docs, stubs and `REGISTER_` calls for `commands` (or all commands matching `options`).
+        Many commands are rendered by a pool of `workers` processes.
+        """
+
+        commands = self.filter_commands(options) if commands is None else commands
+        with metrics.phase("generate_new"):
+            return generate_new(self, options, commands, workers)
+
+    def update_existing(
+        self,
+        options: Options,
+        text: str,
+        commands: list[Command] | None = None,
+        docs_to_refresh: set[str] | None = None,
+    ) -> UpdateResult:
+        """
+        Add missing docs, stubs and `REGISTER_` calls for `commands` (or all commands matching `options`) to the contents of an existing file.
+        With `update_existing_docs`, only the docs of commands in `docs_to_refresh` are rewritten (all, if None).
+        """
+
+        commands = self.filter_commands(options) if commands is None else commands
+        with metrics.phase("update_existing"):
+            return update_existing(self, options, text, commands, docs_to_refresh)
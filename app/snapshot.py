@@ -0,0 +1,523 @@
+import hashlib
+import json
+import logging
+import pickle
+import re
+import sys
+import threading
+from dataclasses import astuple
+from pathlib import Path
+from typing import Iterable, Iterator, Literal, Mapping, TypedDict, TypeVar
+
+from . import util
+from .cache import DownloadCache
+from .data import (
+    DefinitionSet,
+    decode_extension,
+    find_extensions,
+    get_definitions_key,
+    log_loaded_definitions,
+    parse_enums,
+    read_class_names,
+    read_definitions_meta,
+)
+from .jsontypes import Definitions, Meta
+from .metrics import metrics
+from .model import Command, Interner
+from .typemapper import TypeMapper, build_type_mapping
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever `DefinitionsIndex` (or anything it contains) changes
+SNAPSHOT_FORMAT_VERSION = 6
+
+T = TypeVar("T")
+
+LookupTable = Literal["by_name", "by_opcode", "by_handler_name", "by_class"]
+LOOKUP_TABLES: tuple[LookupTable, ...] = ("by_name", "by_opcode", "by_handler_name", "by_class")
+
+# Lookup table -> key -> names of the extensions with commands under that key (in definitions order)
+KeyIndex = dict[LookupTable, dict[str, list[str]]]
+
+
+class ExtensionTables(TypedDict):
+    """
+    Commands of a single extension with its part of the lookup tables (see `DefinitionsIndex`), which is what extension snapshots hold
+    """
+
+    commands: list[Command]
+    by_name: dict[str, Command]
+    by_opcode: dict[str, Command]
+    by_handler_name: dict[str, Command]
+    by_class: dict[str, list[Command]]
+
+
+def build_tables(commands: list[Command]) -> ExtensionTables:
+    tables = ExtensionTables(commands=commands, by_name={}, by_opcode={}, by_handler_name={}, by_class={})
+    for command in commands:
+        tables["by_name"][command.name] = command
+        tables["by_opcode"][command.id.upper()] = command
+        if handler_name := util.get_handler_name(command):
+            tables["by_handler_name"][handler_name.lower()] = command
+        if command.klass:
+            tables["by_class"].setdefault(command.klass, []).append(command)
+    return tables
+
+
+class LazyLookup(Mapping[str, T]):
+    """
+    Lookup table over the decoded extensions of an index.
+    A miss decodes the extensions with the key (see `DefinitionsIndex.load_key`) before giving up, iterating (or getting the length) decodes all of them.
+    If a key can have commands of several extensions (`spread`), they're all decoded even on a hit.
+    """
+
+    def __init__(self, index: "DefinitionsIndex", table: LookupTable, spread: bool = False):
+        self.index = index
+        self.table = table
+        self.spread = spread
+        self.data: dict[str, T] = {}
+
+    def __getitem__(self, key: str) -> T:
+        if self.spread and len(self.index.decoded) != len(self.index.extension_names):
+            self.index.load_key(self.table, key)
+        try:
+            return self.data[key]
+        except KeyError:
+            self.index.load_key(self.table, key)
+        return self.data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        self.index.decode_all()
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        self.index.decode_all()
+        return len(self.data)
+
+
+class DefinitionsIndex:
+    """
+    Command definitions with lookup tables and type mappings.
+    Extensions are decoded lazily, when their commands are needed (e.g. they match the `--extension` filter) or a lookup misses.
+    They're decoded from their snapshot (see `SnapshotStore`) if there's one, otherwise from the raw definitions (and a snapshot is saved).
+    Snapshots also hold the extension's part of the lookup tables, which are merged into the tables of the index when it's loaded.
+    Once all extensions were decoded, the snapshot directory also gets an index of which extensions have each key, so later lookup misses only decode those.
+    All tables reference the same command objects. Can be used by several threads (e.g. of the daemon), only one of them decodes at a time.
+    The raw definitions are dropped once all extensions are decoded, and are never pickled (e.g. sent to worker processes) - all extensions are decoded first instead.
+    """
+
+    def __init__(
+        self,
+        meta: Meta,
+        extension_names: list[str],
+        enums: Iterable[str],
+        mapper: TypeMapper,
+        raw: bytes | None = None,
+        snapshot_dir: Path | None = None,
+        interner: Interner | None = None,
+    ):
+        self.meta = meta
+        self.extension_names = extension_names  # In definitions order
+        self.enums = frozenset(enums)
+        self.mapper = mapper
+        self.raw = raw  # Raw definitions JSON to decode extensions from, None if only snapshots are available (e.g. of a previous version)
+        self.snapshot_dir = snapshot_dir  # Where snapshots of single extensions are loaded from and saved to, None to not use any
+        self.interner = interner or Interner()
+        # Commands loaded from snapshots are only run through the interner if it's shared with other indexes (e.g. of other games)
+        self.share_snapshot_commands = interner is not None
+        self.decoded: dict[str, list[Command]] = {}  # Extension name -> commands, in definitions order
+        self.by_name: LazyLookup[Command] = LazyLookup(self, "by_name")  # Command name (without `COMMAND_` prefix) -> command
+        self.by_opcode: LazyLookup[Command] = LazyLookup(self, "by_opcode")  # Opcode (uppercase hex, without `0x` prefix) -> command
+        self.by_handler_name: LazyLookup[Command] = LazyLookup(self, "by_handler_name")  # Lowercase handler function name -> command
+        self.by_class: LazyLookup[list[Command]] = LazyLookup(self, "by_class", spread=True)  # Class name -> commands, in order of decoding
+        self._extension_by_command_name: dict[str, str] = {}
+        self._spans: dict[str, tuple[int, int]] | None = None
+        self._key_index: KeyIndex | None = None  # Loaded on the first lookup miss
+        self._key_index_loaded = False
+        self._decode_lock = threading.RLock()
+
+    def __getstate__(self):
+        if self.raw is not None:
+            self.decode_all()
+        state = self.__dict__.copy()
+        del state["_decode_lock"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._decode_lock = threading.RLock()
+
+    @classmethod
+    def build(cls, definitions: Definitions, enums: set[str], interner: Interner | None = None) -> "DefinitionsIndex":
+        """
+        Build an index of already decoded definitions, with all extensions decoded
+        """
+
+        with metrics.phase("build_type_mapping"):
+            type_mapping = build_type_mapping(
+                {klass for extension in definitions["extensions"] for command in extension["commands"] if (klass := command.get("class"))},
+                enums,
+            )
+        index = cls(
+            definitions["meta"],
+            [sys.intern(extension["name"]) for extension in definitions["extensions"]],
+            enums,
+            TypeMapper(type_mapping),
+            interner=interner,
+        )
+        for extension in definitions["extensions"]:
+            index._add(extension["name"], build_tables([index.interner.command(command) for command in extension["commands"]]))
+        return index
+
+    @classmethod
+    def from_raw(
+        cls,
+        raw: bytes,
+        meta: Meta,
+        enums: set[str],
+        snapshot_dir: Path | None = None,
+        interner: Interner | None = None,
+    ) -> "DefinitionsIndex":
+        """
+        Index raw definitions JSON without decoding any extension (if its layout allows it, otherwise everything is decoded right away)
+        """
+
+        with metrics.phase("find_extensions"):
+            spans = find_extensions(raw)
+        if spans is None:
+            logger.debug("Unexpected definitions layout, decoding all extensions")
+            with metrics.phase("decode_definitions"):
+                definitions = json.loads(raw)
+            with metrics.phase("build_index"):
+                index = cls.build(definitions, enums, interner)
+            index.snapshot_dir = snapshot_dir  # All extensions are decoded, the raw definitions aren't needed
+            for extension_name, commands in index.decoded.items():
+                index._save_extension(extension_name, build_tables(commands))
+            index._save_key_index()
+            return index
+
+        with metrics.phase("build_type_mapping"):
+            type_mapping = build_type_mapping(read_class_names(raw), enums)
+        index = cls(meta, [sys.intern(name) for name in spans], enums, TypeMapper(type_mapping), raw, snapshot_dir, interner)
+        index._spans = spans
+        return index
+
+    @property
+    def commands(self) -> list[Command]:
+        """
+        All commands, in definitions order (decodes all extensions)
+        """
+
+        return [command for extension_name in self.extension_names for command in self.get_commands(extension_name)]
+
+    @property
+    def by_extension(self) -> dict[str, list[Command]]:
+        """
+        Extension name -> commands, in definitions order (decodes all extensions)
+        """
+
+        return {extension_name: self.get_commands(extension_name) for extension_name in self.extension_names}
+
+    def get_commands(self, extension_name: str) -> list[Command]:
+        """
+        Commands of an extension, in definitions order (decoding the extension if it isn't yet)
+        """
+
+        if (commands := self.load_extension(extension_name)) is None:
+            raise LookupError(f"Extension `{extension_name}` isn't available (no snapshot or raw definitions)")
+        return commands
+
+    def get_extension_name(self, command: Command) -> str:
+        return self._extension_by_command_name[command.name]
+
+    def load_extension(self, extension_name: str) -> list[Command] | None:
+        """
+        Commands of an extension (decoding it if it isn't yet), None if it can't be decoded (no snapshot or raw definitions)
+        """
+
+        if (commands := self.decoded.get(extension_name)) is not None:
+            return commands
+        if extension_name not in self.extension_names:
+            raise KeyError(extension_name)
+
+        with self._decode_lock:
+            # Another thread may have decoded it while this one was waiting
+            if (commands := self.decoded.get(extension_name)) is not None:
+                return commands
+            return self._decode_extension(extension_name)
+
+    def _decode_extension(self, extension_name: str) -> list[Command] | None:
+        if (tables := self._load_extension_snapshot(extension_name)) is None:
+            if self.raw is None:
+                return None
+            if self._spans is None:
+                with metrics.phase("find_extensions"):
+                    self._spans = find_extensions(self.raw) or {}
+
+            with metrics.phase("decode_definitions"):
+                try:
+                    extension = decode_extension(self.raw, self._spans[extension_name])
+                except (KeyError, ValueError):
+                    # Not where (or what) we expected, decode the whole thing instead
+                    extension = next(
+                        extension for extension in json.loads(self.raw)["extensions"] if extension["name"] == extension_name
+                    )
+            with metrics.phase("build_index"):
+                tables = build_tables([self.interner.command(command) for command in extension["commands"]])
+            self._save_extension(extension_name, tables)
+
+        self._add(extension_name, tables)
+        return tables["commands"]
+
+    def decode_all(self) -> bool:
+        """
+        Decode all extensions that aren't yet (and can be).
+        Returns whether any extension was decoded.
+        """
+
+        with self._decode_lock:
+            num_decoded = len(self.decoded)
+            for extension_name in self.extension_names:
+                self.load_extension(extension_name)
+            return len(self.decoded) != num_decoded
+
+    def load_key(self, table: LookupTable, key: str):
+        """
+        Decode the extensions with `key` in the lookup table `table`.
+        Without an index of the keys of the definitions (before all extensions were decoded once) that's unknown, so all remaining extensions are decoded.
+        """
+
+        if (key_index := self._load_key_index()) is None:
+            # Even if nothing is left to decode, another thread may have decoded the key's extension meanwhile
+            self.decode_all()
+            return
+        for extension_name in key_index[table].get(key, ()):
+            self.load_extension(extension_name)
+
+    def _get_key_index_path(self) -> Path | None:
+        return self.snapshot_dir / "keys.pickle" if self.snapshot_dir is not None else None
+
+    def _load_key_index(self) -> KeyIndex | None:
+        if not self._key_index_loaded:
+            with self._decode_lock:
+                if not self._key_index_loaded and (path := self._get_key_index_path()) is not None:
+                    with metrics.phase("load_snapshot"):
+                        self._key_index = load_pickle(path)
+                self._key_index_loaded = True
+        return self._key_index
+
+    def _save_key_index(self):
+        if (path := self._get_key_index_path()) is None or path.exists():
+            return
+        key_index: KeyIndex = {table: {} for table in LOOKUP_TABLES}
+        for extension_name in self.extension_names:
+            tables = build_tables(self.decoded[extension_name])
+            for table in LOOKUP_TABLES:
+                for key in tables[table]:
+                    key_index[table].setdefault(key, []).append(extension_name)
+        with metrics.phase("save_snapshot"):
+            try:
+                util.atomic_write_bytes(path, pickle.dumps(key_index, protocol=pickle.HIGHEST_PROTOCOL))
+            except OSError as e:
+                logger.warning("Failed to save the key index of the definitions snapshot (%s)", e)
+
+    def _add(self, extension_name: str, tables: ExtensionTables):
+        self._extension_by_command_name.update(dict.fromkeys(tables["by_name"], extension_name))
+        self.by_name.data.update(tables["by_name"])
+        self.by_opcode.data.update(tables["by_opcode"])
+        self.by_handler_name.data.update(tables["by_handler_name"])
+        for klass, commands in tables["by_class"].items():
+            self.by_class.data.setdefault(klass, []).extend(commands)
+        # Last, as other threads take extensions in `decoded` as fully added (without waiting for the lock)
+        self.decoded[extension_name] = tables["commands"]
+        if len(self.decoded) == len(self.extension_names):
+            self.raw, self._spans = None, None  # Not needed anymore
+            self._save_key_index()
+
+    def _get_extension_snapshot_path(self, extension_name: str) -> Path | None:
+        if self.snapshot_dir is None:
+            return None
+        # Extension names may contain characters that aren't valid in file names (and differ only in those)
+        name_digest = hashlib.sha256(extension_name.encode("utf-8")).hexdigest()[:8]
+        return self.snapshot_dir / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', extension_name)}-{name_digest}.pickle"
+
+    def _load_extension_snapshot(self, extension_name: str) -> ExtensionTables | None:
+        if (path := self._get_extension_snapshot_path(extension_name)) is None:
+            return None
+        with metrics.phase("load_snapshot"):
+            tables: ExtensionTables | None = load_pickle(path)
+        if tables is not None and self.share_snapshot_commands:
+            # The tables reference the unpickled commands, not the shared ones
+            tables = build_tables([self.interner.share(command) for command in tables["commands"]])
+        return tables
+
+    def _save_extension(self, extension_name: str, tables: ExtensionTables):
+        if (path := self._get_extension_snapshot_path(extension_name)) is None:
+            return
+        with metrics.phase("save_snapshot"):
+            try:
+                util.atomic_write_bytes(path, pickle.dumps(tables, protocol=pickle.HIGHEST_PROTOCOL))
+            except OSError as e:
+                logger.warning("Failed to save snapshot of extension `%s` (%s)", extension_name, e)
+                return
+        logger.debug("Saved snapshot of extension `%s` to `%s`", extension_name, path)
+
+
+def load_pickle(path: Path):
+    """
+    Load a pickled snapshot, None if it doesn't exist or is broken
+    """
+
+    try:
+        with path.open("rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.warning("Failed to load definitions snapshot `%s` (%s), rebuilding it", path, e)
+        return None
+
+
+class SnapshotStore:
+    """
+    Stores compiled definitions on disk, one directory per definitions version (and contents, so edited local definitions don't reuse snapshots of the same version).
+    Each directory has the metadata, extension names and type mappings (`index.pickle`), the commands and lookup tables of each extension that was ever decoded (one file per extension),
+    and which extensions have each key of the lookup tables (`keys.pickle`, once all extensions were decoded).
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _get_prefix(self, definitions_url: str, definitions_key: str) -> str:
+        # The definitions URL is part of the key, as different definitions (e.g. for other games) may share a version
+        url_digest = hashlib.sha256(definitions_url.encode("utf-8")).hexdigest()[:12]
+        return f"{url_digest}-{re.sub(r'[^A-Za-z0-9_.-]', '_', definitions_key)}"
+
+    def get_path(self, definitions_url: str, meta: Meta, raw_definitions: bytes, raw_enums: bytes) -> Path:
+        contents_digest = hashlib.sha256(raw_definitions)
+        contents_digest.update(raw_enums)
+        prefix = self._get_prefix(definitions_url, get_definitions_key(meta))
+        return self.root / f"{prefix}-{contents_digest.hexdigest()[:12]}.v{SNAPSHOT_FORMAT_VERSION}"
+
+    def find(self, definitions_url: str, definitions_key: str) -> DefinitionsIndex | None:
+        """
+        Load the most recent snapshot of a (previous) version of the definitions, if there is one.
+        Only extensions that were decoded with that version are available.
+        """
+
+        pattern = f"{self._get_prefix(definitions_url, definitions_key)}-*.v{SNAPSHOT_FORMAT_VERSION}"
+        if not (paths := sorted(self.root.glob(pattern), key=lambda path: path.stat().st_mtime_ns)):
+            return None
+        return self.load(paths[-1])
+
+    def load(self, path: Path, raw: bytes | None = None, interner: Interner | None = None) -> DefinitionsIndex | None:
+        """
+        Load the snapshot at `path`, with extensions that have no snapshot yet decoded from `raw` (if given)
+        """
+
+        if (state := load_pickle(path / "index.pickle")) is None:
+            return None
+        index = DefinitionsIndex(
+            state["meta"],
+            state["extension_names"],
+            state["enums"],
+            TypeMapper(state["type_mapping"]),
+            raw,
+            path,
+            interner,
+        )
+        return index
+
+    def save(self, path: Path, index: DefinitionsIndex):
+        """
+        Save the index of a new snapshot (extensions are saved by the index itself when they're decoded)
+        """
+
+        path.mkdir(parents=True, exist_ok=True)
+        state = {
+            "meta": index.meta,
+            "extension_names": index.extension_names,
+            "enums": index.enums,
+            "type_mapping": index.mapper.type_mapping,
+        }
+        util.atomic_write_bytes(path / "index.pickle", pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def get_changed_commands(old: DefinitionsIndex, new: DefinitionsIndex) -> set[str] | None:
+    """
+    Names of the commands of `new` whose docs may differ from the ones generated with `old` - added commands and those with any field changed.
+    None if that can't be told (the type mappings differ, e.g. an enum was added), in which case all commands are considered changed.
+    Decodes the extensions of `new` which `old` has, and all commands of other extensions count as changed (so all of them are decoded as well).
+    """
+
+    if old.mapper.type_mapping != new.mapper.type_mapping:
+        return None
+
+    changed: set[str] = set()
+    for extension_name in new.extension_names:
+        old_commands = old.load_extension(extension_name) if extension_name in old.extension_names else None
+        old_by_name = {command.name: command for command in old_commands or ()}
+        changed.update(
+            command.name
+            for command in new.get_commands(extension_name)
+            if (old_command := old_by_name.get(command.name)) is None or old_command.astuple() != command.astuple()
+        )
+    return changed
+
+
+def get_snapshot_store(cache: DownloadCache) -> SnapshotStore:
+    return SnapshotStore(cache.root / "snapshots")
+
+
+def load_indexes(
+    cache: DownloadCache,
+    definition_sets: list[DefinitionSet],
+    interner: Interner | None = None,
+) -> list[DefinitionsIndex]:
+    """
+    Load the definitions indexes for the given definitions and enums (URLs or local paths), fetching all of them concurrently.
+    Each index is loaded from a snapshot if one exists for its version of the definitions, otherwise it's built and a snapshot is saved.
+    Extensions aren't decoded until they're needed (see `DefinitionsIndex`).
+    Pass an `interner` to share strings, parameters and identical commands between the indexes.
+    """
+
+    urls = list(dict.fromkeys(url for definition_set in definition_sets for url in astuple(definition_set)))
+    # The cache entries are keyed by the definitions version, so we can tell when upstream actually changed
+    previous_keys = {
+        definition_set.definitions_url: cache.get_key(definition_set.definitions_url) for definition_set in definition_sets
+    }
+    with metrics.phase("fetch"):
+        raw_by_url = dict(zip(urls, cache.fetch_many(urls)))
+
+    store = get_snapshot_store(cache)
+    indexes = []
+    for definitions_url, enum_definitions_url in map(astuple, definition_sets):
+        raw_definitions, raw_enums = raw_by_url[definitions_url], raw_by_url[enum_definitions_url]
+        meta = read_definitions_meta(raw_definitions)
+        key = get_definitions_key(meta)
+        if (previous_key := previous_keys[definitions_url]) and previous_key != key:
+            logger.info("Definitions `%s` changed since last run (%s -> %s)", definitions_url, previous_key, key)
+        cache.set_key(definitions_url, key)
+
+        snapshot_path = store.get_path(definitions_url, meta, raw_definitions, raw_enums)
+        with metrics.phase("load_snapshot"):
+            index = store.load(snapshot_path, raw_definitions, interner)
+        if index is None:
+            with metrics.phase("build_index"):
+                index = DefinitionsIndex.from_raw(raw_definitions, meta, parse_enums(raw_enums), snapshot_path, interner)
+            with metrics.phase("save_snapshot"):
+                store.save(snapshot_path, index)
+            logger.debug("Saved definitions snapshot to `%s`", snapshot_path)
+
+        log_loaded_definitions(definitions_url, index.meta)
+        logger.info("Loaded %d enums from `%s`", len(index.enums), enum_definitions_url)
+        indexes.append(index)
+    return indexes
+
+
+def load_index(cache: DownloadCache, definitions_url: str, enum_definitions_url: str) -> DefinitionsIndex:
+    """
+    Load the definitions index for the given definitions and enums (URLs or local paths), see `load_indexes`
+    """
+
+    return load_indexes(cache, [DefinitionSet(definitions_url, enum_definitions_url)])[0]
@@ -0,0 +1,330 @@
+import hashlib
+import logging
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .coverage import FileScan
+from .scanner import STUB_BODY, is_stub_handler, scan
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the schema (or what's extracted from files) changes, the index is rebuilt then
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    error TEXT
+);
+CREATE TABLE handlers (
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    is_stub INTEGER NOT NULL,
+    return_type TEXT NOT NULL,
+    params TEXT NOT NULL
+);
+CREATE TABLE doc_blocks (
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    command_name TEXT NOT NULL
+);
+CREATE TABLE register_calls (
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    macro TEXT NOT NULL,
+    command_name TEXT NOT NULL,
+    handler TEXT,
+    commented_out INTEGER NOT NULL
+);
+CREATE INDEX handlers_name ON handlers (name COLLATE NOCASE);
+CREATE INDEX handlers_path ON handlers (path);
+CREATE INDEX doc_blocks_command_name ON doc_blocks (command_name);
+CREATE INDEX doc_blocks_path ON doc_blocks (path);
+CREATE INDEX register_calls_command_name ON register_calls (command_name);
+CREATE INDEX register_calls_path ON register_calls (path);
+"""
+
+
+@dataclass(frozen=True)
+class Registration:
+    path: Path
+    line: int  # 1-based
+    macro: str
+    command_name: str  # Without `COMMAND_` prefix
+    handler: str | None
+    commented_out: bool
+
+
+@dataclass(frozen=True)
+class Handler:
+    path: Path
+    line: int  # 1-based
+    name: str
+    is_stub: bool
+    return_type: str
+    params: str  # Parameter list as written in the source (without parentheses)
+
+
+@dataclass(frozen=True)
+class Docs:
+    path: Path
+    line: int  # 1-based
+    command_name: str
+
+
+@dataclass(frozen=True)
+class FileSymbols:
+    """
+    Symbols found in a single file, as rows for the index
+    """
+
+    path: str  # Resolved path
+    mtime_ns: int
+    size: int
+    hash: str
+    changed: bool = True  # False if the contents are the same as last time (the symbols aren't extracted then)
+    handlers: list[tuple[int, str, bool, str, str]] = field(default_factory=list)  # (line, name, is_stub, return type, params)
+    doc_blocks: list[tuple[int, str]] = field(default_factory=list)  # (line, command name)
+    register_calls: list[tuple[int, str, str, str | None, bool]] = field(default_factory=list)  # (line, macro, command name, handler, commented out)
+    error: str | None = None
+
+
+def extract_symbols(path: str, known_hash: str | None = None) -> FileSymbols:
+    """
+    Extract the symbols of a file, unless its contents hash to `known_hash`
+    """
+
+    try:
+        stat = Path(path).stat()
+        data = Path(path).read_bytes()
+    except OSError as e:
+        return FileSymbols(path, 0, 0, "", error=str(e))
+
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == known_hash:
+        return FileSymbols(path, stat.st_mtime_ns, stat.st_size, digest, changed=False)
+
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        return FileSymbols(path, stat.st_mtime_ns, stat.st_size, digest, error=str(e))
+
+    # Most files of a source tree have nothing to do with commands, don't bother scanning them
+    if "REGISTER_" not in text and "@command" not in text and STUB_BODY not in text:
+        return FileSymbols(path, stat.st_mtime_ns, stat.st_size, digest)
+
+    scanned = scan(text)
+    return FileSymbols(
+        path,
+        stat.st_mtime_ns,
+        stat.st_size,
+        digest,
+        handlers=[
+            (i_line + 1, handler.handler_name, is_stub_handler(scanned.lines, i_line), handler.return_type.strip(), handler.params)
+            for i_line, handler in scanned.handlers.items()
+        ],
+        doc_blocks=[
+            (block.start + 1, block.command_name)
+            for block in scanned.doc_blocks.values()
+            if block.command_name
+        ],
+        register_calls=[
+            (call.line + 1, call.macro, call.command_name, call.handler, call.commented_out)
+            for call in scanned.register_calls
+        ],
+    )
+
+
+class SymbolIndex:
+    """
+    Persistent (SQLite) index of handler functions, docs (`@command`) and `REGISTER_` calls in source files.
+    Files are only rescanned if their modification time or size changed, and their contents hash differently.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._create_schema()
+
+    def __enter__(self) -> "SymbolIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def _create_schema(self):
+        with self.db:
+            for (table,) in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                self.db.execute(f'DROP TABLE "{table}"')
+            self.db.executescript(SCHEMA)
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def update(self, paths: list[Path], workers: int = 1) -> tuple[int, int]:
+        """
+        Bring the index up-to-date with `paths` (using a pool of `workers` processes for scanning), and drop files that no longer exist.
+        Returns the number of files scanned and removed.
+        """
+
+        known = {
+            path: (mtime_ns, size, digest)
+            for path, mtime_ns, size, digest in self.db.execute("SELECT path, mtime_ns, size, hash FROM files")
+        }
+
+        pending: list[tuple[str, str | None]] = []
+        for path in paths:
+            resolved = str(path.resolve())
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if (entry := known.get(resolved)) and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+                continue
+            pending.append((resolved, entry[2] if entry else None))
+
+        if workers <= 1 or len(pending) <= 1:
+            results = [extract_symbols(*args) for args in pending]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                results = list(pool.map(extract_symbols, *zip(*pending), chunksize=32))
+
+        removed = [path for path in known if not Path(path).exists()]
+        with self.db:
+            for path in removed:
+                self._delete_file(path)
+            for symbols in results:
+                self._store(symbols)
+
+        scanned = sum(1 for symbols in results if symbols.changed)
+        logger.debug("Symbol index: %i files scanned, %i touched, %i removed", scanned, len(results) - scanned, len(removed))
+        return scanned, len(removed)
+
+    def _delete_file(self, path: str):
+        for table in ("files", "handlers", "doc_blocks", "register_calls"):
+            self.db.execute(f"DELETE FROM {table} WHERE path = ?", (path,))
+
+    def _store(self, symbols: FileSymbols):
+        if not symbols.changed:
+            self.db.execute(
+                "UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?",
+                (symbols.mtime_ns, symbols.size, symbols.path),
+            )
+            return
+
+        self._delete_file(symbols.path)
+        self.db.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+            (symbols.path, symbols.mtime_ns, symbols.size, symbols.hash, symbols.error),
+        )
+        self.db.executemany("INSERT INTO handlers VALUES (?, ?, ?, ?, ?, ?)", [(symbols.path, *row) for row in symbols.handlers])
+        self.db.executemany("INSERT INTO doc_blocks VALUES (?, ?, ?)", [(symbols.path, *row) for row in symbols.doc_blocks])
+        self.db.executemany(
+            "INSERT INTO register_calls VALUES (?, ?, ?, ?, ?, ?)",
+            [(symbols.path, *row) for row in symbols.register_calls],
+        )
+
+    def registrations(self, command_name: str) -> list[Registration]:
+        """
+        Where the command (with or without `COMMAND_` prefix) is registered, including commented out calls
+        """
+
+        return [
+            Registration(Path(path), line, macro, name, handler, bool(commented_out))
+            for path, line, macro, name, handler, commented_out in self.db.execute(
+                "SELECT * FROM register_calls WHERE command_name = ? ORDER BY path, line",
+                (command_name.removeprefix("COMMAND_"),),
+            )
+        ]
+
+    def handlers(self, name: str) -> list[Handler]:
+        """
+        Definitions of the handler function (case-insensitive, like handler names are resolved to commands)
+        """
+
+        return [
+            Handler(Path(path), line, handler_name, bool(is_stub), return_type, params)
+            for path, line, handler_name, is_stub, return_type, params in self.db.execute(
+                "SELECT * FROM handlers WHERE name = ? COLLATE NOCASE ORDER BY path, line", (name,)
+            )
+        ]
+
+    def docs(self, command_name: str) -> list[Docs]:
+        return [
+            Docs(Path(path), line, name)
+            for path, line, name in self.db.execute(
+                "SELECT * FROM doc_blocks WHERE command_name = ? ORDER BY path, line",
+                (command_name.removeprefix("COMMAND_"),),
+            )
+        ]
+
+    def duplicate_registrations(self) -> dict[str, list[Registration]]:
+        """
+        Commands registered more than once (not counting commented out calls), by command name
+        """
+
+        duplicates: dict[str, list[Registration]] = {}
+        for path, line, macro, name, handler, commented_out in self.db.execute(
+            """
+            SELECT * FROM register_calls
+            WHERE commented_out = 0 AND command_name IN (
+                SELECT command_name FROM register_calls WHERE commented_out = 0 GROUP BY command_name HAVING COUNT(*) > 1
+            )
+            ORDER BY command_name, path, line
+            """
+        ):
+            duplicates.setdefault(name, []).append(Registration(Path(path), line, macro, name, handler, bool(commented_out)))
+        return duplicates
+
+    def file_scans(self, paths: list[Path]) -> list[FileScan]:
+        """
+        Coverage-relevant symbols of `paths` (which should be up-to-date, see `update`), in the same order
+        """
+
+        scans = []
+        for path in paths:
+            resolved = str(path.resolve())
+            row = self.db.execute("SELECT error FROM files WHERE path = ?", (resolved,)).fetchone()
+            if row is None:
+                scans.append(FileScan(path, error="Not in the symbol index"))
+                continue
+            scans.append(
+                FileScan(
+                    path,
+                    register_calls=self.db.execute(
+                        "SELECT macro, command_name, handler FROM register_calls WHERE path = ? AND commented_out = 0 ORDER BY line",
+                        (resolved,),
+                    ).fetchall(),
+                    handlers={
+                        name: bool(is_stub)
+                        for name, is_stub in self.db.execute("SELECT name, is_stub FROM handlers WHERE path = ?", (resolved,))
+                    },
+                    error=row[0],
+                )
+            )
+        return scans
+
+    def file_handlers(self, paths: list[Path]) -> list[Handler]:
+        """
+        Handler functions defined in `paths` (which should be up-to-date, see `update`), in order of `paths`
+        """
+
+        handlers: list[Handler] = []
+        for path in paths:
+            handlers.extend(
+                Handler(path, line, name, bool(is_stub), return_type, params)
+                for line, name, is_stub, return_type, params in self.db.execute(
+                    "SELECT line, name, is_stub, return_type, params FROM handlers WHERE path = ? ORDER BY line",
+                    (str(path.resolve()),),
+                )
+            )
+        return handlers
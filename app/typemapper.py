@@ -1,48 +1,16 @@
 import re
-from typing import TypeVar, cast
+from typing import Iterable
 
-from .args import args
 from .cpp import is_cpp_reserved_keyword_or_typename
-from .data import DEFINITIONS, ENUMS
-from .jsontypes import Command, CommandInputParameter, CommandOutputParameter
+from .model import Command, Param
 from . import util
 
-# Types mapped for both input and output parameters
-TYPE_MAPPING = (
-    {
-        "model_char": "eModelID",
-        "model_vehicle": "eModelID",
-    }
-    | ({e: f"e{e}" for e in ENUMS})
-    | {
-        cmd["class"]: f'C{cmd["class"]}'
-        for extension in DEFINITIONS["extensions"]
-        for cmd in extension["commands"]
-        if "class" in cmd
-    }
-)
-
-# Types only mapped on input parameters
-INPUT_PARAMETER_TYPE_MAPPING = TYPE_MAPPING | {
-    "Char": "CPed",
-    "Car": "CVehicle",
-    "string": "std::string_view",
-    "label": "std::string_view",
-    "int": "int32",
-}
-
-# Types only mapped on output parameters
-OUTPUT_PARAMETER_TYPE_MAPPING = TYPE_MAPPING | {
-    # Nothing special for now
-}
-
-T = TypeVar("T", bound=CommandInputParameter | CommandOutputParameter)
-def get_vectorized_parameters(params: list[T], is_for_handler: bool):
-    if not args.vectorize_params:
+def get_vectorized_parameters(params: tuple[Param, ...], is_for_handler: bool, vectorize: bool = True):
+    if not vectorize:
         return params
-    
-    out: list[T] = []
-    
+
+    out: list[Param] = []
+
     def is_coord_param(param_name: str, coord: str) -> bool:
         lwr_name = param_name.lower()
         return lwr_name.startswith(coord) or lwr_name.endswith(coord)
@@ -51,89 +19,148 @@ def get_vectorized_parameters(params: list[T], is_for_handler: bool):
     while i < len(params):
         param = params[i]
         try:
-            if is_coord_param(param["name"], "x") and is_coord_param(
-                params[i + 1]["name"], "y"
+            if is_coord_param(param.name, "x") and is_coord_param(
+                params[i + 1].name, "y"
             ):
                 name = (
                     util.to_camel_case(
-                        re.sub("x$|^x", "", param["name"], flags=re.IGNORECASE)
+                        re.sub("x$|^x", "", param.name, flags=re.IGNORECASE)
                     )
                     or ''
                 )
-                if is_coord_param(params[i + 2]["name"], "z"):
-                    out.append(
-                        cast(T, {
-                            "name": name,
-                            "type": "CVector" if is_for_handler else "Vector",
-                        })
-                    )
+                if is_coord_param(params[i + 2].name, "z"):
+                    out.append(Param(name, "CVector" if is_for_handler else "Vector"))
                     i += 3
                 else:
-                    out.append(
-                        cast(T, {
-                            "name": name,
-                            "type": "CVector2D" if is_for_handler else "Vector2D",
-                        })
-                    )
+                    out.append(Param(name, "CVector2D" if is_for_handler else "Vector2D"))
                     i += 2
                 continue
-            
+
             out.append(param)
             i += 1
         except IndexError:
             break
-        
-    return out + params[i:]
-
-def get_transformed_input_parameters(command: Command, is_for_handler: bool):
-    is_static = command.get("attrs", {}).get("is_static", False)
-    
-    out: list[CommandInputParameter] = []
-    for i, param in enumerate(get_vectorized_parameters(command.get("input", []), is_for_handler)):
-        # Handle the common case of a class static function 
-        # where the first parameter is the handle of the instance, 
-        # by replacing its type with the class name
-        if klass := command.get("class"):
-            if is_static and i == 0 and param["name"] == "handle":
-                param["type"] = f"C{klass}" if is_for_handler else klass
-                param["name"] = (
-                    util.to_camel_case(
-                        re.sub(
-                            "handle$|^handle", "", param["name"], flags=re.IGNORECASE
-                        )
+
+    return (*out, *params[i:])
+
+
+def build_type_mapping(class_names: Iterable[str], enums: Iterable[str]) -> dict[str, str]:
+    """
+    Build the mapping of types mapped for both input and output parameters, from the class names of all commands
+    """
+
+    return (
+        {
+            "model_char": "eModelID",
+            "model_vehicle": "eModelID",
+        }
+        | ({e: f"e{e}" for e in enums})
+        | {klass: f"C{klass}" for klass in sorted(class_names)}
+    )
+
+
+class TypeMapper:
+    """
+    Maps script types of command parameters to C++ types
+    """
+
+    def __init__(self, type_mapping: dict[str, str]):
+        # Transformed parameters, by (command, is for handler, vectorize)
+        self._input_parameters_cache: dict[tuple[Command, bool, bool], tuple[Param, ...]] = {}
+        self._output_parameters_cache: dict[tuple[Command, bool, bool], tuple[Param, ...]] = {}
+
+        # Types mapped for both input and output parameters
+        self.type_mapping = type_mapping
+
+        # Types only mapped on input parameters
+        self.input_parameter_type_mapping = type_mapping | {
+            "Char": "CPed",
+            "Car": "CVehicle",
+            "string": "std::string_view",
+            "label": "std::string_view",
+            "int": "int32",
+        }
+
+        # Types only mapped on output parameters
+        self.output_parameter_type_mapping = type_mapping | {
+            # Nothing special for now
+        }
+
+    def __getstate__(self):
+        # Transformed parameters are cheap to recompute, don't bloat snapshots (or data sent to worker processes) with them
+        return self.__dict__ | {"_input_parameters_cache": {}, "_output_parameters_cache": {}}
+
+    def get_transformed_input_parameters(
+        self, command: Command, is_for_handler: bool, vectorize: bool = True
+    ) -> tuple[Param, ...]:
+        """
+        Get the input parameters of a command as they should appear in the docs, or in the handler's signature if `is_for_handler` is set.
+        The result is cached.
+        """
+
+        key = (command, is_for_handler, vectorize)
+        if (params := self._input_parameters_cache.get(key)) is None:
+            params = self._input_parameters_cache[key] = tuple(
+                self._transform_input_parameters(command, is_for_handler, vectorize)
+            )
+        return params
+
+    def get_transformed_output_parameters(
+        self, command: Command, is_for_handler_output: bool, vectorize: bool = True
+    ) -> tuple[Param, ...]:
+        """
+        Get the output parameters of a command as they should appear in the docs, or in the handler's return type if `is_for_handler_output` is set.
+        The result is cached.
+        """
+
+        key = (command, is_for_handler_output, vectorize)
+        if (params := self._output_parameters_cache.get(key)) is None:
+            params = self._output_parameters_cache[key] = tuple(
+                param._replace(
+                    type=(
+                        self.output_parameter_type_mapping.get(param.type, param.type)
+                        if is_for_handler_output
+                        else param.type
                     )
-                    or klass.lower()
                 )
-
-        # Apply additional C++ type mappings for input parameters, 
-        # and add pointer/reference symbols as needed for handler inputs
-        if is_for_handler:
-            param["type"] = INPUT_PARAMETER_TYPE_MAPPING.get(
-                param["type"], param["type"]
+                for param in get_vectorized_parameters(command.output, is_for_handler_output, vectorize)
             )
-            if param["type"].startswith("C"):
-                param["type"] += "*" if is_static and i == 0 else "&"
+        return params
+
+    def _transform_input_parameters(self, command: Command, is_for_handler: bool, vectorize: bool):
+        is_static = command.is_static
 
-        # Handle reserved keywords in C++
-        if is_cpp_reserved_keyword_or_typename(param["name"]):
-            param["name"] += "_"
+        out: list[Param] = []
+        for i, param in enumerate(get_vectorized_parameters(command.input, is_for_handler, vectorize)):
+            # Handle the common case of a class static function
+            # where the first parameter is the handle of the instance,
+            # by replacing its type with the class name (mapped to the C++ class below for handlers)
+            if klass := command.klass:
+                if is_static and i == 0 and param.name == "handle":
+                    param = Param(
+                        name=(
+                            util.to_camel_case(
+                                re.sub(
+                                    "handle$|^handle", "", param.name, flags=re.IGNORECASE
+                                )
+                            )
+                            or klass.lower()
+                        ),
+                        type=klass,
+                    )
 
-        out.append(param)
+            # Apply additional C++ type mappings for input parameters,
+            # and add pointer/reference symbols as needed for handler inputs
+            if is_for_handler:
+                param_type = self.input_parameter_type_mapping.get(param.type, param.type)
+                if param_type.startswith("C"):
+                    param_type += "*" if is_static and i == 0 else "&"
+                param = param._replace(type=param_type)
 
-    return out
+            # Handle reserved keywords in C++
+            if is_cpp_reserved_keyword_or_typename(param.name):
+                param = param._replace(name=f"{param.name}_")
 
+            out.append(param)
 
-def get_transformed_output_parameters(
-    params: list[CommandOutputParameter], is_for_handler_output: bool
-):
-    return [
-        {
-            **param,
-            "type": (
-                OUTPUT_PARAMETER_TYPE_MAPPING.get(param["type"], param["type"])
-                if is_for_handler_output
-                else param["type"]
-            ),
-        }
-        for param in get_vectorized_parameters(params, is_for_handler_output)
-    ]
+        return out
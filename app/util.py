@@ -1,19 +1,73 @@
-from .jsontypes import Command
+import os
+from pathlib import Path
+
+from .metrics import metrics
+from .model import Command
 
 
 def to_camel_case(s: str) -> str:
     return f"{s[0].lower()}{s[1:]}" if s else s
 
 def get_handler_name(command: Command) -> str | None:
-    if attrs := command.get("attrs", None):
-        if attrs.get("is_nop", False) or attrs.get("is_unsupported", False):
-            return None
-    return "".join(v.capitalize() for v in command["name"].split("_"))
+    if command.is_nop or command.is_unsupported:
+        return None
+    return "".join(v.capitalize() for v in command.name.split("_"))
 
 def get_handler_return_type(command: Command) -> str:
-    if command.get("attrs", {}).get("is_condition", False):
+    if command.is_condition:
         return "bool"
-    elif len(command.get("output", [])) == 0:
+    elif len(command.output) == 0:
         return "void"
     else:
         return "auto"
+
+
+def create_temp_file(path: Path) -> tuple[int, str]:
+    """
+    Create a uniquely named temporary file next to `path`, returning its descriptor and name.
+    Unlike `tempfile.mkstemp`, it has the permissions of any new file (the OS applies the umask), so nothing has to read (i.e. change) the process-wide umask.
+    """
+
+    while True:
+        tmp_name = str(path.with_name(f".{path.name}.{os.urandom(6).hex()}.tmp"))
+        try:
+            return os.open(tmp_name, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666), tmp_name
+        except FileExistsError:
+            continue
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """
+    Write `data` to `path` by writing a temporary file next to it and renaming it over the original.
+    The permissions of an existing file are kept.
+    """
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = create_temp_file(path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        try:
+            os.chmod(tmp_name, path.stat().st_mode)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+def write_text_if_changed(path: Path, text: str, encoding: str = "utf-8") -> bool:
+    """
+    Write `text` to `path` (atomically, with platform line endings, like `Path.write_text`), unless it already has these contents.
+    Returns whether the file was written - an unchanged file keeps its modification time, so it doesn't trigger rebuilds.
+    """
+
+    with metrics.phase("write_output"):
+        try:
+            if path.read_text(encoding=encoding) == text:
+                return False
+        except (FileNotFoundError, UnicodeDecodeError):
+            pass
+        atomic_write_bytes(path, text.replace("\n", os.linesep).encode(encoding))
+        metrics.count("files_written")
+        return True
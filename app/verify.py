@@ -0,0 +1,136 @@
+import logging
+import re
+from dataclasses import dataclass
+
+from . import util
+from .model import Command
+from .options import Options
+from .session import Session
+from .symbols import Handler
+
+logger = logging.getLogger(__name__)
+
+# Specifiers that may precede the return type, they don't change the signature
+DECL_SPECIFIERS_REGEX = re.compile(r"^(?:(?:static|inline|constexpr)\s+)+")
+# Whitespace around punctuation of a type (`CPed &` is the same as `CPed&`)
+TYPE_PUNCTUATION_SPACING_REGEX = re.compile(r"\s*([&*<>,:])\s*")
+# A parameter declaration ending with its name (`CPed& ped`), the name is optional (`CPed&`)
+PARAM_NAME_REGEX = re.compile(r"^(?P<type>.*?[\s&*>])\s*(?P<name>[A-Za-z_]\w*)$")
+# Handlers may take the script they're run by as their first parameter, it isn't a parameter of the command
+SCRIPT_PARAM_TYPES = ("CRunningScript&", "CRunningScript*")
+
+
+@dataclass(frozen=True)
+class SignatureMismatch:
+    handler: Handler
+    command: Command
+    expected_return_type: str
+    expected_param_types: tuple[str, ...]
+    actual_return_type: str
+    actual_param_types: tuple[str, ...]
+
+    @property
+    def expected(self) -> str:
+        return f"{self.expected_return_type} {self.handler.name}({', '.join(self.expected_param_types)})"
+
+    @property
+    def actual(self) -> str:
+        return f"{self.actual_return_type} {self.handler.name}({', '.join(self.actual_param_types)})"
+
+
+def normalize_type(cpp_type: str) -> str:
+    return " ".join(TYPE_PUNCTUATION_SPACING_REGEX.sub(r"\1", cpp_type).split()).replace(",", ", ")
+
+
+def get_param_types(params: str) -> tuple[str, ...]:
+    """
+    Get the (normalized) types of a parameter list as written in the source, without names and default values
+    """
+
+    # Split at commas that aren't inside of template arguments or default values (`CVector pos = {0.0f, 0.0f, 0.0f}`)
+    declarations, depth, start = [], 0, 0
+    for i, c in enumerate(params):
+        if c in "<([{":
+            depth += 1
+        elif c in ">)]}":
+            depth = max(depth - 1, 0)  # Not below 0, `>` may be a comparison in a default value
+        elif c == "," and depth == 0:
+            declarations.append(params[start:i])
+            start = i + 1
+    declarations.append(params[start:])
+
+    types = []
+    for declaration in declarations:
+        declaration = declaration.split("=", 1)[0].strip()
+        if not declaration or declaration == "void":
+            continue
+        if (match := PARAM_NAME_REGEX.match(declaration)) and match["type"].strip() not in ("", "const", "unsigned", "signed"):
+            declaration = match["type"]
+        types.append(normalize_type(declaration))
+    if types and types[0] in SCRIPT_PARAM_TYPES:
+        types.pop(0)
+    return tuple(types)
+
+
+def is_return_type_compatible(expected: str, actual: str) -> bool:
+    # Stubs return `auto` for commands with outputs, which implementations are free to spell out
+    if expected == "auto":
+        return actual not in ("void", "bool")
+    return actual == expected
+
+
+def verify_handlers(session: Session, options: Options, handlers: list[Handler]) -> tuple[list[SignatureMismatch], int]:
+    """
+    Compare the signatures of existing `handlers` of commands matching `options` against the ones `write_handler_function_stub` would write.
+    Handlers of other commands (and functions that aren't handlers) are ignored.
+    Returns the mismatches and the number of handlers checked.
+    """
+
+    commands_by_handler_name = {
+        handler_name.lower(): cmd
+        for cmd in session.filter_commands(options)
+        if (handler_name := util.get_handler_name(cmd))
+    }
+
+    mismatches, checked = [], 0
+    for handler in handlers:
+        if not (cmd := commands_by_handler_name.get(handler.name.lower())):
+            continue
+        checked += 1
+
+        expected_return_type = util.get_handler_return_type(cmd)
+        expected_param_types = tuple(
+            normalize_type(param.type)
+            for param in session.mapper.get_transformed_input_parameters(cmd, True, options.vectorize_params)
+        )
+        actual_return_type = normalize_type(DECL_SPECIFIERS_REGEX.sub("", handler.return_type.strip()))
+        actual_param_types = get_param_types(handler.params)
+        if actual_param_types != expected_param_types or not is_return_type_compatible(expected_return_type, actual_return_type):
+            mismatches.append(
+                SignatureMismatch(
+                    handler,
+                    cmd,
+                    expected_return_type,
+                    expected_param_types,
+                    actual_return_type,
+                    actual_param_types,
+                )
+            )
+    return mismatches, checked
+
+
+def log_mismatches(mismatches: list[SignatureMismatch], checked: int):
+    for mismatch in mismatches:
+        logger.error(
+            "%s:%i: handler of `%s` doesn't match the definitions - expected `%s`, found `%s`",
+            mismatch.handler.path,
+            mismatch.handler.line,
+            mismatch.command.name,
+            mismatch.expected,
+            mismatch.actual,
+        )
+
+    if mismatches:
+        logger.error("%i of %i handlers don't match the definitions", len(mismatches), checked)
+    else:
+        logger.info("All %i handlers match the definitions", checked)
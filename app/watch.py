@@ -0,0 +1,56 @@
+import logging
+import time
+from pathlib import Path
+from typing import Callable
+
+from .batch import FileSummary, log_summary, update_file
+from .options import Options
+from .session import Session
+
+logger = logging.getLogger(__name__)
+
+
+def _get_signature(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watch(
+    session: Session,
+    options: Options,
+    resolve_files: Callable[[], list[tuple[Path, Path]]],
+    interval: float,
+):
+    """
+    Keep updating files whenever they change, until interrupted.
+    `resolve_files` is called on every poll and returns the (input, output) path pairs to watch, so new files are picked up too.
+    Files are checked every `interval` seconds by comparing their modification time and size.
+    """
+
+    commands = session.filter_commands(options)
+
+    # Input path -> signature (mtime, size) at the time it was last processed (or written by us)
+    seen: dict[Path, tuple[int, int] | None] = {}
+
+    logger.info("Watching for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            summaries: list[FileSummary] = []
+            for path, output_path in resolve_files():
+                signature = _get_signature(path)
+                if signature is None or seen.get(path) == signature:
+                    continue
+
+                summaries.append(update_file(session, options, commands, path, output_path))
+
+                # Remember the signature after our own write, so it doesn't trigger another update
+                seen[path] = _get_signature(path)
+
+            if summaries:
+                log_summary(summaries)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
@@ -3,19 +3,20 @@ import io
 import textwrap
 import typing
 
-from .jsontypes import Command
-from . import typemapper, util
-from .args import args
+from .model import Command
+from .options import Options
+from .typemapper import TypeMapper
+from . import util
 
 
-def write_code_line(f: typing.TextIO, line: str, indent_level: int = 0, suffix="\n"):
+def write_code_line(f: typing.TextIO, line: str, indent_level: int = 0, suffix="\n", commented_out: bool = False):
     """
-    Writes a single line of code to the provided file-like object, with optional indentation and commenting out based on command-line arguments.
-    If `args.commented_out` is True, the line will be prefixed with "// ".
+    Writes a single line of code to the provided file-like object, with optional indentation and commenting out.
+    If `commented_out` is True, the line will be prefixed with "// ".
     """
 
     f.write("    " * indent_level)
-    if args.commented_out:
+    if commented_out:
         f.write("//")
     f.write(line)
     f.write(suffix)
@@ -32,7 +33,7 @@ def write_multi_line_comment(f: typing.TextIO):
     f.write(" */\n")
 
 
-def write_docs(f: typing.TextIO, cmd: Command):
+def write_docs(f: typing.TextIO, cmd: Command, mapper: TypeMapper, options: Options):
     """
     Write C++ doxygen-like documentation for the given command to the provided file-like object.
     The documentation includes opcode, command name, class/member info, static/condition attributes, brief description, and parameter/return type information.
@@ -42,37 +43,37 @@ def write_docs(f: typing.TextIO, cmd: Command):
         f.write(f"{line}\n")
 
     with write_multi_line_comment(f):
-        write_ln(f' * @opcode {cmd["id"]}')
-        write_ln(f' * @command {cmd["name"]}')
+        write_ln(f" * @opcode {cmd.id}")
+        write_ln(f" * @command {cmd.name}")
 
-        if "class" in cmd:
-            write_ln(f' * @class {cmd["class"]}')
-            if "member" in cmd:
-                write_ln(f' * @method {cmd["member"]}')
+        if cmd.klass:
+            write_ln(f" * @class {cmd.klass}")
+            if cmd.member:
+                write_ln(f" * @method {cmd.member}")
 
-        if cmd.get("attrs", {}).get("is_static", False):
+        if cmd.is_static:
             write_ln(" * @static")
 
-        if short_desc := cmd.get("short_desc", ''):
+        if short_desc := cmd.short_desc:
             write_ln(" * ")
             for line in textwrap.wrap(short_desc, width=80):
                 write_ln(f" * @brief {line}")
 
-        if input_params := typemapper.get_transformed_input_parameters(cmd, False):
+        if input_params := mapper.get_transformed_input_parameters(cmd, False, options.vectorize_params):
             write_ln(" * ")
             for param in input_params:
-                write_ln(f' * @param {{{param["type"]}}} {param["name"]}')
+                write_ln(f" * @param {{{param.type}}} {param.name}")
 
-        if output_params := typemapper.get_transformed_output_parameters(
-            cmd.get("output", []), False
+        if output_params := mapper.get_transformed_output_parameters(
+            cmd, False, options.vectorize_params
         ):
             write_ln(" * ")
             write_ln(
-                f' * @returns {", ".join(f"{{{param["type"]}}} {param["name"]}" for param in output_params)}'
+                f' * @returns {", ".join(f"{{{param.type}}} {param.name}" for param in output_params)}'
             )
 
 
-def write_handler_function_stub(f: typing.TextIO, cmd: Command):
+def write_handler_function_stub(f: typing.TextIO, cmd: Command, mapper: TypeMapper, options: Options):
     """
     Writes C++ handler function stub for the given command to the provided file-like object.
     The function signature is determined based on the command's attributes and output parameters.
@@ -81,17 +82,18 @@ def write_handler_function_stub(f: typing.TextIO, cmd: Command):
     # Function definition line
     write_code_line(
         f,
-        f"{util.get_handler_return_type(cmd)} {util.get_handler_name(cmd)}({', '.join(f"{param['type']} {param['name']}" for param in typemapper.get_transformed_input_parameters(cmd, True))}) {{",
+        f"{util.get_handler_return_type(cmd)} {util.get_handler_name(cmd)}({', '.join(f"{param.type} {param.name}" for param in mapper.get_transformed_input_parameters(cmd, True, options.vectorize_params))}) {{",
+        commented_out=options.commented_out,
     )
 
     # Function body (stub)
-    write_code_line(f, 'NOTSA_UNREACHABLE("Not implemented");', 1)
+    write_code_line(f, 'NOTSA_UNREACHABLE("Not implemented");', 1, commented_out=options.commented_out)
 
     # Closing brace for the function
-    write_code_line(f, "}", 0)
+    write_code_line(f, "}", 0, commented_out=options.commented_out)
 
 
-def write_register_handler(f: typing.TextIO, cmd: Command):
+def write_register_handler(f: typing.TextIO, cmd: Command, mapper: TypeMapper, options: Options):
     """
     Writes the appropriate command registration line for the given command to the provided file-like object.
     Depending on whether the command is a no-op or not, it will use either REGISTER_COMMAND_HANDLER or REGISTER_COMMAND_NOP.
@@ -100,16 +102,18 @@ def write_register_handler(f: typing.TextIO, cmd: Command):
     if handler_name := util.get_handler_name(cmd):
         write_code_line(
             f,
-            f'REGISTER_COMMAND_HANDLER({cmd["name"]}, {handler_name});',
+            f"REGISTER_COMMAND_HANDLER({cmd.name}, {handler_name});",
             1,
+            commented_out=options.commented_out,
         )
     else:
         types = [
-            "int32" if param["type"] == "any" else param["type"] # We could use anything for `any`, we just need to read the args so the IP is adjusted correctly
-            for param in typemapper.get_transformed_input_parameters(cmd, True)
+            "int32" if param.type == "any" else param.type # We could use anything for `any`, we just need to read the args so the IP is adjusted correctly
+            for param in mapper.get_transformed_input_parameters(cmd, True, options.vectorize_params)
         ]
         write_code_line(
             f,
-            f'REGISTER_COMMAND_NOP({cmd["name"]}{''.join(f', {t}' for t in types)});',
+            f"REGISTER_COMMAND_NOP({cmd.name}{''.join(f', {t}' for t in types)});",
             1,
+            commented_out=options.commented_out,
         )
@@ -0,0 +1,183 @@
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from app import __version__
+from app.cache import DownloadCache
+from app.data import parse_enums
+from app.options import Options
+from app.rendercache import RenderCache
+from app.session import Session
+
+from .server import DefinitionsServer
+from .synthetic import make_definitions, make_enums, make_handlers_file
+
+logger = logging.getLogger(__name__)
+
+
+def time_it(fn: Callable[[], object], repeat: int) -> list[float]:
+    """
+    Run `fn` `repeat` times, returning the wall time of each run in seconds
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(scale: float, phase: str, timings: list[float], **extra) -> dict:
+    result = {
+        "scale": scale,
+        "phase": phase,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "runs": timings,
+        **extra,
+    }
+    logger.info("%5gx %-24s min %8.2f ms, median %8.2f ms", scale, phase, result["min"] * 1000, result["median"] * 1000)
+    return result
+
+
+def load_default(definitions_url: str, enums_url: str, cache: DownloadCache) -> Session:
+    """
+    Load the definitions and decode the commands of the default extension (extensions are decoded lazily)
+    """
+
+    session = Session.load(definitions_url, enums_url, cache)
+    session.filter_commands(Options())
+    return session
+
+
+def bench_scale(scale: float, repeat: int, handlers_file_commands: int) -> list[dict]:
+    definitions = make_definitions(scale)
+    raw_definitions = json.dumps(definitions).encode("utf-8")
+    raw_enums = make_enums().encode("utf-8")
+    num_commands = sum(len(extension["commands"]) for extension in definitions["extensions"])
+    logger.info("%gx: %i commands, %.1f MiB of definitions", scale, num_commands, len(raw_definitions) / 2**20)
+
+    results = []
+    with (
+        DefinitionsServer({"defs.json": raw_definitions, "enums.txt": raw_enums}) as server,
+        tempfile.TemporaryDirectory(prefix="script-fox-bench-") as tmp,
+    ):
+        definitions_url, enums_url = server.url("defs.json"), server.url("enums.txt")
+        cache_dirs = iter(range(repeat))
+
+        # Nothing cached - download, decode, index and save the snapshot
+        results.append(summarize(scale, "load_cold", time_it(
+            lambda: load_default(definitions_url, enums_url, DownloadCache(Path(tmp) / f"cold{next(cache_dirs)}")),
+            repeat,
+        ), commands=num_commands))
+
+        # Downloads and snapshot cached - revalidated with the server (`304`) or not at all (within max age)
+        cache_dir = Path(tmp) / "warm"
+        load_default(definitions_url, enums_url, DownloadCache(cache_dir))
+        results.append(summarize(scale, "load_revalidate", time_it(
+            lambda: load_default(definitions_url, enums_url, DownloadCache(cache_dir)),
+            repeat,
+        )))
+        results.append(summarize(scale, "load_warm", time_it(
+            lambda: load_default(definitions_url, enums_url, DownloadCache(cache_dir, max_age=float("inf"))),
+            repeat,
+        )))
+
+        # In-memory only, for comparison with the cached paths
+        results.append(summarize(scale, "build_index", time_it(
+            lambda: Session.from_definitions(json.loads(raw_definitions), parse_enums(raw_enums)),
+            repeat,
+        )))
+
+        session = Session.load(definitions_url, enums_url, DownloadCache(cache_dir, max_age=float("inf")))
+        options = Options(extension=".")
+        results.append(summarize(scale, "filter_commands", time_it(lambda: session.filter_commands(options), repeat)))
+
+        commands = session.filter_commands(options)
+        results.append(summarize(scale, "generate_new", time_it(
+            lambda: session.generate_new(options, commands),
+            repeat,
+        ), commands=len(commands)))
+
+        # Fragments rendered by a previous run reused from the render cache (large enough for all of them)
+        session.render_cache = RenderCache(Path(tmp) / "renders.sqlite", max_entries=4 * len(commands))
+        session.generate_new(options, commands)
+        results.append(summarize(scale, "generate_new_cached", time_it(
+            lambda: session.generate_new(options, commands),
+            repeat,
+        ), commands=len(commands)))
+        session.render_cache.close()
+        session.render_cache = None
+
+        default_options = Options(generate_register_calls=True)
+        default_commands = session.filter_commands(default_options)
+        text = make_handlers_file(definitions, handlers_file_commands)
+        results.append(summarize(scale, "update_existing", time_it(
+            lambda: session.update_existing(default_options, text, default_commands),
+            repeat,
+        ), lines=text.count("\n")))
+
+        results[-1]["requests"] = {str(status): count for status, count in sorted(server.requests.items())}
+
+    return results
+
+
+def get_git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description="Benchmark loading, filtering and code generation on synthetic definitions, served from a local HTTP server",
+    )
+    parser.add_argument("--scale", type=float, nargs="+", default=[1, 10, 50], help="Definitions sizes to benchmark, relative to the real `sa.json`")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs of each phase")
+    parser.add_argument("--handlers-file-commands", type=int, default=500, help="Number of commands in the synthetic handlers file for `update_existing`")
+    parser.add_argument("--results", type=Path, default=Path("bench_results.json"), help="Where to write the results (JSON)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logging.getLogger("app").setLevel(logging.ERROR)  # Per-command warnings would drown out the results
+
+    results = [
+        result
+        for scale in args.scale
+        for result in bench_scale(scale, args.repeat, args.handlers_file_commands)
+    ]
+
+    args.results.write_text(
+        json.dumps(
+            {
+                "tool_version": __version__,
+                "git_commit": get_git_commit(),
+                "python": sys.version,
+                "platform": platform.platform(),
+                "timestamp": time.time(),
+                "repeat": args.repeat,
+                "results": results,
+            },
+            indent=4,
+        ),
+        encoding="utf-8",
+    )
+    logger.info("Wrote results to `%s`", args.results)
+
+
+if __name__ == "__main__":
+    main()
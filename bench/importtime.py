@@ -0,0 +1,103 @@
+import argparse
+import functools
+import logging
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Cumulative import time of the command-line entry point allowed, in milliseconds
+DEFAULT_BUDGET_MS = 150
+
+# Modules only some code paths need, which must not be imported on startup
+LAZY_MODULES = (
+    "requests",  # Only needed when downloading
+    "urllib3",
+    "multiprocessing",  # Only needed when work is spread over worker processes
+    "sqlite3",  # Symbol index
+    "socketserver",  # Daemon mode
+    "tomllib",  # Jobs files
+    "cProfile",
+    "tempfile",  # Slow to import, files are written without it (see `util.atomic_write_bytes`)
+)
+
+IMPORT_TIME_LINE_REGEX = re.compile(r"^import time:\s+(?P<self>\d+)\s+\|\s+(?P<cumulative>\d+)\s+\|(?P<indent>\s+)(?P<module>\S+)\s*$")
+
+
+def run_with_import_time(code: str) -> dict[str, int]:
+    """
+    Run `code` in a new interpreter with `-X importtime`, returning the cumulative import time (in microseconds) of every module imported
+    """
+
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+    )
+    return {
+        match["module"]: int(match["cumulative"])
+        for line in process.stderr.splitlines()
+        if (match := IMPORT_TIME_LINE_REGEX.match(line))
+    }
+
+
+@functools.cache
+def get_startup_modules() -> frozenset[str]:
+    """
+    Modules the interpreter imports before running any code (`site`, and whatever the `.pth` files of installed packages import)
+    """
+
+    return frozenset(run_with_import_time("pass"))
+
+
+def measure_import_time(module: str) -> dict[str, int]:
+    """
+    Import `module` in a new interpreter, returning the cumulative import time (in microseconds) of every module it imported.
+    Modules imported on startup anyway are left out, they're never imported by `module` (and depend on the environment).
+    """
+
+    startup_modules = get_startup_modules()
+    return {name: cumulative for name, cumulative in run_with_import_time(f"import {module}").items() if name not in startup_modules}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.importtime",
+        description="Check that importing the command-line entry point stays within a time budget and doesn't import modules only some code paths need",
+    )
+    parser.add_argument("--module", default="app.__main__", help="Module to import")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Cumulative import time allowed, in milliseconds")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of imports, the fastest one counts (the first one also compiles the modules)")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest modules to show")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    timings = min((measure_import_time(args.module) for _ in range(args.repeat)), key=lambda timings: timings[args.module])
+    total_ms = timings[args.module] / 1000
+
+    logger.info("Slowest modules (cumulative):")
+    for module, cumulative in sorted(timings.items(), key=lambda item: item[1], reverse=True)[: args.top]:
+        logger.info("%10.2f ms  %s", cumulative / 1000, module)
+
+    failed = False
+    if total_ms > args.budget_ms:
+        logger.error("Importing `%s` took %.2f ms, over the budget of %.2f ms", args.module, total_ms, args.budget_ms)
+        failed = True
+    else:
+        logger.info("Importing `%s` took %.2f ms (budget %.2f ms)", args.module, total_ms, args.budget_ms)
+
+    for module in LAZY_MODULES:
+        if module in timings:
+            logger.error("`%s` is imported on startup, it should only be imported by the code paths that need it", module)
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class DefinitionsServer:
+    """
+    Local HTTP stand-in for the Sanny Builder Library, serving fixed files with `ETag` support (so conditional requests get a `304`),
+    keep-alive connections and `gzip` compression (if accepted), like the real server.
+    Counts requests per status, so benchmarks can tell how many full downloads happened.
+    """
+
+    def __init__(self, files: dict[str, bytes]):
+        self.files = files
+        self.requests: dict[int, int] = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/{path}"
+
+    def __enter__(self) -> "DefinitionsServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                data = server.files.get(self.path.lstrip("/"))
+                if data is None:
+                    self._respond(404)
+                    return
+
+                etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._respond(304, headers={"ETag": etag})
+                elif "gzip" in self.headers.get("Accept-Encoding", ""):
+                    self._respond(200, gzip.compress(data, 1), {"ETag": etag, "Content-Encoding": "gzip"})
+                else:
+                    self._respond(200, data, {"ETag": etag})
+
+            def _respond(self, status: int, body: bytes = b"", headers: dict[str, str] | None = None):
+                server.requests[status] = server.requests.get(status, 0) + 1
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass  # Keep benchmark output clean
+
+        return Handler
@@ -0,0 +1,123 @@
+import random
+
+from app import util
+from app.jsontypes import Command, CommandInputParameter, Definitions, Extension
+from app.model import Interner
+
+# Roughly the shape of the real `sa.json` (at scale 1)
+COMMANDS_PER_EXTENSION = {
+    "default": 2600,
+    "CLEO": 180,
+    "CLEO+": 450,
+    "file": 40,
+    "math": 30,
+    "memory": 60,
+    "imgui": 200,
+}
+
+CLASSES = ["Char", "Car", "Object", "Player", "Camera", "Hud", "Text", "Pickup", "Blip", "Sphere", "Garage", "Game", "Audio", "Fx", "Weather", "Streaming"]
+PARAM_TYPES = ["int", "float", "bool", "string", "label", "any", "model_char", "model_vehicle", "model_object", "Char", "Car", "Object", "gxt_key", "zone_key"]
+ENUMS = ["PedType", "WeaponType", "DrivingMode", "BodyPart", "Fade", "CarDoor", "WeatherType", "TextStyle", "ButtonId", "Town"]
+ATTRS = ["is_condition", "is_static", "is_nop", "is_unsupported", "is_constructor", "is_destructor", "is_overload"]
+WORDS = ["GET", "SET", "IS", "CREATE", "DELETE", "ADD", "REMOVE", "CHAR", "CAR", "OBJECT", "PLAYER", "POSITION", "HEALTH", "COORDINATES", "MODEL", "AREA", "ANGLE", "SPEED", "WEAPON", "FLAG", "STATUS", "ONSCREEN", "DEAD", "ALIVE", "NEAR", "2D", "3D"]
+DESC_WORDS = ["Returns", "the", "character's", "current", "position", "in", "the", "world", "and", "sets", "a", "flag", "for", "vehicle", "specified", "with", "given", "model", "index"]
+
+
+def make_command(rng: random.Random, opcode: int, extension: str, index: int) -> Command:
+    name = "_".join(rng.sample(WORDS, rng.randint(2, 5))) + f"_{extension.upper().replace('+', 'P')}{index}"
+    command: Command = {"id": f"{opcode:04X}", "name": name, "num_params": 0}
+
+    if rng.random() < 0.7:
+        command["short_desc"] = " ".join(rng.choices(DESC_WORDS, k=rng.randint(5, 30)))
+
+    inputs: list[CommandInputParameter] = []
+    if rng.random() < 0.6:
+        command["class"] = rng.choice(CLASSES)
+        command["member"] = util.to_camel_case(name.title().replace("_", ""))
+        inputs.append({"name": "handle", "type": command["class"]})
+    if rng.random() < 0.3:  # Coordinates, to exercise vectorization
+        inputs += [{"name": f"{prefix}{axis}", "type": "float"} for prefix in [rng.choice(["", "from", "to"])] for axis in "XYZ"]
+    inputs += [
+        {"name": f"param{i}", "type": rng.choice(PARAM_TYPES + ENUMS)}
+        for i in range(rng.randint(0, 4))
+    ]
+    if inputs:
+        command["input"] = inputs
+
+    if rng.random() < 0.35:
+        command["output"] = [
+            {"name": f"result{i}", "type": rng.choice(PARAM_TYPES)}
+            for i in range(rng.randint(1, 3))
+        ]
+
+    command["num_params"] = len(inputs) + len(command.get("output", []))
+
+    if attrs := {attr: True for attr in ATTRS if rng.random() < 0.08}:
+        command["attrs"] = attrs  # type: ignore[typeddict-item]
+
+    return command
+
+
+def make_definitions(scale: float = 1, seed: int = 0) -> Definitions:
+    """
+    Generate definitions in the format of the Sanny Builder Library JSON with about `scale` times as many commands as the real `sa.json`
+    """
+
+    rng = random.Random(seed)
+    extensions: list[Extension] = []
+    opcode = 0
+    for extension_name, count in COMMANDS_PER_EXTENSION.items():
+        commands = []
+        for i in range(max(1, round(count * scale))):
+            commands.append(make_command(rng, opcode, extension_name, i))
+            opcode += 1
+        extensions.append({"name": extension_name, "commands": commands})
+
+    return {
+        "meta": {"last_update": 1700000000000 + int(scale * 1000), "version": f"bench-{scale}", "url": "http://localhost"},
+        "extensions": extensions,
+    }
+
+
+def make_enums() -> str:
+    return "".join(f"enum {name}\nValue0 = 0\nValue1 = 1\nend\n\n" for name in ENUMS)
+
+
+def make_handlers_file(definitions: Definitions, num_commands: int, seed: int = 0) -> str:
+    """
+    Generate a handlers source file for (up to) `num_commands` commands of the `default` extension.
+    Most commands get a documented handler and a `REGISTER_` call, some are left undocumented, some unregistered, and some only have an old-style single-line comment.
+    """
+
+    rng = random.Random(seed)
+    interner = Interner()
+    commands = [
+        interner.command(command)
+        for command in definitions["extensions"][0]["commands"][:num_commands]
+    ]
+
+    lines = ["#include <StdInc.h>\n", "\n", '#include "CommandParser/Parser.hpp"\n', "\n"]
+    registered = []
+    for command in commands:
+        handler_name = util.get_handler_name(command)
+        roll = rng.random()
+        if roll < 0.1 or handler_name is None:  # Missing entirely (stub and registration will be added)
+            continue
+        if roll < 0.5:
+            lines += ["/*\n", f" * @opcode {command.id}\n", f" * @command {command.name}\n", " * \n", " * @brief Something\n", " */\n"]
+        elif roll < 0.6:
+            lines.append(f"// COMMAND_{command.name} - Old-style docs\n")
+        lines += [
+            f"{util.get_handler_return_type(command)} {handler_name}(CRunningScript& S, int32 value) {{\n",
+            "    // Some implementation\n",
+            "    return;\n",
+            "}\n",
+            "\n",
+        ]
+        if roll < 0.95:
+            registered.append(f"    REGISTER_COMMAND_HANDLER(COMMAND_{command.name}, {handler_name});\n")
+
+    lines += ["void notsa::script::commands::bench::RegisterHandlers() {\n", '    REGISTER_COMMAND_HANDLER_BEGIN("Bench");\n', "\n"]
+    lines += registered
+    lines += ["}\n"]
+    return "".join(lines)
@@ -0,0 +1,30 @@
+import unittest
+from pathlib import Path
+
+from app.batch import FileSummary, get_exit_status, get_report
+
+SUMMARIES = [
+    FileSummary(
+        Path("a.cpp"),
+        "updated",
+        changes={"stubs_added": ["FIRST", "SECOND"], "register_calls_added": {"regular": ["FIRST"], "nop": ["THIRD"]}},
+    ),
+    FileSummary(Path("b.cpp"), "updated", changes={"stubs_added": ["FOURTH"], "register_calls_added": {"regular": ["FOURTH"]}}),
+    FileSummary(Path("c.cpp"), "skipped"),
+]
+
+
+class ReportTest(unittest.TestCase):
+    def test_totals(self):
+        report = get_report(SUMMARIES, 1.0)
+
+        self.assertEqual(report["totals"], {"updated": 2, "unchanged": 0, "skipped": 1, "failed": 0})
+        self.assertEqual(report["change_totals"], {"stubs_added": 3, "register_calls_added": {"regular": 2, "nop": 1}})
+
+    def test_exit_status(self):
+        self.assertEqual(get_exit_status(SUMMARIES), 0)
+        self.assertEqual(get_exit_status([*SUMMARIES, FileSummary(Path("d.cpp"), "failed", error="Broken")]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.cache import DownloadCache
+from app.data import find_extensions, parse_enums
+from app.options import Options
+from app.session import Session
+from bench.__main__ import bench_scale
+from bench.server import DefinitionsServer
+from bench.synthetic import COMMANDS_PER_EXTENSION, make_definitions, make_enums, make_handlers_file
+
+
+class SyntheticTest(unittest.TestCase):
+    def test_definitions_deterministic(self):
+        self.assertEqual(make_definitions(0.1), make_definitions(0.1))
+        self.assertNotEqual(make_definitions(0.1, seed=1), make_definitions(0.1))
+
+    def test_definitions_scale(self):
+        definitions = make_definitions(0.1)
+
+        self.assertEqual(
+            {extension["name"]: len(extension["commands"]) for extension in definitions["extensions"]},
+            {name: max(1, round(count * 0.1)) for name, count in COMMANDS_PER_EXTENSION.items()},
+        )
+        opcodes = [command["id"] for extension in definitions["extensions"] for command in extension["commands"]]
+        self.assertEqual(len(set(opcodes)), len(opcodes))
+
+    def test_definitions_loadable(self):
+        definitions = make_definitions(0.1)
+        raw = json.dumps(definitions).encode("utf-8")
+
+        # Laid out like the real file, so extensions are decoded lazily
+        self.assertEqual(list(find_extensions(raw) or {}), list(COMMANDS_PER_EXTENSION))
+        session = Session.from_definitions(definitions, parse_enums(make_enums().encode("utf-8")))
+        self.assertEqual(len(session.filter_commands(Options(extension="."))), sum(len(extension["commands"]) for extension in definitions["extensions"]))
+
+    def test_handlers_file_updated(self):
+        definitions = make_definitions(0.1)
+        session = Session.from_definitions(definitions, parse_enums(make_enums().encode("utf-8")))
+        options = Options(generate_register_calls=True)
+
+        first = session.update_existing(options, make_handlers_file(definitions, 100))
+        self.assertTrue(first.stubs_added)
+        self.assertTrue(first.register_calls_added)
+
+        second = session.update_existing(options, first.text)
+        self.assertEqual(second.stubs_added, [])
+        self.assertEqual(second.register_calls_added, [])
+
+
+class DefinitionsServerTest(unittest.TestCase):
+    def test_revalidated(self):
+        with DefinitionsServer({"defs.json": b"{}"}) as server, tempfile.TemporaryDirectory() as tmp:
+            url = server.url("defs.json")
+
+            self.assertEqual(DownloadCache(Path(tmp)).fetch(url), b"{}")
+            self.assertEqual(DownloadCache(Path(tmp)).fetch(url), b"{}")
+            self.assertEqual(server.requests, {200: 1, 304: 1})
+
+            # Not revalidated at all within the max age
+            DownloadCache(Path(tmp), max_age=float("inf")).fetch(url)
+            self.assertEqual(server.requests, {200: 1, 304: 1})
+
+    def test_not_found(self):
+        with DefinitionsServer({}) as server, tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(OSError):
+                DownloadCache(Path(tmp)).fetch(server.url("missing.json"))
+            self.assertEqual(server.requests, {404: 1})
+
+
+class BenchScaleTest(unittest.TestCase):
+    def test_phases(self):
+        results = bench_scale(0.02, repeat=1, handlers_file_commands=20)
+
+        self.assertEqual(
+            [result["phase"] for result in results],
+            ["load_cold", "load_revalidate", "load_warm", "build_index", "filter_commands", "generate_new", "generate_new_cached", "update_existing"],
+        )
+        self.assertTrue(all(result["scale"] == 0.02 for result in results))
+        # Only the cold loads (and the one priming the warm cache) download the files in full
+        self.assertEqual(results[-1]["requests"]["200"], 4)
@@ -0,0 +1,47 @@
+import unittest
+from pathlib import Path
+
+from app.coverage import FileScan, build_report
+from app.options import Options
+from app.session import Session
+
+DEFINITIONS = {
+    "meta": {"last_update": 1000, "version": "1", "url": ""},
+    "extensions": [
+        {
+            "name": "default",
+            "commands": [
+                {"id": "0001", "name": "FIRST", "num_params": 0},
+                {"id": "0002", "name": "SECOND", "num_params": 0},
+            ],
+        }
+    ],
+}
+
+
+class BuildReportTest(unittest.TestCase):
+    def setUp(self):
+        self.session = Session.from_definitions(DEFINITIONS, set())
+
+    def get_statuses(self, scans: list[FileScan]) -> dict[str, str]:
+        return {coverage.command.name: coverage.status for coverage in build_report(self.session, Options(), scans).commands}
+
+    def test_handler_of_same_file_counts(self):
+        # Both files define a `Handler` of their own, only the one of `a.cpp` is a stub
+        scans = [
+            FileScan(Path("a.cpp"), [("REGISTER_COMMAND_HANDLER", "FIRST", "Handler")], {"Handler": True}),
+            FileScan(Path("b.cpp"), [("REGISTER_COMMAND_HANDLER", "SECOND", "Handler")], {"Handler": False}),
+        ]
+
+        self.assertEqual(self.get_statuses(scans), {"FIRST": "stubbed", "SECOND": "implemented"})
+
+    def test_handler_of_other_file(self):
+        scans = [
+            FileScan(Path("a.cpp"), handlers={"First": True, "Second": False}),
+            FileScan(
+                Path("a.handlers.cpp"),
+                [("REGISTER_COMMAND_HANDLER", "FIRST", "First"), ("REGISTER_COMMAND_HANDLER", "SECOND", "Second")],
+            ),
+        ]
+
+        self.assertEqual(self.get_statuses(scans), {"FIRST": "stubbed", "SECOND": "implemented"})
@@ -0,0 +1,23 @@
+import os
+import unittest
+
+from bench.importtime import DEFAULT_BUDGET_MS, LAZY_MODULES, measure_import_time
+
+MODULE = "app.__main__"
+# Number of imports, the fastest one counts (the first one also compiles the modules)
+REPEAT = 5
+
+
+class ImportTimeTest(unittest.TestCase):
+    def test_lazy_modules_not_imported(self):
+        timings = measure_import_time(MODULE)
+
+        self.assertIn(MODULE, timings)
+        self.assertEqual([module for module in LAZY_MODULES if module in timings], [])
+
+    # Timings depend on the machine (and its load), so the budget is only checked on request
+    @unittest.skipUnless(os.environ.get("SCRIPT_FOX_CHECK_IMPORT_TIME"), "set SCRIPT_FOX_CHECK_IMPORT_TIME to check the import time budget")
+    def test_import_time_budget(self):
+        timings = min((measure_import_time(MODULE) for _ in range(REPEAT)), key=lambda timings: timings[MODULE])
+
+        self.assertLessEqual(timings[MODULE] / 1000, DEFAULT_BUDGET_MS)
@@ -0,0 +1,126 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.batch import get_docs_to_refresh
+from app.cache import DownloadCache
+from app.manifest import Manifest
+from app.options import Options
+from app.session import Session
+
+DEFINITIONS = {
+    "meta": {"last_update": 1000, "version": "1", "url": ""},
+    "extensions": [
+        {
+            "name": "default",
+            "commands": [
+                {"id": "016A", "name": "DO_FADE", "num_params": 2, "input": [{"name": "time", "type": "int"}, {"name": "direction", "type": "Fade"}]},
+                {"id": "0001", "name": "WAIT", "num_params": 1, "input": [{"name": "time", "type": "int"}]},
+                {"id": "0002", "name": "GOTO", "num_params": 1, "input": [{"name": "label", "type": "label"}]},
+            ],
+        }
+    ],
+}
+
+# A later version, with one command changed and one added
+NEW_DEFINITIONS = {
+    "meta": {"last_update": 2000, "version": "2", "url": ""},
+    "extensions": [
+        {
+            "name": "default",
+            "commands": [
+                {**DEFINITIONS["extensions"][0]["commands"][0], "short_desc": "Fades the screen"},
+                *DEFINITIONS["extensions"][0]["commands"][1:],
+                {"id": "0003", "name": "SHAKE_CAM", "num_params": 1, "input": [{"name": "intensity", "type": "int"}]},
+            ],
+        }
+    ],
+}
+
+
+class DocsToRefreshTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.cache = DownloadCache(self.dir / "cache")
+        self.definitions = self.dir / "definitions.json"
+        self.enums = self.dir / "enums.txt"
+        self.enums.write_text("enum Fade\n", encoding="utf-8")
+        self.input = self.dir / "in.cpp"
+        self.output = self.dir / "out.cpp"
+        self.input.write_text("// in\n", encoding="utf-8")
+        self.output.write_text("// out\n", encoding="utf-8")
+        self.manifest = Manifest(self.dir / "manifest.json")
+        self.options = Options(update_existing_docs=True)
+
+        # Docs last refreshed with the first version, whose snapshot (with the decoded extension) is kept in the cache
+        old = self.load(DEFINITIONS)
+        old.index.decode_all()
+        self.docs_version = old.get_docs_version(self.options)
+        self.session = self.load(NEW_DEFINITIONS)
+
+    def load(self, definitions: dict) -> Session:
+        self.definitions.write_text(json.dumps(definitions), encoding="utf-8")
+        return Session.load(str(self.definitions), str(self.enums), self.cache)
+
+    def test_changed_commands(self):
+        self.assertEqual(self.session.get_changed_commands(self.docs_version["definitions_key"]), {"DO_FADE", "SHAKE_CAM"})
+        self.assertEqual(self.session.get_changed_commands(self.session.definitions_key), set())
+        self.assertIsNone(self.session.get_changed_commands("0-0"))
+
+    def test_in_place_refreshes_changed_commands_only(self):
+        self.manifest.record(self.input, self.input, "signature", "options", self.docs_version)
+
+        self.assertEqual(self.manifest.get_docs_version(self.input), self.docs_version)
+        self.assertEqual(get_docs_to_refresh(self.session, self.options, self.manifest, self.input, self.input), {"DO_FADE", "SHAKE_CAM"})
+
+    def test_other_options_refresh_all_docs(self):
+        self.manifest.record(self.input, self.input, "signature", "options", self.docs_version)
+        options = Options(update_existing_docs=True, vectorize_params=False)
+
+        self.assertNotEqual(self.session.get_docs_version(options)["render_key"], self.docs_version["render_key"])
+        self.assertIsNone(get_docs_to_refresh(self.session, options, self.manifest, self.input, self.input))
+
+    def test_other_rendering_refreshes_all_docs(self):
+        # E.g. docs refreshed by another tool version
+        self.manifest.record(self.input, self.input, "signature", "options", {**self.docs_version, "render_key": "other"})
+
+        self.assertIsNone(get_docs_to_refresh(self.session, self.options, self.manifest, self.input, self.input))
+
+    def test_separate_output_refreshes_all_docs(self):
+        # The input keeps its old docs, so they all have to be rewritten into the output on every run
+        self.manifest.record(self.input, self.output, "signature", "options", self.docs_version)
+
+        self.assertIsNone(self.manifest.get_docs_version(self.input))
+        self.assertIsNone(get_docs_to_refresh(self.session, self.options, self.manifest, self.input, self.output))
+
+    def test_separate_output_ignores_version_recorded_in_place(self):
+        self.manifest.record(self.input, self.input, "signature", "options", self.docs_version)
+
+        self.assertIsNone(get_docs_to_refresh(self.session, self.options, self.manifest, self.input, self.output))
+
+
+class DefinitionsSignatureTest(unittest.TestCase):
+    def test_enums_change_signature(self):
+        # `Fade` is mapped to `eFade` once the enum is known, so files generated before have to be processed again
+        without_enum = Session.from_definitions(DEFINITIONS, set())
+        with_enum = Session.from_definitions(DEFINITIONS, {"Fade"})
+
+        self.assertEqual(without_enum.definitions_key, with_enum.definitions_key)
+        self.assertNotEqual(without_enum.definitions_signature, with_enum.definitions_signature)
+
+    def test_manifest_compares_signature(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "in.cpp"
+            path.write_text("// in\n", encoding="utf-8")
+            manifest = Manifest(Path(tmp) / "manifest.json")
+            manifest.record(path, path, "signature", "options")
+
+            self.assertTrue(manifest.is_up_to_date(path, path, "signature", "options"))
+            self.assertFalse(manifest.is_up_to_date(path, path, "other signature", "options"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import io
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.model import Interner
+from app.options import Options
+from app.rendercache import LAST_USED_RESOLUTION_NS, WRITERS_BY_KIND, RenderCache, Renderer
+from app.typemapper import TypeMapper
+
+DEFINITIONS = {
+    name: {"id": f"000{i}", "name": name, "num_params": 1, "input": [{"name": "value", "type": "int"}]}
+    for i, name in enumerate(["FIRST", "SECOND", "THIRD"])
+}
+COMMANDS = {name: Interner().command(definition) for name, definition in DEFINITIONS.items()}
+
+
+class RenderCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "renders.sqlite"
+        self.cache = RenderCache(self.path)
+        self.addCleanup(self.cache.close)
+        self.mapper = TypeMapper({})
+
+        # Count what is actually rendered (and not taken from the cache)
+        self.rendered: list[str] = []
+        write_docs = WRITERS_BY_KIND["docs"]
+
+        def counting_write_docs(f, command, mapper, options):
+            self.rendered.append(command.name)
+            write_docs(f, command, mapper, options)
+
+        patcher = mock.patch.dict(WRITERS_BY_KIND, {"docs": counting_write_docs})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def render(self, *commands, options: Options = Options(), cache: RenderCache | None = None) -> str:
+        renderer = Renderer(self.mapper, options, cache or self.cache)
+        with io.StringIO() as f:
+            for command in commands:
+                renderer.write("docs", f, command)
+            renderer.flush()
+            return f.getvalue()
+
+    def test_hit(self):
+        first = self.render(COMMANDS["FIRST"])
+        second = self.render(COMMANDS["FIRST"])
+
+        self.assertEqual(second, first)
+        self.assertEqual(self.rendered, ["FIRST"])
+
+    def test_hit_in_another_process(self):
+        self.render(COMMANDS["FIRST"])
+
+        copy = pickle.loads(pickle.dumps(self.cache))
+        self.addCleanup(copy.close)
+        self.render(COMMANDS["FIRST"], cache=copy)
+        self.assertEqual(self.rendered, ["FIRST"])
+
+    def test_options_change(self):
+        self.render(COMMANDS["FIRST"])
+        self.render(COMMANDS["FIRST"], options=Options(vectorize_params=False))
+
+        self.assertEqual(self.rendered, ["FIRST", "FIRST"])
+
+    def test_definition_change(self):
+        self.render(COMMANDS["FIRST"])
+        changed = Interner().command({**DEFINITIONS["FIRST"], "short_desc": "Changed"})
+
+        self.assertIn("Changed", self.render(changed))
+        self.assertEqual(self.rendered, ["FIRST", "FIRST"])
+
+    def test_least_recently_used_evicted(self):
+        cache = RenderCache(self.path, max_entries=2)
+        self.addCleanup(cache.close)
+        now = 0
+
+        def render_at(*names: str):
+            nonlocal now
+            # Far enough apart that fragments used again are marked as used
+            now += 2 * LAST_USED_RESOLUTION_NS
+            with mock.patch("time.time_ns", return_value=now):
+                self.render(*(COMMANDS[name] for name in names), cache=cache)
+
+        render_at("FIRST")
+        render_at("SECOND")
+        render_at("FIRST")
+        render_at("THIRD")  # One too many, `SECOND` was used least recently
+        self.rendered.clear()
+
+        render_at("FIRST", "SECOND", "THIRD")
+        self.assertEqual(self.rendered, ["SECOND"])
+
+
+if __name__ == "__main__":
+    unittest.main()
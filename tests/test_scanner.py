@@ -0,0 +1,111 @@
+import unittest
+
+from app.options import Options
+from app.scanner import scan
+from app.session import Session
+
+DEFINITIONS = {
+    "meta": {"last_update": 1000, "version": "1", "url": ""},
+    "extensions": [
+        {
+            "name": "default",
+            "commands": [
+                # Not in opcode (or name) order, so the order of the output can only come from the definitions
+                {"id": "0003", "name": "THIRD", "num_params": 1, "input": [{"name": "value", "type": "int"}]},
+                {"id": "0001", "name": "FIRST", "num_params": 0},
+                {"id": "0002", "name": "SECOND", "num_params": 0},
+                {"id": "0004", "name": "NOTHING", "num_params": 1, "input": [{"name": "value", "type": "int"}], "attrs": {"is_nop": True}},
+            ],
+        }
+    ],
+}
+
+HANDLERS_FILE = """\
+#include <StdInc.h>
+
+// COMMAND_FIRST
+void First() {
+}
+
+void RegisterHandlers() {
+    REGISTER_COMMAND_HANDLER_BEGIN("Test");
+    REGISTER_COMMAND_HANDLER(COMMAND_FIRST, First);
+}
+"""
+
+
+class ScanTest(unittest.TestCase):
+    def test_register_calls(self):
+        scanned = scan(
+            "void RegisterHandlers() {\n"
+            "    REGISTER_COMMAND_HANDLER_BEGIN(\"Test\");\n"
+            "    REGISTER_COMMAND_HANDLER(COMMAND_FIRST, First);\n"
+            "    REGISTER_COMMAND_HANDLER(SECOND, Second);\n"
+            "    REGISTER_COMMAND_NOP(NOTHING, int32, float);\n"
+            "    // REGISTER_UNSUPPORTED_COMMAND_HANDLER(COMMAND_THIRD);\n"
+            "}\n"
+        )
+
+        self.assertEqual(scanned.register_handlers_line, 0)
+        self.assertEqual(scanned.register_handler_begin_line, 1)
+        self.assertEqual(
+            [(call.line, call.macro, call.command_name, call.handler, call.commented_out) for call in scanned.register_calls],
+            [
+                (2, "REGISTER_COMMAND_HANDLER", "FIRST", "First", False),
+                (3, "REGISTER_COMMAND_HANDLER", "SECOND", "Second", False),
+                (4, "REGISTER_COMMAND_NOP", "NOTHING", None, False),
+                (5, "REGISTER_UNSUPPORTED_COMMAND_HANDLER", "THIRD", None, True),
+            ],
+        )
+
+    def test_docs_and_handlers(self):
+        scanned = scan(
+            "// COMMAND_FIRST\n"
+            "/// SECOND - Does something\n"
+            "/*\n"
+            " * @command THIRD\n"
+            " */\n"
+            "auto Third(CPed& ped, int32 value) {\n"
+            "}\n"
+            "/* Not closed\n"
+        )
+
+        self.assertEqual(scanned.singleline_docs, {0: "FIRST", 1: "SECOND"})
+        self.assertEqual(scanned.doc_blocks[2].end, 4)
+        self.assertEqual(scanned.doc_blocks[2].command_name, "THIRD")
+        self.assertIsNone(scanned.doc_blocks[7].end)
+        self.assertEqual(scanned.handlers[5].handler_name, "Third")
+        self.assertEqual(scanned.handlers[5].params, "CPed& ped, int32 value")
+
+
+class UpdateExistingTest(unittest.TestCase):
+    def setUp(self):
+        self.session = Session.from_definitions(DEFINITIONS, set())
+        self.options = Options(generate_register_calls=True)
+
+    def test_singleline_docs_replaced(self):
+        result = self.session.update_existing(self.options, HANDLERS_FILE)
+
+        self.assertNotIn("// COMMAND_FIRST", result.text)
+        self.assertIn("/*\n * @opcode 0001\n * @command FIRST\n */\nvoid First() {\n", result.text)
+        self.assertEqual(result.docs_added, ["FIRST"])
+
+    def test_stubs_and_register_calls_in_definitions_order(self):
+        result = self.session.update_existing(self.options, HANDLERS_FILE)
+
+        self.assertEqual(result.stubs_added, ["THIRD", "SECOND", "NOTHING"])
+        self.assertLess(result.text.index("void Third("), result.text.index("void Second("))
+        self.assertLess(
+            result.text.index("REGISTER_COMMAND_HANDLER(THIRD, Third);"),
+            result.text.index("REGISTER_COMMAND_HANDLER(SECOND, Second);"),
+        )
+
+    def test_written_register_calls_recognized(self):
+        # Calls are written without the `COMMAND_` prefix, and NOPs with their parameter types
+        first = self.session.update_existing(self.options, HANDLERS_FILE)
+        self.assertIn("REGISTER_COMMAND_NOP(NOTHING, int32);", first.text)
+
+        second = self.session.update_existing(self.options, first.text)
+        self.assertEqual(second.text, first.text)
+        self.assertEqual(second.stubs_added, [])
+        self.assertEqual(second.register_calls_added, [])
@@ -0,0 +1,101 @@
+import copy
+import json
+import pickle
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from app.cache import DownloadCache
+from app.snapshot import DefinitionsIndex, load_index
+
+DEFINITIONS = {
+    "meta": {"last_update": 1000, "version": "1", "url": ""},
+    "extensions": [
+        {
+            "name": f"extension{i}",
+            "commands": [
+                {"id": f"{i:02X}{j:02X}", "name": f"COMMAND_{i}_{j}", "num_params": 0, "class": "Car", "member": f"Method{i}_{j}"}
+                for j in range(50)
+            ],
+        }
+        for i in range(20)
+    ],
+}
+
+
+class DefinitionsIndexTest(unittest.TestCase):
+    def test_concurrent_lookups_decode_once(self):
+        raw = json.dumps(DEFINITIONS).encode("utf-8")
+        index = DefinitionsIndex.from_raw(raw, DEFINITIONS["meta"], set())
+        barrier = threading.Barrier(8)
+        results = []
+
+        def look_up(i: int):
+            barrier.wait()
+            # Commands of the last extension, so every lookup misses and decodes the remaining extensions
+            results.append(index.by_name[f"COMMAND_19_{i}"].name)
+
+        threads = [threading.Thread(target=look_up, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertCountEqual(results, [f"COMMAND_19_{i}" for i in range(8)])
+        self.assertEqual(len(index.by_class["Car"]), 20 * 50)
+        self.assertEqual(len(set(map(id, index.by_class["Car"]))), 20 * 50)
+
+    def test_raw_definitions_dropped(self):
+        raw = json.dumps(DEFINITIONS).encode("utf-8")
+        index = DefinitionsIndex.from_raw(raw, DEFINITIONS["meta"], set())
+        index.get_commands("extension0")
+        self.assertIsNotNone(index.raw)
+
+        # Sent to worker processes with all extensions decoded instead
+        copy = pickle.loads(pickle.dumps(index))
+        self.assertIsNone(index.raw)
+        self.assertIsNone(copy.raw)
+        self.assertEqual(len(copy.by_class["Car"]), 20 * 50)
+
+
+class SnapshotStoreTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.cache = DownloadCache(self.dir / "cache")
+        self.definitions = self.dir / "definitions.json"
+        self.enums = self.dir / "enums.txt"
+        self.enums.write_text("enum Fade\n", encoding="utf-8")
+
+    def load(self, definitions: dict) -> DefinitionsIndex:
+        self.definitions.write_text(json.dumps(definitions), encoding="utf-8")
+        return load_index(self.cache, str(self.definitions), str(self.enums))
+
+    def test_loaded_from_snapshot(self):
+        built = self.load(DEFINITIONS)
+        built.decode_all()
+        loaded = self.load(DEFINITIONS)
+
+        self.assertIsNot(loaded, built)
+        self.assertEqual(loaded.by_name["COMMAND_3_7"].id, "0307")
+        self.assertEqual(loaded.by_opcode["0307"].name, "COMMAND_3_7")
+        self.assertIs(loaded.by_handler_name["command37"], loaded.by_name["COMMAND_3_7"])
+        self.assertEqual(len(loaded.by_class["Car"]), 20 * 50)
+
+    def test_misses_decode_key_extensions_only(self):
+        self.load(DEFINITIONS).decode_all()
+        loaded = self.load(DEFINITIONS)
+
+        self.assertEqual(loaded.by_name["COMMAND_19_3"].id, "1303")
+        self.assertEqual(list(loaded.decoded), ["extension19"])
+        self.assertNotIn("UNKNOWN", loaded.by_name)
+        self.assertEqual(list(loaded.decoded), ["extension19"])
+
+    def test_edited_definitions_of_same_version(self):
+        self.load(DEFINITIONS).decode_all()
+        edited = copy.deepcopy(DEFINITIONS)
+        edited["extensions"][0]["commands"][0]["short_desc"] = "Edited"
+
+        self.assertEqual(self.load(edited).by_name["COMMAND_0_0"].short_desc, "Edited")
@@ -0,0 +1,45 @@
+import os
+import stat
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+
+from app.util import atomic_write_bytes, write_text_if_changed
+
+
+@unittest.skipIf(os.name == "nt", "POSIX permissions")
+class AtomicWriteTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.umask = os.umask(0o022)
+        self.addCleanup(os.umask, self.umask)
+
+    def get_mode(self, path: Path) -> int:
+        return stat.S_IMODE(path.stat().st_mode)
+
+    def test_new_file_has_default_permissions(self):
+        path = self.dir / "new.txt"
+        atomic_write_bytes(path, b"data")
+
+        self.assertEqual(path.read_bytes(), b"data")
+        self.assertEqual(self.get_mode(path), 0o644)
+        self.assertEqual(list(self.dir.iterdir()), [path])
+
+    def test_existing_file_keeps_permissions(self):
+        path = self.dir / "existing.txt"
+        path.write_bytes(b"old")
+        path.chmod(0o600)
+        atomic_write_bytes(path, b"new")
+
+        self.assertEqual(path.read_bytes(), b"new")
+        self.assertEqual(self.get_mode(path), 0o600)
+
+    def test_umask_untouched(self):
+        # It's process-wide, so changing it (even just to read it) races with files created by other threads
+        with unittest.mock.patch("os.umask", side_effect=AssertionError("umask changed")):
+            write_text_if_changed(self.dir / "new.txt", "data\n")
+
+        self.assertEqual(self.get_mode(self.dir / "new.txt"), 0o644)
@@ -0,0 +1,92 @@
+import unittest
+from pathlib import Path
+
+from app.options import Options
+from app.session import Session
+from app.symbols import Handler
+from app.verify import get_param_types, normalize_type, verify_handlers
+
+DEFINITIONS = {
+    "meta": {"last_update": 1000, "version": "1", "url": ""},
+    "extensions": [
+        {
+            "name": "default",
+            "commands": [
+                {
+                    "id": "0001",
+                    "name": "SET_CHAR_HEALTH",
+                    "num_params": 2,
+                    "class": "Char",
+                    "member": "SetHealth",
+                    "input": [{"name": "handle", "type": "Char"}, {"name": "health", "type": "int"}],
+                },
+            ],
+        }
+    ],
+}
+
+
+class NormalizeTypeTest(unittest.TestCase):
+    def test_punctuation_spacing(self):
+        self.assertEqual(normalize_type("CPed &"), "CPed&")
+        self.assertEqual(normalize_type("const  char *"), "const char*")
+        self.assertEqual(normalize_type("std::pair< int ,float >"), "std::pair<int, float>")
+        self.assertEqual(normalize_type("std::map<int,std::vector<float> >"), "std::map<int, std::vector<float>>")
+
+
+class GetParamTypesTest(unittest.TestCase):
+    def test_names_removed(self):
+        self.assertEqual(get_param_types("CPed& ped, int32 value"), ("CPed&", "int32"))
+        self.assertEqual(get_param_types("CPed&, int32"), ("CPed&", "int32"))
+
+    def test_script_param_removed(self):
+        self.assertEqual(get_param_types("CRunningScript& S, CPed& ped"), ("CPed&",))
+        self.assertEqual(get_param_types("CRunningScript* S"), ())
+
+    def test_no_params(self):
+        self.assertEqual(get_param_types(""), ())
+        self.assertEqual(get_param_types("void"), ())
+
+    def test_const_and_references(self):
+        self.assertEqual(get_param_types("const CVector & pos, const char *name"), ("const CVector&", "const char*"))
+        # Types made of keywords only aren't split into a type and a name
+        self.assertEqual(get_param_types("unsigned int, const float"), ("unsigned int", "const float"))
+
+    def test_templates(self):
+        self.assertEqual(
+            get_param_types("std::pair<int32, float> p, const std::map<int, std::vector<float>>& m"),
+            ("std::pair<int32, float>", "const std::map<int, std::vector<float>>&"),
+        )
+
+    def test_default_values(self):
+        self.assertEqual(get_param_types("float radius = 1.0f, bool flag = false"), ("float", "bool"))
+        self.assertEqual(get_param_types("CVector pos = {0.0f, 0.0f, 0.0f}, int32 n = std::max(1, 2)"), ("CVector", "int32"))
+        self.assertEqual(get_param_types("bool far = distance > 10, int32 n"), ("bool", "int32"))
+
+
+class VerifyHandlersTest(unittest.TestCase):
+    def setUp(self):
+        self.session = Session.from_definitions(DEFINITIONS, set())
+
+    def verify(self, return_type: str, params: str):
+        return verify_handlers(self.session, Options(), [Handler(Path("Char.cpp"), 1, "SetCharHealth", False, return_type, params)])
+
+    def test_matching(self):
+        self.assertEqual(self.verify("void", "CPed & ped, int32 health"), ([], 1))
+        self.assertEqual(self.verify("static void", "CRunningScript& S, CPed& ped, int32 health = 100"), ([], 1))
+
+    def test_mismatch(self):
+        mismatches, checked = self.verify("void", "CPed& ped, float health")
+
+        self.assertEqual(checked, 1)
+        self.assertEqual(mismatches[0].expected, "void SetCharHealth(CPed&, int32)")
+        self.assertEqual(mismatches[0].actual, "void SetCharHealth(CPed&, float)")
+
+    def test_other_functions_ignored(self):
+        handler = Handler(Path("Char.cpp"), 1, "Helper", False, "void", "float")
+
+        self.assertEqual(verify_handlers(self.session, Options(), [handler]), ([], 0))
+
+
+if __name__ == "__main__":
+    unittest.main()